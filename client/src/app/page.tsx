@@ -21,6 +21,19 @@ const batchesColumns = [
       return date.toLocaleDateString() + " " + date.toLocaleTimeString();
     },
   },
+    {
+      accessorKey: "counters",
+      header: "Progress",
+      cell: ({ row }: { row: any }) => {
+        const counters = row.getValue("counters") || {};
+        return (
+          <span className="text-sm text-gray-600 dark:text-gray-400">
+            {(counters.completed || 0) + (counters.failed || 0)}/{counters.total || 0} done
+            {counters.failed ? ` (${counters.failed} failed)` : ""}
+          </span>
+        );
+      },
+    },
     {
       accessorKey: "id",
       header: "Batch ID",
@@ -43,9 +56,12 @@ export default function Home() {
   const [uploadMessage, setUploadMessage] = useState("");
   const [callDetailsData, setCallDetailsData] = useState([]);
   const [batchesData, setBatchesData] = useState([]);
+  const [batchesCursor, setBatchesCursor] = useState<string | null>(null);
   const [selectedBatchId, setSelectedBatchId] = useState<string | null>(null);
   const [isPolling, setIsPolling] = useState(false);
   const pollingIntervalRef = useRef<NodeJS.Timeout | null>(null);
+  const eventSourceRef = useRef<EventSource | null>(null);
+  const syncTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const [redialingCalls, setRedialingCalls] = useState<Set<string>>(new Set());
 
   // Function to fetch batches from /batches endpoint
@@ -55,40 +71,101 @@ export default function Home() {
         process.env.NEXT_PUBLIC_SERVER_BASE_URL || "http://localhost:3001";
       const response = await axios.get(`${serverBaseUrl}/batches`);
       setBatchesData(response.data.batches || []);
+      setBatchesCursor(response.data.next_cursor || null);
       console.log("Fetched batches:", response.data.batches);
     } catch (error) {
       console.error("Error fetching batches:", error);
     }
   }, []);
 
+  // Function to append the next page of older batches
+  const loadMoreBatches = useCallback(async () => {
+    if (!batchesCursor) return;
+    try {
+      const serverBaseUrl =
+        process.env.NEXT_PUBLIC_SERVER_BASE_URL || "http://localhost:3001";
+      const response = await axios.get(`${serverBaseUrl}/batches`, {
+        params: { cursor: batchesCursor },
+      });
+      setBatchesData((previous: any) => [...previous, ...(response.data.batches || [])] as any);
+      setBatchesCursor(response.data.next_cursor || null);
+    } catch (error) {
+      console.error("Error fetching more batches:", error);
+    }
+  }, [batchesCursor]);
+
+  // Delta sync position of the batch on screen
+  const syncRef = useRef<{ batchId: string; cursor: string } | null>(null);
+
+  // Transform the data to match table structure with new fields
+  const transformCall = (call: any) => ({
+    id: call.id,
+    batch_id: call.batch_id,
+    name: call.user?.name || "N/A",
+    email: call.user?.email || "N/A",
+    phone: call.user?.phone || "N/A",
+    status: call.status,
+    created_at: call.created_at,
+    updated_at: call.updated_at,
+    summary: call.call_result?.summary || null,
+    transcript: call.call_result?.transcript || null,
+    quality_score: call.call_result?.quality_score || null,
+    customer_intent: call.call_result?.customer_intent || null,
+    recording_url: call.call_result?.recording_url || null,
+  });
+
   // Function to fetch call details from the batch
   const fetchCallDetails = useCallback(async (batchId: string) => {
     try {
       const serverBaseUrl =
         process.env.NEXT_PUBLIC_SERVER_BASE_URL || "http://localhost:3001";
-      const response = await axios.get(
-        `${serverBaseUrl}/calls/batch/${batchId}`
-      );
 
-      // Transform the data to match table structure with new fields
-      const transformedData = response.data.calls.map((call: any) => ({
-        id: call.id,
-        batch_id: call.batch_id,
-        name: call.user?.name || "N/A",
-        email: call.user?.email || "N/A",
-        phone: call.user?.phone || "N/A",
-        status: call.status,
-        created_at: call.created_at,
-        updated_at: call.updated_at,
-        summary: call.call_result?.summary || null,
-        transcript: call.call_result?.transcript || null,
-        quality_score: call.call_result?.quality_score || null,
-        customer_intent: call.call_result?.customer_intent || null,
-        recording_url: call.call_result?.recording_url || null,
-      }));
-
-      setCallDetailsData(transformedData);
-      console.log("Updated call details:", transformedData);
+      // Already loaded: only fetch the calls that changed since the last poll
+      if (syncRef.current && syncRef.current.batchId === batchId) {
+        const changed: any[] = [];
+        let since = syncRef.current.cursor;
+        let hasMore = true;
+        while (hasMore) {
+          const response: any = await axios.get(
+            `${serverBaseUrl}/calls/batch/${batchId}`,
+            { params: { limit: 500, since } }
+          );
+          changed.push(...response.data.calls.map(transformCall));
+          since = response.data.next_cursor;
+          hasMore = response.data.has_more;
+        }
+        syncRef.current = { batchId, cursor: since };
+
+        if (changed.length) {
+          setCallDetailsData((previous: any) => {
+            const byId = new Map(previous.map((call: any) => [call.id, call]));
+            changed.forEach((call) => byId.set(call.id, call));
+            return Array.from(byId.values()) as any;
+          });
+          console.log("Updated call details:", changed);
+        }
+        return;
+      }
+
+      // Walk the cursor pages, transcripts are loaded per call on expand
+      const calls: any[] = [];
+      let cursor: string | null = null;
+      let syncCursor: string | null = null;
+      do {
+        const response: any = await axios.get(
+          `${serverBaseUrl}/calls/batch/${batchId}`,
+          { params: { limit: 500, cursor: cursor || undefined } }
+        );
+        calls.push(...response.data.calls);
+        syncCursor = syncCursor || response.data.sync_cursor;
+        cursor = response.data.next_cursor;
+      } while (cursor);
+
+      const transformedData = calls.map(transformCall);
+      syncRef.current = syncCursor ? { batchId, cursor: syncCursor } : null;
+
+      setCallDetailsData(transformedData as any);
+      console.log("Loaded call details:", transformedData);
     } catch (error) {
       console.error("Error fetching call details:", error);
     }
@@ -235,7 +312,23 @@ export default function Home() {
       // Fetch immediately
       fetchCallDetails(batchId);
 
-      // Then poll every 30 seconds
+      // Status changes are pushed by the server, each burst triggers one delta sync
+      eventSourceRef.current?.close();
+      const serverBaseUrl =
+        process.env.NEXT_PUBLIC_SERVER_BASE_URL || "http://localhost:3001";
+      const eventSource = new EventSource(
+        `${serverBaseUrl}/batches/${batchId}/events`
+      );
+      eventSource.addEventListener("call", () => {
+        if (syncTimeoutRef.current) return;
+        syncTimeoutRef.current = setTimeout(() => {
+          syncTimeoutRef.current = null;
+          fetchCallDetails(batchId);
+        }, 300);
+      });
+      eventSourceRef.current = eventSource;
+
+      // Slow poll as a fallback for missed events (e.g. server restarts)
       pollingIntervalRef.current = setInterval(() => {
         fetchCallDetails(batchId);
       }, 30000);
@@ -249,6 +342,12 @@ export default function Home() {
       clearInterval(pollingIntervalRef.current);
       pollingIntervalRef.current = null;
     }
+    eventSourceRef.current?.close();
+    eventSourceRef.current = null;
+    if (syncTimeoutRef.current) {
+      clearTimeout(syncTimeoutRef.current);
+      syncTimeoutRef.current = null;
+    }
     setIsPolling(false);
   }, []);
 
@@ -258,6 +357,7 @@ export default function Home() {
       if (pollingIntervalRef.current) {
         clearInterval(pollingIntervalRef.current);
       }
+      eventSourceRef.current?.close();
     };
   }, []);
 
@@ -481,6 +581,16 @@ export default function Home() {
                 </button>
               </div>
               <BatchesTable data={batchesData} />
+              {batchesCursor && (
+                <div className="flex justify-center mt-4">
+                  <button
+                    onClick={loadMoreBatches}
+                    className="px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 transition-colors"
+                  >
+                    Load more
+                  </button>
+                </div>
+              )}
             </div>
           )}
 
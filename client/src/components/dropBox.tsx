@@ -10,7 +10,9 @@ function MyDropzone({onDrop, uploadStatus, uploadMessage}: {onDrop: (acceptedFil
     onDrop,
     accept: {
       'application/vnd.ms-excel': ['.xls'],
-      'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx']
+      'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
+      'text/csv': ['.csv'],
+      'application/octet-stream': ['.parquet', '.arrow', '.feather']
     },
     maxFiles: 1,
     multiple: false,
@@ -59,10 +61,10 @@ function MyDropzone({onDrop, uploadStatus, uploadMessage}: {onDrop: (acceptedFil
             {uploadStatus === 'uploading' ? 'Uploading...' :
              uploadStatus === 'success' ? 'File uploaded successfully!' :
              uploadStatus === 'error' ? 'Upload failed' :
-             'Drop Excel file or click\nhere to upload'}
+             'Drop lead file or click\nhere to upload'}
           </span>
           <span className="text-gray-400 dark:text-gray-500 text-sm text-center">
-            Only .xls and .xlsx files allowed
+            Only .xls, .xlsx, .csv, .parquet and .arrow files allowed
           </span>
         </div>
       </div>
@@ -93,7 +95,7 @@ function MyDropzone({onDrop, uploadStatus, uploadMessage}: {onDrop: (acceptedFil
         <div className="mt-4 p-3 bg-red-50 dark:bg-red-900 border border-red-200 dark:border-red-700 rounded-lg">
           <p className="text-red-600 dark:text-red-400 text-sm">
             {fileRejections[0].errors[0].code === 'file-invalid-type' 
-              ? 'Please upload only .xls or .xlsx files'
+              ? 'Please upload only .xls, .xlsx, .csv, .parquet or .arrow files'
               : fileRejections[0].errors[0].code === 'too-many-files'
               ? 'Please upload only one file at a time'
               : 'File upload failed. Please try again.'}
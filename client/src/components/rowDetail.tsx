@@ -1,12 +1,25 @@
 "use client"
 
-import React from 'react'
+import React, { useEffect, useState } from 'react'
+import axios from 'axios'
 
 interface RowDetailProps {
   data: any
 }
 
 export function RowDetail({ data }: RowDetailProps) {
+  // Batch listings leave transcripts out, fetch this call's one when the row opens
+  const [transcript, setTranscript] = useState<string | null>(data.transcript || null)
+
+  useEffect(() => {
+    if (!data.id || data.transcript) return
+    const serverBaseUrl = process.env.NEXT_PUBLIC_SERVER_BASE_URL || "http://localhost:3001"
+    axios
+      .get(`${serverBaseUrl}/calls/${data.id}`)
+      .then((response) => setTranscript(response.data.call_result?.transcript || null))
+      .catch((error) => console.error("Error fetching call transcript:", error))
+  }, [data.id, data.transcript])
+
   return (
     <div className="bg-gray-50 dark:bg-gray-800 p-6 border-t border-gray-200 dark:border-gray-600">
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
@@ -60,7 +73,7 @@ export function RowDetail({ data }: RowDetailProps) {
             <h4 className="font-semibold text-gray-700 dark:text-gray-300 text-base">Transcript</h4>
             <div className="text-sm bg-white dark:bg-gray-700 p-4 rounded border border-gray-200 dark:border-gray-600 min-h-[120px] max-h-[200px] w-full overflow-y-auto overflow-x-hidden">
               <p className="whitespace-pre-wrap break-words overflow-wrap-anywhere text-gray-900 dark:text-gray-100">
-                {data.transcript || <span className="text-gray-500 dark:text-gray-400 italic">No transcript available</span>}
+                {transcript || <span className="text-gray-500 dark:text-gray-400 italic">No transcript available</span>}
               </p>
             </div>
           </div>
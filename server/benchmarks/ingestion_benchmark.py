@@ -0,0 +1,113 @@
+"""
+Benchmark lead-file ingestion: the original iterrows parser against the
+streaming, vectorized engine in utils/document.py, plus the same rows as
+CSV and Parquet.
+
+Usage (from the server directory):
+    python -m benchmarks.ingestion_benchmark --rows 10000,100000,1000000 [--memory]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+import pandas as pd
+from loguru import logger
+
+from model.model import User
+from utils.document import ARROW_AVAILABLE, iter_user_chunks
+
+
+def legacy_read_xlsx_file(file_path: str) -> List[User]:
+    """The pre-streaming parser: whole sheet in memory, one pydantic User per iterrows row"""
+    raw_data = pd.read_excel(file_path)
+    users = []
+    for _, row in raw_data.iterrows():
+        name = str(row["name"]).strip() if pd.notna(row["name"]) else ""
+        email = str(row["email"]).strip() if pd.notna(row["email"]) else ""
+        phone = str(row["phone"]).strip() if pd.notna(row["phone"]) else ""
+        if phone:
+            phone_clean = ''.join(filter(str.isdigit, phone))
+            if phone_clean and len(phone_clean) >= 10:
+                phone = f"+{phone_clean}"
+            else:
+                phone = phone_clean if phone_clean else phone
+        if not name or not email or not phone:
+            continue
+        users.append(User(name=name, email=email, phone=phone))
+    return users
+
+
+def legacy_count(file_path: str) -> int:
+    return len(legacy_read_xlsx_file(file_path))
+
+
+def streaming_count(file_path: str) -> int:
+    """Consume the streaming engine chunk by chunk without keeping the users"""
+    return sum(len(chunk) for chunk in iter_user_chunks(file_path))
+
+
+def write_synthetic_file(rows: int, directory: str) -> str:
+    """Write an .xlsx lead list with name/email/phone columns in constant memory"""
+    from openpyxl import Workbook
+
+    file_path = os.path.join(directory, f"leads_{rows}.xlsx")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["name", "email", "phone"])
+    for index in range(rows):
+        phone = f"+91 {random.randint(70000, 99999)}-{random.randint(10000, 99999)}"
+        sheet.append([f"Lead {index}", f"lead{index}@example.com", phone])
+    workbook.save(file_path)
+    return file_path
+
+
+def measure(label: str, parse: Callable[[str], int], file_path: str, memory: bool):
+    started = time.perf_counter()
+    rows = parse(file_path)
+    elapsed = time.perf_counter() - started
+    line = f"  {label:<10} {elapsed:8.2f}s  {rows / elapsed if elapsed else 0:10.0f} rows/s"
+
+    if memory:
+        # Separate run, tracemalloc slows allocation heavy code down a lot
+        tracemalloc.start()
+        parse(file_path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f"  peak {peak / 1024 / 1024:8.1f} MiB"
+
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", default="10000,100000", help="comma separated row counts")
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the streaming engine")
+    parser.add_argument("--memory", action="store_true", help="also measure peak Python memory")
+    args = parser.parse_args()
+
+    logger.remove()
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in (int(value) for value in args.rows.split(",")):
+            file_path = write_synthetic_file(rows, directory)
+            print(f"{rows} rows ({os.path.getsize(file_path) / 1024 / 1024:.1f} MiB)")
+            if not args.skip_legacy:
+                measure("legacy", legacy_count, file_path, args.memory)
+            measure("streaming", streaming_count, file_path, args.memory)
+
+            # Same rows through the CSV and columnar fast paths
+            frame = pd.read_excel(file_path, dtype=str)
+            csv_path = file_path.replace(".xlsx", ".csv")
+            frame.to_csv(csv_path, index=False)
+            measure("csv", streaming_count, csv_path, args.memory)
+            if ARROW_AVAILABLE:
+                parquet_path = file_path.replace(".xlsx", ".parquet")
+                frame.to_parquet(parquet_path, index=False)
+                measure("parquet", streaming_count, parquet_path, args.memory)
+
+
+if __name__ == "__main__":
+    main()
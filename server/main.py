@@ -1,29 +1,104 @@
 from fastapi import (
     FastAPI,
-    UploadFile,
-    File,
     HTTPException,
     Request,
-    BackgroundTasks,
     Query,
 )
-from model.model import connect_to_db, close_db_connection, User
+from model.model import connect_to_db, close_db_connection, check_query_plans, User
 import uvicorn
 from model.model import Batch, User, Call, CallStatus
 import os
 
-from utils.document import read_xlsx_file
+from utils.document import SUPPORTED_EXTENSIONS
+from utils.ingest import (
+    ingest_lead_file,
+    start_ingest_sweeper,
+    stop_ingest_sweeper,
+    save_upload,
+    UploadRejected,
+    UploadTooLarge,
+    MAX_UPLOAD_BYTES,
+)
 
 from utils.call_executor import CallExecutor
-from utils.vapi_client import VAPIClient
+from utils.vapi_client import get_vapi_client
+from utils.http_pool import (
+    start_http_client,
+    close_http_client,
+    get_http_client,
+    get_media_http_client,
+)
+from utils.media_cache import start_media_cache, stop_media_cache, get_media_cache, serve_media
+from utils.call_reconciler import (
+    CALL_RECONCILER_ENABLED,
+    start_call_reconciler,
+    stop_call_reconciler,
+    get_call_reconciler,
+)
+from utils.recording_store import (
+    start_recording_store,
+    stop_recording_store,
+    get_recording_store,
+    stored_response,
+)
+from utils.analysis_pipeline import (
+    AnalysisRequest,
+    analysis_queue,
+    enqueue_analysis,
+    start_analysis_pipeline,
+    stop_analysis_pipeline,
+    get_analysis_pipeline,
+)
+from utils.dialer import (
+    start_dialer,
+    stop_dialer,
+    get_dialer,
+    dial_queue,
+    redial_batch,
+    redial_progress,
+    REDIAL_STATUSES,
+    COMPLETED_REDIAL_STATUSES,
+    DIALER_SLOT_WAIT,
+    NoFreeNumber,
+    count_live_calls,
+)
+from utils.call_status import (
+    set_call_status,
+    advance_call_status,
+    batch_counters,
+    recount_batch_counters,
+)
+from utils.call_events import (
+    CALL_EVENTS_KEEPALIVE,
+    format_sse,
+    publish_call_event,
+    start_call_events,
+    stop_call_events,
+    get_call_events,
+)
+from utils.call_queries import (
+    CALLS_PAGE_SIZE,
+    CALLS_MAX_PAGE_SIZE,
+    BATCHES_PAGE_SIZE,
+    BATCHES_MAX_PAGE_SIZE,
+    parse_statuses,
+    find_batch_calls,
+    find_batch_changes,
+    find_batches,
+    aggregate_batch_stats,
+    latest_sync_cursor,
+    find_call,
+)
 from loguru import logger
 from bson import ObjectId
 from datetime import datetime
+from typing import Optional
 
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 import httpx
-from fastapi import Response
 import random
 
 # Environment variables
@@ -50,6 +125,21 @@ async def startup_db_client():
     """
     logger.info("🟢🟢Connecting to MongoDB")
     await connect_to_db()
+    await check_query_plans()
+    start_http_client()
+    start_media_cache()
+    start_recording_store()
+    start_call_events()
+    if get_vapi_client().configured:
+        start_dialer(CallExecutor(vapi_client=get_vapi_client()))
+    else:
+        # Dial jobs wait in the queue until the API runs with a key
+        logger.warning("⚠️ VAPI_API_KEY is not set, dialer and reconciler not started")
+    start_analysis_pipeline()
+    start_completion_workers()
+    if get_vapi_client().configured:
+        start_call_reconciler(get_vapi_client())
+    start_ingest_sweeper()
 
 
 @app.on_event("shutdown")
@@ -58,6 +148,15 @@ async def shutdown_db_client():
     Close database connection gracefully on application shutdown.
     This ensures proper cleanup of resources.
     """
+    await stop_ingest_sweeper()
+    await stop_call_reconciler()
+    await stop_dialer()
+    await stop_completion_workers()
+    await stop_analysis_pipeline()
+    await stop_call_events()
+    await stop_recording_store()
+    await stop_media_cache()
+    await close_http_client()
     logger.info("🔴 Shutting down MongoDB connection")
     await close_db_connection()
 
@@ -76,52 +175,34 @@ async def root():
 
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
     """
-    Upload Excel file locally and extract user data
+    Upload a lead file (Excel, CSV, Parquet or Arrow) locally and extract user data.
+    Expects multipart/form-data with the lead file in a "file" field.
     """
-    # Validate file type
-    if not file.filename.endswith((".xlsx", ".xls")):
+    # Reject obviously oversized uploads before touching the body
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
         raise HTTPException(
-            status_code=400, detail="Only Excel files (.xlsx, .xls) are allowed"
+            status_code=413,
+            detail=f"File is larger than the {MAX_UPLOAD_BYTES} byte upload limit",
         )
 
     # Create uploads directory if it doesn't exist
     os.makedirs("uploads", exist_ok=True)
 
-    # Generate unique filename to avoid conflicts
-    import uuid
-
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = f"uploads/{unique_filename}"
-
+    # Stream the body to disk, checking the file type and size limit as it arrives
     try:
-        # Save file locally
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Extract users from Excel file using the local path
-        users = read_xlsx_file(file_path)
-
-        # save file to database
-        batch = Batch(file_name=file.filename, url=file_path)
-        await batch.save()
-
-        # Create all call objects in batch
-        calls = []
-        for user in users:
-            call = Call(batch_id=str(batch.id), status=CallStatus.PENDING, user=user)
-            calls.append(call)
-
-        # Batch insert all calls at once
-        await Call.insert_many(calls)
-
-        # Since batch_id is stored as DBRef, we need to query using the batch object
-        calls_with_ids = await Call.find(Call.batch_id == str(batch.id)).to_list()
-        logger.info(f"🔍 Found {len(calls_with_ids)} calls for batch {batch.id}")
+        filename, file_path, file_size, file_sha256 = await save_upload(
+            request, "uploads", SUPPORTED_EXTENSIONS
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"💾 Saved upload {filename}: {file_size} bytes, sha256 {file_sha256}")
 
+    try:
         # Use single assistant ID
         assistant_id = ASSISTANT_ID
         logger.info(f"🌐 Using single assistant: {assistant_id}")
@@ -132,41 +213,68 @@ async def upload_file(file: UploadFile = File(...)):
                 detail="Assistant ID not configured. Please set ASSISTANT_ID environment variable.",
             )
 
-        call_executor = CallExecutor(vapi_client=VAPIClient())
-        responses = []
+        # save file to database
+        batch = Batch(
+            file_name=filename,
+            url=file_path,
+            file_size=file_size,
+            file_sha256=file_sha256,
+        )
+        await batch.save()
+
+        # Insert the calls chunk by chunk and hand them to the durable dial queue
+        summary = await ingest_lead_file(batch, file_path, assistant_id)
 
-        # initiate all calls
-        for call in calls_with_ids[:10]:
-            # Use regular VAPI call
-            res = await call_executor.execute_call(
-                call_data=call, assistant_id=assistant_id
-            )
-            responses.append(res)
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
         return {
             "message": "File uploaded and processed successfully",
-            "original_filename": file.filename,
-            "saved_path": file_path,
-            "total_users": len(users),
-            "call_result": responses,
-            "calls": calls_with_ids,
+            "original_filename": filename,
+            "batch_id": str(batch.id),
+            "total_users": summary["total_calls"],
+            "queued_calls": summary["total_calls"],
+            "chunks": summary["chunks"],
+            "file_sha256": file_sha256,
         }
 
-    except Exception as e:
+    except HTTPException:
         if os.path.exists(file_path):
             os.remove(file_path)
+        raise
+    except Exception as e:
         # Clean up file if it exists
         if os.path.exists(file_path):
             os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 
-from utils.events import handle_call_completion, handle_call_started
+from utils.events import (
+    handle_call_started,
+    enqueue_completion,
+    merge_completion,
+    completion_queue,
+    transcript_sources,
+    start_completion_workers,
+    stop_completion_workers,
+)
+from utils.webhook_events import (
+    COMPLETION_EVENT_TYPES,
+    extract_vapi_call_id,
+    record_webhook_event,
+    release_webhook_event,
+    webhook_stats,
+    PROCESS,
+    MERGE,
+    DUPLICATE,
+)
 
 
 @app.post("/vapi/webhooks/call-events")
-async def handle_call_events(request: Request, background_tasks: BackgroundTasks):
+async def handle_call_events(request: Request):
     """Handle VAPI call events webhook"""
+    # Set once the delivery is recorded for dedup, a failure releases it again
+    recorded = False
     try:
         # Log all incoming webhook requests
         headers = dict(request.headers)
@@ -184,18 +292,47 @@ async def handle_call_events(request: Request, background_tasks: BackgroundTasks
 
         logger.info(f"📞 VAPI webhook type: {event_type}")
 
-        # Return immediately and process in background for long-running operations
-        if event_type in ["call.completed", "call.ended", "end-of-call-report"]:
-            logger.info(f"🎯 Queuing {event_type} webhook for background processing")
-            background_tasks.add_task(handle_call_completion, webhook_data)
+        # Drop repeated deliveries before any transcript fetch, analysis or write
+        vapi_call_id = extract_vapi_call_id(webhook_data)
+        delivery = PROCESS
+        if vapi_call_id and event_type in COMPLETION_EVENT_TYPES + ("call.started",):
+            delivery = await record_webhook_event(vapi_call_id, event_type)
+            if delivery == DUPLICATE:
+                return {
+                    "status": "duplicate",
+                    "event_type": event_type,
+                    "message": "Event already processed for this call",
+                }
+            recorded = True
+
+        # Persist completions for the worker pool and return immediately
+        if event_type in COMPLETION_EVENT_TYPES:
+            if not vapi_call_id:
+                logger.error("No call ID in webhook data")
+                return {"status": "error", "message": "Missing call ID"}
+
+            if delivery == MERGE:
+                logger.info(f"🎯 Merging {event_type} into the completion of call {vapi_call_id}")
+                outcome = await merge_completion(vapi_call_id, webhook_data)
+            else:
+                logger.info(f"🎯 Queuing {event_type} webhook for the completion workers")
+                await enqueue_completion(vapi_call_id, webhook_data)
+                outcome = "queued"
             return {
                 "status": "received",
                 "event_type": event_type,
+                "outcome": outcome,
                 "message": "Webhook queued for background processing",
             }
         elif event_type == "call.started":
             logger.info("🎯 Processing call.started webhook immediately")
-            return await handle_call_started(webhook_data)
+            result = await handle_call_started(webhook_data)
+            # The call may not be saved with its VAPI ID yet, let a retry through
+            if recorded and (
+                result.get("status") == "error" or result.get("outcome") == "not_found"
+            ):
+                await release_webhook_event(vapi_call_id, event_type)
+            return result
         else:
             logger.warning(f"⚠️ Unhandled webhook event type: {event_type}")
             return {
@@ -206,84 +343,354 @@ async def handle_call_events(request: Request, background_tasks: BackgroundTasks
 
     except Exception as e:
         logger.error(f"❌ Error processing webhook: {e}")
+        if recorded:
+            await release_webhook_event(vapi_call_id, event_type)
         import traceback
 
         logger.error(f"📍 Full traceback: {traceback.format_exc()}")
-        return {"status": "error", "message": str(e)}
+        # A 5xx makes VAPI deliver the event again
+        return JSONResponse(status_code=500, content={"status": "error", "message": str(e)})
 
 
-@app.get("/batches")
-async def get_all_batches():
+@app.get("/webhooks/stats")
+async def get_webhook_stats():
     """
-    Get all batches sorted by creation date (latest first)
+    Get webhook deliveries received, processed and skipped as duplicates,
+    where completion transcripts came from and the completion queue depth
+    """
+    return {
+        **webhook_stats,
+        "transcript_sources": transcript_sources,
+        "completion_queue": await completion_queue.counts(),
+    }
+
+
+@app.get("/dialer/stats")
+async def get_dialer_stats():
+    """
+    Get dialer throughput, overall and per batch, the live calls per phone
+    number and the dial queue depth
     """
     try:
-        # Find all batches sorted by created_at in descending order (latest first)
-        batches = await Batch.find_all().sort("-created_at").to_list()
-
-        # Convert batches to dict format for JSON response
-        batches_data = []
-        for batch in batches:
-            batch_dict = {
-                "id": str(batch.id),
-                "file_name": batch.file_name,
-                "url": batch.url,
-                "created_at": batch.created_at.isoformat(),
-            }
-            batches_data.append(batch_dict)
+        dialer = get_dialer()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "overall": dialer.stats.as_dict(),
+        "live_calls": {
+            str(number_id): count for number_id, count in (await count_live_calls()).items()
+        },
+        "queue": await dial_queue.counts(),
+        "batches": {
+            batch_id: stats.as_dict() for batch_id, stats in dialer.batch_stats.items()
+        },
+    }
+
+
+@app.get("/http/pool")
+async def get_http_pool_metrics():
+    """
+    Get connection pool metrics of the shared outbound HTTP client and of
+    the separate pool used for recordings
+    """
+    return {**get_http_client().metrics(), "media": get_media_http_client().metrics()}
+
+
+@app.get("/analysis/stats")
+async def get_analysis_stats():
+    """
+    Get transcript analysis queue depth, worker results and durable job counts
+    """
+    return {**get_analysis_pipeline().metrics(), "jobs": await analysis_queue.counts()}
+
+
+@app.get("/events/stats")
+async def get_call_events_stats():
+    """
+    Get call event subscribers and delivery counters
+    """
+    return get_call_events().metrics()
+
+
+@app.get("/reconciler/stats")
+async def get_reconciler_stats():
+    """
+    Get counters of the stale call reconciler, if it is enabled
+    """
+    if not CALL_RECONCILER_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_call_reconciler().metrics()}
+
+
+@app.get("/batches/{batch_id}/stats")
+async def get_batch_stats(batch_id: str):
+    """
+    Get call counts by status, average quality score and intent distribution of a batch
+    """
+    if not ObjectId.is_valid(batch_id):
+        raise HTTPException(status_code=400, detail=f"Invalid batch ID format: {batch_id}")
+
+    try:
+        batch = await Batch.get(ObjectId(batch_id))
+        if not batch:
+            raise HTTPException(status_code=404, detail=f"Batch not found with ID: {batch_id}")
+
+        stats = await aggregate_batch_stats(batch_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing stats for batch {batch_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error computing batch stats: {str(e)}")
+
+    # The aggregation is exact, a mismatch means the counters drifted (see /recount)
+    counted = {status: count for status, count in batch.status_counts.items() if count}
+    return {
+        "batch_id": batch_id,
+        "file_name": batch.file_name,
+        "ingest_status": batch.ingest_status,
+        "counters": batch_counters(batch),
+        "counters_in_sync": stats["by_status"] == counted,
+        **stats,
+    }
+
+
+@app.post("/batches/{batch_id}/recount")
+async def recount_batch(batch_id: str):
+    """
+    Repair a batch's status counters from its calls. Skipped while the batch is
+    still ingesting; if the counters change during the recount nothing is
+    written and the call can simply be repeated.
+    """
+    if not ObjectId.is_valid(batch_id):
+        raise HTTPException(status_code=400, detail=f"Invalid batch ID format: {batch_id}")
+
+    batch = await Batch.get(ObjectId(batch_id))
+    if not batch:
+        raise HTTPException(status_code=404, detail=f"Batch not found with ID: {batch_id}")
+    if batch.ingest_status == "ingesting":
+        raise HTTPException(status_code=409, detail=f"Batch {batch_id} is still ingesting")
+
+    try:
+        repaired = await recount_batch_counters(batch_id)
+        batch = await Batch.get(ObjectId(batch_id))
+    except Exception as e:
+        logger.error(f"Error recounting batch {batch_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error recounting batch: {str(e)}")
+
+    return {"batch_id": batch_id, "recounted": repaired, "counters": batch_counters(batch)}
+
+
+@app.post("/batches/{batch_id}/redial")
+async def redial_batch_calls(
+    batch_id: str,
+    status: str = "failed,no_show",
+    include_completed: bool = Query(False, description="Also allow completed/done/ended calls"),
+):
+    """
+    Redial every call of a batch in the given statuses (comma separated).
+    Only failed statuses are allowed unless include_completed is set.
+    The calls are reset to pending and dialed by the shared dialer, poll
+    /redials/{redial_id} for progress.
+    """
+    if not ObjectId.is_valid(batch_id):
+        raise HTTPException(status_code=400, detail=f"Invalid batch ID format: {batch_id}")
+
+    allowed = REDIAL_STATUSES + (COMPLETED_REDIAL_STATUSES if include_completed else ())
+    statuses = parse_statuses(status)
+    invalid = [value for value in statuses if value not in allowed]
+    if not statuses or invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid status filter {invalid or status}, allowed: {', '.join(allowed)}",
+        )
+
+    if not ASSISTANT_ID:
+        raise HTTPException(
+            status_code=500,
+            detail="Assistant ID not configured. Please set ASSISTANT_ID environment variable.",
+        )
+
+    try:
+        batch = await Batch.get(ObjectId(batch_id))
+        if not batch:
+            raise HTTPException(status_code=404, detail=f"Batch not found with ID: {batch_id}")
+
+        return await redial_batch(batch_id, statuses, ASSISTANT_ID)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error redialing batch {batch_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error redialing batch: {str(e)}")
+
 
-        return {"total_batches": len(batches_data), "batches": batches_data}
+@app.get("/redials/{redial_id}")
+async def get_redial_progress(redial_id: str):
+    """
+    Get the dial job counts of a bulk redial
+    """
+    progress = await redial_progress(redial_id)
+    if not progress["total"]:
+        raise HTTPException(status_code=404, detail=f"Redial not found with ID: {redial_id}")
+    return {"redial_id": redial_id, **progress}
 
+
+@app.get("/batches/{batch_id}/events")
+async def stream_batch_events(batch_id: str, request: Request):
+    """
+    Server-Sent Events stream of the status changes of a batch's calls
+    """
+    broker = get_call_events()
+    queue = broker.subscribe(batch_id)
+    logger.info(f"📡 Events subscriber joined batch {batch_id}")
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=CALL_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(batch_id, queue)
+            logger.info(f"📡 Events subscriber left batch {batch_id}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/batches")
+async def get_all_batches(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(BATCHES_PAGE_SIZE, ge=1, le=BATCHES_MAX_PAGE_SIZE),
+):
+    """
+    Get one page of batches sorted by creation date (latest first), each with
+    its progress counters
+    """
+    try:
+        page = await find_batches(cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching all batches: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching batches: {str(e)}")
 
+    return {
+        "total_batches": len(page["batches"]),
+        "batches": page["batches"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+    }
+
 
 @app.get("/calls/batch/{batch_id}")
-async def get_calls_by_batch(batch_id: str):
+async def get_calls_by_batch(
+    batch_id: str,
+    status: Optional[str] = Query(None, description="Comma separated statuses, e.g. failed,no_show"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(CALLS_PAGE_SIZE, ge=1, le=CALLS_MAX_PAGE_SIZE),
+    include_transcript: bool = Query(False),
+    since: Optional[str] = Query(None, description="sync_cursor/next_cursor of the last delta sync"),
+):
     """
-    Get all calls for a specific batch ID
+    Get one page of calls for a specific batch ID. Transcripts are left out
+    unless include_transcript is set, use /calls/{call_id} for a single call.
+
+    With since set only the calls updated after that cursor are returned
+    (delta sync), the first listing page carries the sync_cursor to start from.
+    A sync re-sends the calls changed in the last few seconds, de-dupe by _id.
+    since can't be combined with status (a call leaving the status would never
+    be reported) or cursor (the next page of a sync is its next_cursor as since).
     """
-    try:
-        # Find all calls with the given batch_id
-        calls = await Call.find(Call.batch_id == batch_id).to_list()
-
-        if not calls:
+    if since:
+        if status or cursor:
             raise HTTPException(
-                status_code=404, detail=f"No calls found for batch ID: {batch_id}"
+                status_code=400,
+                detail="since can't be combined with status or cursor, "
+                "pass the previous next_cursor as since to page a delta sync",
             )
+        return await get_batch_changes(batch_id, since, limit, include_transcript)
 
-        # Convert calls to dict format for JSON response
-        calls_data = []
-        for call in calls:
-            call_dict = {
-                "id": str(call.id),
-                "batch_id": call.batch_id,
-                "status": call.status,
-                "user": {
-                    "name": call.user.name,
-                    "email": call.user.email,
-                    "phone": call.user.phone,
-                },
-                "call_id": call.vapi_call_id,
-                "call_result": call.call_result.dict() if call.call_result else None,
-                "created_at": call.created_at.isoformat(),
-                "updated_at": call.updated_at.isoformat(),
-            }
-            calls_data.append(call_dict)
+    if cursor and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
 
-        return {
-            "batch_id": batch_id,
-            "total_calls": len(calls_data),
-            "calls": calls_data,
-        }
+    statuses = parse_statuses(status)
 
-    except HTTPException:
-        raise
+    try:
+        # Taken before reading so changes made while paging show up in the next sync
+        sync_cursor = None if cursor else await latest_sync_cursor(batch_id)
+        page = await find_batch_calls(
+            batch_id,
+            statuses=statuses,
+            cursor=cursor,
+            limit=limit,
+            include_transcript=include_transcript,
+        )
     except Exception as e:
         logger.error(f"Error fetching calls for batch {batch_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching calls: {str(e)}")
 
+    if not page["calls"] and not cursor and not statuses:
+        raise HTTPException(
+            status_code=404, detail=f"No calls found for batch ID: {batch_id}"
+        )
+
+    return {
+        "batch_id": batch_id,
+        "count": len(page["calls"]),
+        "calls": page["calls"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+        "sync_cursor": sync_cursor,
+    }
+
+
+async def get_batch_changes(batch_id: str, since: str, limit: int, include_transcript: bool):
+    """Delta sync: calls of the batch updated after the since cursor"""
+    try:
+        page = await find_batch_changes(
+            batch_id, since, limit=limit, include_transcript=include_transcript
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching changed calls for batch {batch_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error fetching calls: {str(e)}")
+
+    return {
+        "batch_id": batch_id,
+        "count": len(page["calls"]),
+        "calls": page["calls"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+    }
+
+
+@app.get("/calls/{call_id}")
+async def get_call(call_id: str):
+    """
+    Get a single call with its full call result, transcript included
+    """
+    if not ObjectId.is_valid(call_id):
+        raise HTTPException(status_code=400, detail=f"Invalid call ID format: {call_id}")
+
+    try:
+        call = await find_call(call_id)
+    except Exception as e:
+        logger.error(f"Error fetching call {call_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error fetching call: {str(e)}")
+
+    if not call:
+        raise HTTPException(status_code=404, detail=f"Call not found with ID: {call_id}")
+
+    return call
+
 
 @app.post("/calls/{call_id}/redial")
 async def redial_call(call_id: str):
@@ -301,6 +708,11 @@ async def redial_call(call_id: str):
             logger.error(f"❌ Invalid call ID provided: {call_id}")
             raise HTTPException(status_code=400, detail="Invalid call ID provided")
 
+        if not get_vapi_client().configured:
+            raise HTTPException(
+                status_code=503, detail="Dialing is disabled, VAPI_API_KEY is not set"
+            )
+
         # Validate ObjectId format
         try:
             object_id = ObjectId(call_id)
@@ -327,18 +739,12 @@ async def redial_call(call_id: str):
 
         # Clear existing call result and set status to redialed
         logger.info(f"🧹 Clearing existing call result for call: {call_id}")
-        await call_record.update(
-            {
-                "$set": {
-                    "call_result": None,
-                    "status": "redialed",
-                    "vapi_call_id": None,
-                    "updated_at": datetime.utcnow(),
-                }
-            }
+        await set_call_status(
+            {"_id": object_id}, "redialed", {"call_result": None, "vapi_call_id": None}
         )
 
         logger.info(f"✅ Cleared call result and set status to redialed")
+        publish_call_event(call_id, call_record.batch_id, "redialed", vapi_call_id=None)
 
         # Use single assistant ID
         assistant_id = ASSISTANT_ID
@@ -352,25 +758,16 @@ async def redial_call(call_id: str):
 
         # Execute the call using CallExecutor
         logger.info(f"🚀 Executing redial for call: {call_id}")
-        call_executor = CallExecutor(vapi_client=VAPIClient())
-
-        # Use regular VAPI call
-        success, vapi_call_id, error_message = await call_executor.execute_call(
-            call_record, assistant_id=assistant_id
-        )
-
-        # Update the call with the new vapi_call_id if successful
-        if success and vapi_call_id:
-            logger.info(f"📞 Updating call with new VAPI call ID: {vapi_call_id}")
-            await call_record.update(
-                {
-                    "$set": {
-                        "vapi_call_id": vapi_call_id,
-                        "updated_at": datetime.utcnow(),
-                    }
-                }
+        # Use regular VAPI call through the shared dialer so limits are respected
+        try:
+            success, vapi_call_id, error_message = await get_dialer().dial(
+                call_record, assistant_id=assistant_id, slot_wait=DIALER_SLOT_WAIT
             )
+        except NoFreeNumber as e:
+            raise HTTPException(status_code=503, detail=str(e))
 
+        # The executor saves the new VAPI call ID and the dialer publishes the
+        # ringing event, or marks the call failed when the dial doesn't go through
         if success and vapi_call_id:
             logger.success(f"✅ Redial successful for call: {call_id}")
             logger.success(f"📞 New VAPI call ID: {vapi_call_id}")
@@ -379,17 +776,12 @@ async def redial_call(call_id: str):
                 "status": "success",
                 "message": "Call redialed successfully",
                 "call_id": call_id,
-                "call_id": vapi_call_id,
+                "vapi_call_id": vapi_call_id,
             }
         else:
             logger.error(f"❌ Redial failed for call: {call_id}")
             logger.error(f"❌ Error: {error_message}")
 
-            # Update call status to failed
-            await call_record.update(
-                {"$set": {"status": CallStatus.FAILED, "updated_at": datetime.utcnow()}}
-            )
-
             raise HTTPException(
                 status_code=500, detail=f"Failed to redial call: {error_message}"
             )
@@ -404,16 +796,39 @@ async def redial_call(call_id: str):
         raise HTTPException(status_code=500, detail=f"Error redialing call: {str(e)}")
 
 
+@app.get("/media-cache/stats")
+async def get_media_cache_stats():
+    """
+    Get hit/miss counters and disk usage of the recordings cache
+    """
+    return get_media_cache().metrics()
+
+
+@app.get("/recordings/stats")
+async def get_recording_store_stats():
+    """
+    Get archival counters and the size of the local recording store
+    """
+    return get_recording_store().metrics()
+
+
 @app.get("/media/{path:path}")
-async def proxy_media(path: str):
+async def proxy_media(path: str, request: Request):
+    # Archived recordings are served straight from local disk
+    recording = get_recording_store().get(path)
+    if recording:
+        return stored_response(recording, request, path)
+
     # Use VAPI storage domain for proxying, but serve through custom domain
     url = f"{VAPI_STORAGE_DOMAIN}/{path}"
     logger.info(f"🔍 Proxying media: {url}")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers={"Referer": f"{VAPI_STORAGE_DOMAIN}/"})
-
-    # Pass through the original content with headers
-    return Response(content=r.content, media_type=r.headers.get("content-type"))
+    try:
+        return await serve_media(
+            path, url, request, origin_headers={"Referer": f"{VAPI_STORAGE_DOMAIN}/"}
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"❌ Error proxying media {url}: {e}")
+        raise HTTPException(status_code=502, detail=f"Error fetching media: {str(e)}")
 
 
 
@@ -584,18 +999,6 @@ async def custom_assistant_webhook(request: Request):
         logger.info(f"📞 Phone: {phone_number}")
         logger.info(f"👤 Name: {name}")
 
-        # Find call record by vapi_call_id (which stores call_sid for custom calls)
-        call_record = await Call.find_one(Call.vapi_call_id == call_sid)
-
-        if not call_record:
-            logger.error(f"❌ Call record not found for call_sid: {call_sid}")
-            raise HTTPException(
-                status_code=404,
-                detail=f"Call record not found for call_sid: {call_sid}",
-            )
-
-        logger.info(f"✅ Found call record: {call_record.id}")
-
         # Map custom status to CallStatus enum
         status_mapping = {
             "call_initiated": CallStatus.INITIATED,
@@ -622,58 +1025,46 @@ async def custom_assistant_webhook(request: Request):
             "updated_at": datetime.utcnow(),
         }
 
-        # Update call record
-        update_data = {
-            "status": mapped_status,
-            "call_result": call_result_data,
-            "updated_at": datetime.utcnow(),
-        }
+        # Update the call in one guarded round trip keyed on vapi_call_id (which
+        # stores call_sid for custom calls), out of order statuses never regress it
+        previous, outcome = await advance_call_status(
+            call_sid, mapped_status, {"call_result": call_result_data}
+        )
 
-        await call_record.update({"$set": update_data})
+        if outcome == "not_found":
+            logger.error(f"❌ Call record not found for call_sid: {call_sid}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"Call record not found for call_sid: {call_sid}",
+            )
+
+        call_id = str(previous["_id"])
+        if outcome == "stale":
+            return {
+                "status": "ignored",
+                "message": f"Call is already {previous.get('status')}",
+                "call_id": call_id,
+                "call_sid": call_sid,
+            }
+
+        publish_call_event(call_id, previous["batch_id"], mapped_status, vapi_call_id=call_sid)
         logger.success(
-            f"✅ Updated call record {call_record.id} with status: {mapped_status}"
+            f"✅ Updated call record {call_id} with status: {mapped_status}"
         )
 
-        # Trigger analysis if transcript is available
+        # Queue analysis if transcript is available, workers write the result later
         if transcript and len(transcript.strip()) > 0:
-            logger.info(f"🔍 Triggering analysis for call {call_record.id}")
-            try:
-                from utils.analyst import analyze_transcript
-
-                analysis_result = analyze_transcript(transcript)
-
-                # Update call_result with analysis
-                analysis_data = {
-                    "summary": analysis_result.summary,
-                    "quality_score": analysis_result.quality_score,
-                    "customer_intent": analysis_result.customer_intent,
-                    "updated_at": datetime.utcnow(),
-                }
-
-                # Merge with existing call_result
-                current_call_result = (
-                    call_record.call_result.dict() if call_record.call_result else {}
-                )
-                current_call_result.update(analysis_data)
-
-                await call_record.update({"$set": {"call_result": current_call_result}})
-                logger.success(f"✅ Analysis completed for call {call_record.id}")
-                logger.info(f"📊 Analysis summary: {analysis_result.summary}")
-                logger.info(f"📊 Quality score: {analysis_result.quality_score}")
-                logger.info(f"📊 Customer intent: {analysis_result.customer_intent}")
-
-            except Exception as e:
-                logger.error(f"❌ Analysis failed for call {call_record.id}: {str(e)}")
-                # Don't fail the webhook if analysis fails
+            logger.info(f"🔍 Queuing analysis for call {call_id}")
+            await enqueue_analysis(AnalysisRequest(call_id=call_id, transcript=transcript))
         else:
             logger.info(
-                f"⚠️ No transcript available for analysis in call {call_record.id}"
+                f"⚠️ No transcript available for analysis in call {call_id}"
             )
 
         return {
             "status": "success",
             "message": "Webhook processed successfully",
-            "call_id": str(call_record.id),
+            "call_id": call_id,
             "call_sid": call_sid,
             "updated_status": mapped_status,
         }
@@ -1,11 +1,12 @@
 import asyncio
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from pydantic import Field, BaseModel
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 from enum import Enum
 from beanie import Document, Link, init_beanie
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from dotenv import load_dotenv
 
 
@@ -23,8 +24,20 @@ client: Optional[AsyncIOMotorClient] = None
 class Batch(Document):
     file_name: str
     url: str
+    file_size: Optional[int] = None
+    file_sha256: Optional[str] = None
+    ingest_status: str = "ingesting"  # ingesting -> ready | failed
+    # Last sign of life from the ingest, a batch stuck ingesting past it is swept at startup
+    ingest_updated_at: datetime = Field(default_factory=datetime.utcnow)
+    total_calls: int = 0
+    # Calls per status, kept up to date with $inc on every status change
+    status_counts: Dict[str, int] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    class Settings:
+        indexes = [
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        ]
 
 
 
@@ -54,8 +67,11 @@ class User(BaseModel):
 class CallResult(BaseModel):
     summary: Optional[str] = None
     transcript: Optional[str] = None
+    transcript_source: Optional[str] = None  # webhook | api | webhook_fallback | none
     quality_score: Optional[float] = None
     customer_intent: Optional[str] = None
+    # Set when every analysis attempt failed and the fields hold the default result
+    analysis_failed: Optional[bool] = None
     recording_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -68,9 +84,122 @@ class Call(Document):
     status: str = CallStatus.PENDING
     user: User
     vapi_call_id: Optional[str] = None
+    # VAPI phone number the call was placed from, live calls count against its cap
+    phone_number_id: Optional[str] = None
     call_result: Optional[CallResult] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Reconciler lookups VAPI answered without the call, and when to look again
+    reconcile_misses: int = 0
+    reconcile_after: Optional[datetime] = None
+    # Tag of the last bulk status change that moved the call, to tell which calls it moved
+    status_op: Optional[str] = None
+
+    class Settings:
+        indexes = [
+            # Unique only for real ids - pending calls store vapi_call_id as null,
+            # which a sparse index would still index (and reject as duplicates)
+            IndexModel(
+                [("vapi_call_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"vapi_call_id": {"$type": "string"}},
+            ),
+            # Batch listings page on _id, with and without a status filter
+            IndexModel([("batch_id", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("batch_id", ASCENDING), ("_id", ASCENDING)]),
+            # Delta sync walks a batch in (updated_at, _id) order
+            IndexModel([("batch_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)]),
+            # The reconciler looks for calls stuck in a live status
+            IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)]),
+        ]
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"  # Waiting for a worker
+    LEASED = "leased"  # Taken by a worker until lease_expires_at
+    DONE = "done"  # Acknowledged by a worker
+    DEAD = "dead"  # Gave up after max_attempts
+
+
+class Job(Document):
+    """Durable work item, unique per (queue, key) - dial jobs are keyed on Call._id"""
+
+    queue: str
+    key: str
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    status: str = JobStatus.QUEUED
+    attempts: int = 0
+    max_attempts: int = 5
+    available_at: datetime = Field(default_factory=datetime.utcnow)
+    lease_token: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "jobs"
+        indexes = [
+            IndexModel([("queue", ASCENDING), ("key", ASCENDING)], unique=True),
+            IndexModel(
+                [("queue", ASCENDING), ("status", ASCENDING), ("available_at", ASCENDING)]
+            ),
+            IndexModel(
+                [("queue", ASCENDING), ("status", ASCENDING), ("lease_expires_at", ASCENDING)]
+            ),
+            # Progress of a bulk redial, only its dial jobs carry a redial_id
+            IndexModel(
+                [("queue", ASCENDING), ("payload.redial_id", ASCENDING), ("status", ASCENDING)],
+                partialFilterExpression={"payload.redial_id": {"$exists": True}},
+            ),
+        ]
+
+
+class AnalysisCacheEntry(Document):
+    """Transcript analysis result keyed by hash(transcript, prompt version, model)"""
+
+    key: str
+    prompt_version: str
+    model: str
+    summary: str
+    quality_score: float
+    customer_intent: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "analysis_cache"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            IndexModel(
+                [("created_at", ASCENDING)],
+                expireAfterSeconds=int(os.getenv("ANALYSIS_CACHE_TTL_DAYS", "30")) * 86400,
+            ),
+        ]
+
+
+class WebhookEvent(Document):
+    """
+    One row per (VAPI call, event kind) - completion webhooks of every type share
+    the "completion" kind - so duplicate deliveries are found before any work
+    """
+
+    key: str
+    vapi_call_id: str
+    kind: str
+    event_types: List[str] = Field(default_factory=list)
+    deliveries: int = 1
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+    last_received_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "webhook_events"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            IndexModel(
+                [("received_at", ASCENDING)],
+                expireAfterSeconds=int(os.getenv("WEBHOOK_EVENT_TTL_HOURS", "72")) * 3600,
+            ),
+        ]
 
 
 async def connect_to_db():
@@ -108,7 +237,7 @@ async def connect_to_db():
         # Initialize Beanie with the Motor database and document models
         await init_beanie(
             database=database, 
-            document_models=[Batch, Call, ]
+            document_models=[Batch, Call, Job, AnalysisCacheEntry, WebhookEvent]
         )
         
         logger.info("✅ Successfully connected to MongoDB using Motor")
@@ -145,3 +274,63 @@ def get_database():
         raise RuntimeError("Database not connected. Call connect_to_db() first.")
     
     return client[DB_NAME]
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Collect every stage name of an explain() winning plan"""
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def check_query_plans():
+    """
+    Run explain() on the hot queries and warn about any that would scan the
+    whole collection. Meant to be called on startup, never raises.
+    """
+    hot_queries = [
+        ("Call by vapi_call_id", Call, {"vapi_call_id": "explain-check"}, None),
+        ("Calls by batch", Call, {"batch_id": "explain-check"}, None),
+        (
+            "Pending calls by batch",
+            Call,
+            {"batch_id": "explain-check", "status": CallStatus.PENDING.value},
+            None,
+        ),
+        (
+            "Changed calls by batch",
+            Call,
+            {"batch_id": "explain-check", "updated_at": {"$gt": datetime.utcnow()}},
+            [("updated_at", ASCENDING), ("_id", ASCENDING)],
+        ),
+        (
+            "Stale calls by status",
+            Call,
+            {
+                "status": {"$in": [CallStatus.INITIATED.value]},
+                "updated_at": {"$lt": datetime.utcnow()},
+                "reconcile_after": {"$not": {"$gt": datetime.utcnow()}},
+            },
+            [("updated_at", ASCENDING)],
+        ),
+        ("Batches by created_at", Batch, {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ]
+
+    for label, document, query, sort in hot_queries:
+        try:
+            cursor = document.get_motor_collection().find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explanation = await cursor.explain()
+            winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+            stages = _plan_stages(winning_plan)
+            if "COLLSCAN" in stages:
+                logger.warning(f"⚠️ Query plan check: '{label}' would COLLSCAN ({stages})")
+            else:
+                logger.info(f"✅ Query plan check: '{label}' uses {stages}")
+        except Exception as e:
+            logger.warning(f"⚠️ Query plan check for '{label}' failed: {e}")
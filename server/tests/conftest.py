@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+# Use litellm's bundled model cost map instead of fetching it while the tests import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+try:
+    import mongomock.collection
+except ImportError:
+    mongomock = None
+else:
+    # pymongo 4.9+ hands bulk updates a sort argument mongomock doesn't take yet
+    _add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def _add_update_without_sort(self, *args, sort=None, **kwargs):
+        return _add_update(self, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = _add_update_without_sort
+
+
+@pytest.fixture
+def mongo():
+    """
+    In-memory Mongo (mongomock-motor) with every Beanie model on it. Returns a
+    coroutine function to await first thing in the test's event loop.
+    """
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from beanie import init_beanie
+
+    from model.model import AnalysisCacheEntry, Batch, Call, Job, WebhookEvent
+
+    async def init():
+        client = mongomock_motor.AsyncMongoMockClient()
+        await init_beanie(
+            database=client["test"],
+            document_models=[Batch, Call, Job, AnalysisCacheEntry, WebhookEvent],
+            # mongomock ignores partial filters, the unique indexes would reject nulls
+            skip_indexes=True,
+        )
+        return client
+
+    return init
@@ -0,0 +1,280 @@
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+import pytest
+
+from model.model import AnalysisCacheEntry
+from utils import analysis_pipeline, analyst
+from utils.analysis_cache import BATCH_PROMPT, PROMPT_VERSIONS, SINGLE_PROMPT, AnalysisCache
+from utils.analysis_pipeline import AnalysisFailed, AnalysisPipeline, AnalysisRequest
+from utils.analyst import AnalystResult, default_analyst_result
+
+
+class MemoryCache(AnalysisCache):
+    """AnalysisCache without the Mongo layer"""
+
+    def __init__(self, fail_puts: bool = False):
+        super().__init__()
+        self.fail_puts = fail_puts
+
+    async def get(self, keys: List[str]) -> Optional[AnalystResult]:
+        return next((self.memory[key] for key in keys if key in self.memory), None)
+
+    async def put(self, key: str, result: AnalystResult, prompt: str = SINGLE_PROMPT):
+        if self.fail_puts:
+            raise RuntimeError("cache down")
+        self._remember(key, result)
+
+
+def result_for(transcript: str) -> AnalystResult:
+    return AnalystResult(summary=f"summary of {transcript}", quality_score=7.5, customer_intent="booking")
+
+
+@pytest.fixture
+def saved(monkeypatch) -> Dict[str, AnalystResult]:
+    """Capture save_analysis calls instead of writing to Mongo"""
+    results: Dict[str, AnalystResult] = {}
+
+    async def save_analysis(request: AnalysisRequest, result: AnalystResult, failed: bool = False):
+        results[request.call_id] = result
+        if failed:
+            results[f"{request.call_id}:failed"] = result
+
+    monkeypatch.setattr(analysis_pipeline, "save_analysis", save_analysis)
+    return results
+
+
+def run_pipeline(pipeline: AnalysisPipeline, requests: List[AnalysisRequest], start: bool = True):
+    """Analyze every request concurrently, returning each result or exception"""
+
+    async def run():
+        if start:
+            pipeline.start()
+        try:
+            return await asyncio.gather(
+                *(pipeline.submit(request) for request in requests), return_exceptions=True
+            )
+        finally:
+            await pipeline.stop()
+
+    return asyncio.run(run())
+
+
+def test_batches_transcripts_into_one_request(saved):
+    batches = []
+
+    async def analyze(transcript: str) -> AnalystResult:
+        raise AssertionError("batched transcripts should not be analyzed one by one")
+
+    async def analyze_many(transcripts: Dict[str, str]) -> Dict[str, AnalystResult]:
+        batches.append(dict(transcripts))
+        return {position: result_for(transcript) for position, transcript in transcripts.items()}
+
+    cache = MemoryCache()
+    pipeline = AnalysisPipeline(
+        analyze=analyze, analyze_many=analyze_many, concurrency=1,
+        batch_size=4, batch_window=0.5, cache=cache,
+    )
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript=f"transcript {i}") for i in range(4)]
+    assert run_pipeline(pipeline, requests) == [result_for(request.transcript) for request in requests]
+
+    # Batch prompt results are cached under the batch prompt's key
+    assert set(cache.memory) == {cache.key(request.transcript, BATCH_PROMPT) for request in requests}
+
+    assert len(batches) == 1 and len(batches[0]) == 4
+    assert saved == {request.call_id: result_for(request.transcript) for request in requests}
+    assert pipeline.stats["batches"] == 1
+    assert pipeline.stats["batched_transcripts"] == 4
+
+
+def test_missing_batch_results_fall_back_to_single_requests(saved):
+    singles = []
+
+    async def analyze(transcript: str) -> AnalystResult:
+        singles.append(transcript)
+        return result_for(transcript)
+
+    async def analyze_many(transcripts: Dict[str, str]) -> Dict[str, AnalystResult]:
+        # The model only answered for the first transcript
+        return {"0": result_for(transcripts["0"])}
+
+    pipeline = AnalysisPipeline(
+        analyze=analyze, analyze_many=analyze_many, concurrency=1,
+        batch_size=3, batch_window=0.5, cache=MemoryCache(),
+    )
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript=f"transcript {i}") for i in range(3)]
+    run_pipeline(pipeline, requests)
+
+    assert sorted(singles) == ["transcript 1", "transcript 2"]
+    assert saved == {request.call_id: result_for(request.transcript) for request in requests}
+
+
+def test_failed_batch_falls_back_to_single_requests(saved):
+    async def analyze(transcript: str) -> AnalystResult:
+        return result_for(transcript)
+
+    async def analyze_many(transcripts: Dict[str, str]) -> Dict[str, AnalystResult]:
+        raise RuntimeError("model unavailable")
+
+    pipeline = AnalysisPipeline(
+        analyze=analyze, analyze_many=analyze_many, concurrency=1,
+        batch_size=2, batch_window=0.5, cache=MemoryCache(),
+    )
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript=f"transcript {i}") for i in range(2)]
+    run_pipeline(pipeline, requests)
+
+    assert saved == {request.call_id: result_for(request.transcript) for request in requests}
+
+
+def test_timeout_raises_so_the_job_is_retried(saved):
+    async def analyze(transcript: str) -> AnalystResult:
+        await asyncio.sleep(5)
+        return result_for(transcript)
+
+    cache = MemoryCache()
+    pipeline = AnalysisPipeline(analyze=analyze, concurrency=1, batch_size=1, timeout=0.05, cache=cache)
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript="slow transcript") for i in range(2)]
+    results = run_pipeline(pipeline, requests)
+
+    # The duplicate waiting on the same transcript fails with it
+    assert all(isinstance(result, AnalysisFailed) for result in results)
+    assert pipeline.stats["timed_out"] == 1
+    assert not saved
+    assert not cache.memory
+    assert not pipeline.pending
+
+
+def test_model_errors_raise(saved):
+    async def analyze(transcript: str) -> AnalystResult:
+        raise RuntimeError("rate limited")
+
+    pipeline = AnalysisPipeline(analyze=analyze, concurrency=1, batch_size=1, cache=MemoryCache())
+    results = run_pipeline(pipeline, [AnalysisRequest(call_id="call-1", transcript="hello")])
+
+    assert isinstance(results[0], AnalysisFailed)
+    assert not saved
+
+
+class FailingPipeline:
+    async def submit(self, request: AnalysisRequest) -> AnalystResult:
+        raise AnalysisFailed("model down")
+
+
+def test_analysis_job_retries_before_the_last_attempt(saved, monkeypatch):
+    monkeypatch.setattr(analysis_pipeline, "analysis_pipeline", FailingPipeline())
+    job = {"attempts": 1, "max_attempts": 3, "payload": {"call_id": "call-1", "transcript": "hello"}}
+
+    with pytest.raises(AnalysisFailed):
+        asyncio.run(analysis_pipeline.handle_analysis_job(job))
+    assert not saved
+
+
+def test_analysis_job_saves_the_default_on_the_last_attempt(saved, monkeypatch):
+    monkeypatch.setattr(analysis_pipeline, "analysis_pipeline", FailingPipeline())
+    job = {"attempts": 3, "max_attempts": 3, "payload": {"call_id": "call-1", "transcript": "hello"}}
+
+    asyncio.run(analysis_pipeline.handle_analysis_job(job))
+    assert saved == {"call-1": default_analyst_result(), "call-1:failed": default_analyst_result()}
+
+
+def test_identical_transcripts_share_one_analysis(saved):
+    calls = []
+
+    async def analyze(transcript: str) -> AnalystResult:
+        calls.append(transcript)
+        await asyncio.sleep(0.05)
+        return result_for(transcript)
+
+    pipeline = AnalysisPipeline(analyze=analyze, concurrency=1, batch_size=1, cache=MemoryCache())
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript="same transcript") for i in range(3)]
+    run_pipeline(pipeline, requests)
+
+    assert calls == ["same transcript"]
+    assert set(saved) == {"call-0", "call-1", "call-2"}
+    assert pipeline.stats["deduplicated"] == 2
+    assert not pipeline.pending
+
+
+def test_cached_transcripts_skip_the_model(saved):
+    async def analyze(transcript: str) -> AnalystResult:
+        raise AssertionError("cached transcripts should not be analyzed")
+
+    cache = MemoryCache()
+    cache._remember(cache.key("known transcript"), result_for("known transcript"))
+    pipeline = AnalysisPipeline(analyze=analyze, concurrency=1, batch_size=1, cache=cache)
+    run_pipeline(pipeline, [AnalysisRequest(call_id="call-1", transcript="known transcript")])
+
+    assert saved == {"call-1": result_for("known transcript")}
+    assert pipeline.stats["cached"] == 1
+
+
+def test_failed_saves_release_pending_transcripts(monkeypatch):
+    saved = []
+
+    async def save_analysis(request: AnalysisRequest, result: AnalystResult):
+        if request.call_id == "call-0":
+            raise RuntimeError("mongo down")
+        saved.append(request.call_id)
+
+    monkeypatch.setattr(analysis_pipeline, "save_analysis", save_analysis)
+
+    async def analyze_many(transcripts: Dict[str, str]) -> Dict[str, AnalystResult]:
+        return {position: result_for(transcript) for position, transcript in transcripts.items()}
+
+    # The cache write fails too, neither may leave keys behind in pending
+    pipeline = AnalysisPipeline(
+        analyze_many=analyze_many, concurrency=1, batch_size=3,
+        batch_window=0.5, cache=MemoryCache(fail_puts=True),
+    )
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript=f"transcript {i}") for i in range(3)]
+    results = run_pipeline(pipeline, requests)
+
+    # The failed save raises so its analysis job is retried
+    assert isinstance(results[0], RuntimeError)
+    assert results[1:] == [result_for("transcript 1"), result_for("transcript 2")]
+    assert saved == ["call-1", "call-2"]
+    assert not pipeline.pending
+
+
+def test_full_queue_rejects_every_waiting_duplicate(saved):
+    # No workers, the single queue slot stays taken
+    pipeline = AnalysisPipeline(concurrency=1, queue_size=1, submit_timeout=0.05, cache=MemoryCache())
+    pipeline.queue.put_nowait(AnalysisRequest(call_id="call-0", transcript="queued"))
+    requests = [AnalysisRequest(call_id=f"call-{i}", transcript="same transcript") for i in (1, 2)]
+    results = run_pipeline(pipeline, requests, start=False)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert pipeline.stats["rejected"] == 1
+    assert not pipeline.pending
+    assert not saved
+
+
+def test_mock_response_runs_the_default_analyst(saved, monkeypatch):
+    response = {"summary": "Booking confirmed", "quality_score": 10.0, "customer_intent": "booking"}
+    monkeypatch.setattr(analyst, "ANALYST_MOCK_RESPONSE", json.dumps(response))
+
+    pipeline = AnalysisPipeline(concurrency=1, batch_size=1, cache=MemoryCache())
+    run_pipeline(pipeline, [AnalysisRequest(call_id="call-1", transcript="hello")])
+
+    assert saved == {"call-1": AnalystResult(**response)}
+
+
+def test_cache_keys_results_on_the_prompt_variant(mongo):
+    async def run():
+        await mongo()
+        writer = AnalysisCache()
+        key = writer.key("batched transcript", BATCH_PROMPT)
+        assert key != writer.key("batched transcript")
+        await writer.put(key, result_for("batched transcript"), BATCH_PROMPT)
+
+        # A fresh process finds the batch result through Mongo, stamped with the batch prompt's version
+        reader = AnalysisCache()
+        assert await reader.get(reader.keys("batched transcript")) == result_for("batched transcript")
+        assert await reader.get([reader.key("batched transcript")]) is None
+        assert reader.stats["db_hits"] == 1 and reader.stats["misses"] == 1
+
+        entry = await AnalysisCacheEntry.find_one(AnalysisCacheEntry.key == key)
+        assert entry.prompt_version == PROMPT_VERSIONS[BATCH_PROMPT] != PROMPT_VERSIONS[SINGLE_PROMPT]
+
+    asyncio.run(run())
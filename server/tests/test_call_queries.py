@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from bson import ObjectId
+
+from model.model import Batch, Call
+from utils.call_queries import (
+    decode_time_cursor,
+    encode_time_cursor,
+    find_batch_calls,
+    find_batch_changes,
+    find_batches,
+    settled_cursor,
+)
+
+BATCH_ID = "batch-1"
+
+
+def millis(value: datetime) -> datetime:
+    """Mongo keeps datetimes to the millisecond"""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+async def insert_calls(updated_at: List[datetime], status: str = "pending") -> List[ObjectId]:
+    documents = [
+        {
+            "_id": ObjectId(),
+            "batch_id": BATCH_ID,
+            "status": status,
+            "user": {"name": f"Lead {index}", "email": "lead@example.com", "phone": "+15550000000"},
+            "created_at": at,
+            "updated_at": at,
+        }
+        for index, at in enumerate(updated_at)
+    ]
+    await Call.get_motor_collection().insert_many(documents)
+    return [document["_id"] for document in documents]
+
+
+def test_time_cursor_round_trip():
+    at = millis(datetime(2024, 5, 1, 12, 30, 15, 123000))
+    document_id = ObjectId()
+    assert decode_time_cursor(encode_time_cursor(at, document_id)) == (at, document_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "123", "abc_" + "0" * 24, "123_not-an-id"])
+def test_decode_time_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_time_cursor(cursor)
+
+
+def test_settled_cursor_never_points_into_the_overlap_window():
+    document_id = ObjectId()
+    old = encode_time_cursor(millis(datetime.utcnow() - timedelta(minutes=5)), document_id)
+    assert settled_cursor(old, overlap=30) == old
+
+    recent = encode_time_cursor(millis(datetime.utcnow()), document_id)
+    settled_at, settled_id = decode_time_cursor(settled_cursor(recent, overlap=30))
+    assert settled_at <= datetime.utcnow() - timedelta(seconds=29)
+    assert settled_id == ObjectId("0" * 24)
+
+
+def test_calls_keyset_pages_cover_the_filter_once(mongo):
+    async def run():
+        await mongo()
+        now = millis(datetime.utcnow())
+        failed = await insert_calls([now] * 7, status="failed")
+        await insert_calls([now] * 5, status="completed")
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = await find_batch_calls(BATCH_ID, statuses=["failed"], cursor=cursor, limit=3)
+            seen += [call["id"] for call in page["calls"]]
+            pages += 1
+            if not page["has_more"]:
+                assert page["next_cursor"] is None
+                break
+            cursor = page["next_cursor"]
+        return seen, failed, pages
+
+    seen, failed, pages = asyncio.run(run())
+    assert seen == [str(call_id) for call_id in failed]
+    assert pages == 3
+
+
+def test_listing_leaves_transcripts_out_unless_asked(mongo):
+    async def run():
+        await mongo()
+        [call_id] = await insert_calls([millis(datetime.utcnow())])
+        await Call.get_motor_collection().update_one(
+            {"_id": call_id}, {"$set": {"call_result": {"transcript": "hello", "summary": "short"}}}
+        )
+        lean = await find_batch_calls(BATCH_ID)
+        full = await find_batch_calls(BATCH_ID, include_transcript=True)
+        return lean["calls"][0]["call_result"], full["calls"][0]["call_result"]
+
+    lean, full = asyncio.run(run())
+    assert lean == {"summary": "short"}
+    assert full["transcript"] == "hello"
+
+
+def test_delta_sync_pages_through_ties_on_updated_at(mongo):
+    async def run():
+        await mongo()
+        start = millis(datetime.utcnow() - timedelta(minutes=10))
+        # Four calls share each timestamp, so page boundaries fall inside ties
+        ids = await insert_calls([start + timedelta(seconds=index // 4) for index in range(10)])
+
+        seen, since = [], encode_time_cursor(start - timedelta(seconds=1), ObjectId("0" * 24))
+        while True:
+            page = await find_batch_changes(BATCH_ID, since, limit=3)
+            seen += [call["id"] for call in page["calls"]]
+            since = page["next_cursor"]
+            if not page["has_more"]:
+                break
+
+        # Caught up: nothing left past the final cursor
+        caught_up = await find_batch_changes(BATCH_ID, since, limit=3)
+        return seen, ids, caught_up
+
+    seen, ids, caught_up = asyncio.run(run())
+    assert seen == [str(call_id) for call_id in ids]
+    assert caught_up["calls"] == []
+
+
+def test_delta_sync_resends_recent_changes(mongo):
+    async def run():
+        await mongo()
+        [call_id] = await insert_calls([millis(datetime.utcnow())])
+        since = encode_time_cursor(millis(datetime.utcnow() - timedelta(minutes=10)), ObjectId("0" * 24))
+
+        first = await find_batch_changes(BATCH_ID, since)
+        # The change is inside the overlap window, the next poll sees it again
+        again = await find_batch_changes(BATCH_ID, first["next_cursor"])
+        return call_id, first, again
+
+    call_id, first, again = asyncio.run(run())
+    assert [call["id"] for call in first["calls"]] == [str(call_id)]
+    assert [call["id"] for call in again["calls"]] == [str(call_id)]
+
+
+def test_batches_keyset_pages_latest_first_across_ties(mongo):
+    async def run():
+        await mongo()
+        start = millis(datetime.utcnow() - timedelta(days=1))
+        batches = []
+        for index in range(7):
+            batch = Batch(
+                file_name=f"leads-{index}.csv",
+                url=f"uploads/leads-{index}.csv",
+                # Pairs of batches created in the same millisecond
+                created_at=start + timedelta(seconds=index // 2),
+                status_counts={"pending": 2, "failed": 1},
+                total_calls=3,
+            )
+            await batch.insert()
+            batches.append(batch)
+
+        seen, cursor = [], None
+        while True:
+            page = await find_batches(cursor=cursor, limit=2)
+            seen += page["batches"]
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+        return batches, seen
+
+    batches, seen = asyncio.run(run())
+    expected = sorted(batches, key=lambda batch: (batch.created_at, batch.id), reverse=True)
+    assert [batch["id"] for batch in seen] == [str(batch.id) for batch in expected]
+    assert seen[0]["counters"] == {
+        "total": 3, "pending": 2, "in_progress": 0, "completed": 0, "failed": 1
+    }
@@ -0,0 +1,139 @@
+import asyncio
+from typing import Dict, List
+
+from model.model import Batch, Call, CallStatus, User
+from utils.call_status import (
+    advance_call_status,
+    bulk_set_call_status,
+    set_calls_status,
+    statuses_not_before,
+)
+
+
+async def make_batch(statuses: List[str]) -> Batch:
+    """A batch with one call per status, VAPI IDs vapi-0, vapi-1, ... and matching counters"""
+    counts: Dict[str, int] = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    batch = Batch(
+        file_name="leads.csv", url="uploads/leads.csv", total_calls=len(statuses), status_counts=counts
+    )
+    await batch.insert()
+    for index, status in enumerate(statuses):
+        await Call(
+            batch_id=str(batch.id),
+            user=User(name=f"Lead {index}", email=f"lead{index}@example.com", phone="+15550000000"),
+            status=status,
+            vapi_call_id=f"vapi-{index}",
+        ).insert()
+    return batch
+
+
+async def counts(batch: Batch) -> Dict[str, int]:
+    stored = await Batch.get(batch.id)
+    return {status: count for status, count in stored.status_counts.items() if count}
+
+
+async def raw_calls(batch: Batch) -> List[dict]:
+    cursor = Call.get_motor_collection().find(
+        {"batch_id": str(batch.id)}, {"batch_id": 1, "status": 1}
+    ).sort("vapi_call_id", 1)
+    return [call async for call in cursor]
+
+
+def test_statuses_not_before_blocks_only_same_or_later_ranks():
+    blocked = statuses_not_before(CallStatus.IN_PROGRESS.value)
+    assert CallStatus.PENDING.value not in blocked
+    assert CallStatus.INITIATED.value not in blocked
+    # Same status merges, equally ranked and finished statuses don't go back
+    assert CallStatus.IN_PROGRESS.value not in blocked
+    assert CallStatus.ACTIVE.value in blocked
+    assert CallStatus.COMPLETED.value in blocked and CallStatus.FAILED.value in blocked
+
+
+def test_advance_moves_forward_and_the_counters_with_it(mongo):
+    async def run():
+        await mongo()
+        batch = await make_batch([CallStatus.INITIATED.value])
+
+        previous, outcome = await advance_call_status("vapi-0", CallStatus.IN_PROGRESS)
+        assert outcome == "updated" and previous["status"] == CallStatus.INITIATED.value
+        assert await counts(batch) == {CallStatus.IN_PROGRESS.value: 1}
+
+        previous, outcome = await advance_call_status(
+            "vapi-0", CallStatus.COMPLETED, {"call_result": {"summary": "booked"}}
+        )
+        assert outcome == "updated"
+        call = await Call.find_one({"vapi_call_id": "vapi-0"})
+        assert call.status == CallStatus.COMPLETED and call.call_result.summary == "booked"
+        assert await counts(batch) == {CallStatus.COMPLETED.value: 1}
+
+    asyncio.run(run())
+
+
+def test_late_event_does_not_move_a_call_back(mongo):
+    async def run():
+        await mongo()
+        batch = await make_batch([CallStatus.COMPLETED.value])
+
+        current, outcome = await advance_call_status("vapi-0", CallStatus.IN_PROGRESS)
+        assert outcome == "stale" and current["status"] == CallStatus.COMPLETED.value
+        assert (await Call.find_one({"vapi_call_id": "vapi-0"})).status == CallStatus.COMPLETED
+        assert await counts(batch) == {CallStatus.COMPLETED.value: 1}
+
+        assert await advance_call_status("vapi-missing", CallStatus.IN_PROGRESS) == (None, "not_found")
+
+    asyncio.run(run())
+
+
+def test_same_status_merges_without_touching_the_counters(mongo):
+    async def run():
+        await mongo()
+        batch = await make_batch([CallStatus.COMPLETED.value])
+
+        _, outcome = await advance_call_status(
+            "vapi-0", CallStatus.COMPLETED, {"call_result": {"summary": "from the report"}}
+        )
+        assert outcome == "updated"
+        call = await Call.find_one({"vapi_call_id": "vapi-0"})
+        assert call.call_result.summary == "from the report"
+        assert await counts(batch) == {CallStatus.COMPLETED.value: 1}
+
+    asyncio.run(run())
+
+
+def test_bulk_change_moves_only_the_calls_it_modified(mongo):
+    async def run():
+        await mongo()
+        batch = await make_batch([CallStatus.INITIATED.value] * 3)
+        calls = await raw_calls(batch)
+
+        # Another writer finished one call after the bulk change read it
+        await advance_call_status("vapi-0", CallStatus.COMPLETED)
+
+        assert await bulk_set_call_status(calls, CallStatus.FAILED) == 2
+        assert await counts(batch) == {CallStatus.COMPLETED.value: 1, CallStatus.FAILED.value: 2}
+
+    asyncio.run(run())
+
+
+def test_set_calls_status_filters_each_call_on_its_own_prior_status(mongo):
+    async def run():
+        await mongo()
+        batch = await make_batch([CallStatus.FAILED.value, CallStatus.NO_SHOW.value])
+        calls = await raw_calls(batch)
+
+        # vapi-0 moves on to no_show, a status the bulk change also reads from
+        await Call.get_motor_collection().update_one(
+            {"vapi_call_id": "vapi-0"}, {"$set": {"status": CallStatus.NO_SHOW.value}}
+        )
+        await Batch.get_motor_collection().update_one(
+            {"_id": batch.id},
+            {"$inc": {"status_counts.failed": -1, "status_counts.no_show": 1}},
+        )
+
+        reset = await set_calls_status(calls, CallStatus.PENDING, {"vapi_call_id": None})
+        assert reset == 1
+        assert await counts(batch) == {CallStatus.NO_SHOW.value: 1, CallStatus.PENDING.value: 1}
+
+    asyncio.run(run())
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import pytest
+
+from utils.dialer import Dialer, NoFreeNumber, PhoneNumberPool, TokenBucket
+
+
+class FakeLine:
+    """Live calls per phone number as Mongo would count them, each ends after duration seconds"""
+
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.live: Counter = Counter()
+        self.peak: Counter = Counter()
+        self.peak_total = 0
+
+    async def live_counts(self) -> Dict[Optional[str], int]:
+        return dict(self.live)
+
+    async def _hang_up(self, number_id: Optional[str]):
+        await asyncio.sleep(self.duration)
+        self.live[number_id] -= 1
+
+    async def execute_call(self, call_data, assistant_id: str, phone_number_id: Optional[str] = None):
+        # The POST returns right away, the call stays live until it ends
+        self.live[phone_number_id] += 1
+        self.peak[phone_number_id] = max(self.peak[phone_number_id], self.live[phone_number_id])
+        self.peak_total = max(self.peak_total, sum(self.live.values()))
+        asyncio.get_running_loop().create_task(self._hang_up(phone_number_id))
+        return True, f"vapi-{call_data.id}", None
+
+
+def test_dialer_keeps_live_calls_under_the_caps():
+    line = FakeLine(duration=0.05)
+
+    async def run():
+        dialer = Dialer(
+            line, max_concurrency=3, calls_per_second=0,
+            phone_number_ids=["a", "b"], per_number_concurrency=2,
+        )
+        dialer.numbers = PhoneNumberPool(
+            ["a", "b"], 2, total_limit=3, live_counts=line.live_counts, poll_interval=0.005
+        )
+        calls = [SimpleNamespace(id=i, batch_id="batch") for i in range(20)]
+        results = await asyncio.gather(*(dialer.dial(call, assistant_id="assistant") for call in calls))
+        await asyncio.sleep(0.1)
+        return results
+
+    results = asyncio.run(run())
+    assert all(success for success, _, _ in results)
+    assert max(line.peak.values()) <= 2
+    assert line.peak_total <= 3
+    # Both numbers were used
+    assert set(line.peak) == {"a", "b"}
+
+
+def test_pool_picks_the_least_busy_number():
+    async def live_counts():
+        return {"a": 4, "b": 1, None: 7}
+
+    async def run():
+        pool = PhoneNumberPool(["a", "b"], 5, live_counts=live_counts)
+        return await pool.acquire()
+
+    assert asyncio.run(run()) == "b"
+
+
+def test_pool_counts_dials_not_yet_saved():
+    async def live_counts():
+        return {}
+
+    async def run():
+        pool = PhoneNumberPool(["a"], 2, live_counts=live_counts, poll_interval=0.005)
+        await pool.acquire()
+        await pool.acquire()
+        with pytest.raises(NoFreeNumber):
+            await pool.acquire(timeout=0.02)
+        await pool.release("a")
+        return await pool.acquire(timeout=0.02)
+
+    assert asyncio.run(run()) == "a"
+
+
+def test_pool_total_limit_counts_every_live_call():
+    async def live_counts():
+        # Calls placed before phone_number_id was recorded still count globally
+        return {None: 3}
+
+    async def run():
+        pool = PhoneNumberPool(["a", "b"], 5, total_limit=3, live_counts=live_counts, poll_interval=0.005)
+        await pool.acquire(timeout=0.02)
+
+    with pytest.raises(NoFreeNumber):
+        asyncio.run(run())
+
+
+def test_pool_waits_for_a_live_call_to_end():
+    live = {"a": 1}
+
+    async def live_counts():
+        return dict(live)
+
+    async def hang_up():
+        await asyncio.sleep(0.03)
+        live["a"] = 0
+
+    async def run():
+        pool = PhoneNumberPool(["a"], 1, live_counts=live_counts, poll_interval=0.005)
+        asyncio.get_running_loop().create_task(hang_up())
+        return await pool.acquire(timeout=1)
+
+    assert asyncio.run(run()) == "a"
+
+
+def test_token_bucket_spends_its_burst_then_holds_the_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=2)
+        started = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(5):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.02
+    # 5 calls past the burst at 50/s
+    assert total >= 5 / 50 * 0.9
+
+
+def test_token_bucket_without_a_rate_never_waits():
+    async def run():
+        bucket = TokenBucket(rate=0, capacity=1)
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(100)))
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.05
@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pytest
+
+from utils.document import detect_columns, normalize_frame
+
+
+def legacy_rows(frame: pd.DataFrame, columns: Dict[str, Optional[str]]) -> List[Dict[str, str]]:
+    """The original row by row parser (iterrows) the vectorized one replaced"""
+    rows = []
+    for _, row in frame.iterrows():
+        if columns["name"]:
+            name = str(row[columns["name"]]).strip() if pd.notna(row[columns["name"]]) else ""
+        else:
+            first_name = str(row[columns["first_name"]]).strip() if pd.notna(row[columns["first_name"]]) else ""
+            last_name = str(row[columns["last_name"]]).strip() if pd.notna(row[columns["last_name"]]) else ""
+            name = f"{first_name} {last_name}".strip()
+
+        email = str(row[columns["email"]]).strip() if pd.notna(row[columns["email"]]) else ""
+        phone = str(row[columns["phone"]]).strip() if pd.notna(row[columns["phone"]]) else ""
+        if phone:
+            phone_clean = "".join(filter(str.isdigit, phone))
+            if phone_clean and len(phone_clean) >= 10:
+                phone = f"+{phone_clean}"
+            else:
+                phone = phone_clean if phone_clean else phone
+
+        if not name or not email or not phone:
+            continue
+        rows.append({"name": name, "email": email, "phone": phone})
+    return rows
+
+
+def vectorized_rows(frame: pd.DataFrame) -> List[Dict[str, str]]:
+    columns = detect_columns(list(frame.columns))
+    return normalize_frame(frame, columns).to_dict("records")
+
+
+PHONES = [
+    "+1 (555) 010-2030",
+    "555-0102",
+    "  919876543210 ",
+    "ext. only",
+    None,
+    "0044 20 7946 0958",
+    "",
+    "12345",
+]
+
+
+def test_single_name_column_matches_the_legacy_parser():
+    frame = pd.DataFrame(
+        {
+            "Full_Name ": ["  Ada Lovelace", "Alan Turing", None, "Grace Hopper", "", "Edsger", "Barbara", "Ken"],
+            "E_Mail": ["ada@example.com", " alan@example.com ", "x@example.com", None, "e@example.com",
+                       "edsger@example.com", "barbara@example.com", "ken@example.com"],
+            "Mobile": PHONES,
+        },
+        dtype=object,
+    )
+    columns = detect_columns(list(frame.columns))
+    assert vectorized_rows(frame) == legacy_rows(frame, columns)
+
+
+def test_first_and_last_name_columns_match_the_legacy_parser():
+    frame = pd.DataFrame(
+        {
+            "fname": ["Ada", None, " Alan ", "", "Grace", None, "Edsger", "Ken"],
+            "LastName": ["Lovelace", "Turing", None, "", " Hopper", None, "Dijkstra", "Thompson"],
+            "email": ["a@example.com"] * 8,
+            "phone": PHONES,
+        },
+        dtype=object,
+    )
+    columns = detect_columns(list(frame.columns))
+    assert vectorized_rows(frame) == legacy_rows(frame, columns)
+
+
+def test_numeric_phone_cells_lose_the_float_suffix():
+    # Excel hands back long phone numbers as floats, the legacy parser kept the ".0" as a digit
+    frame = pd.DataFrame({"name": ["Ada"], "email": ["ada@example.com"], "phone": [919876543210.0]})
+    assert vectorized_rows(frame) == [{"name": "Ada", "email": "ada@example.com", "phone": "+919876543210"}]
+
+
+def test_missing_required_columns_are_reported():
+    with pytest.raises(ValueError, match="email"):
+        detect_columns(["name", "phone"])
+    with pytest.raises(ValueError, match="first_name"):
+        detect_columns(["first_name", "email", "phone"])
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from model.model import Job, JobStatus
+from utils.job_queue import JobDeferred, JobQueue, JobWorkerPool
+
+
+async def stored(key: str) -> Job:
+    return await Job.find_one({"key": key})
+
+
+def test_lease_ack(mongo):
+    async def run():
+        await mongo()
+        queue = JobQueue("test")
+        await queue.enqueue("a", {"n": 1})
+
+        job = await queue.lease()
+        assert job["key"] == "a" and job["payload"] == {"n": 1}
+        assert job["status"] == JobStatus.LEASED.value and job["attempts"] == 1
+        # Leased jobs aren't handed out twice
+        assert await queue.lease() is None
+
+        assert await queue.ack(job)
+        assert (await stored("a")).status == JobStatus.DONE
+        assert await queue.lease() is None
+
+    asyncio.run(run())
+
+
+def test_nack_retries_with_backoff_then_dead_letters(mongo):
+    async def run():
+        await mongo()
+        queue = JobQueue("test", max_attempts=2, retry_backoff=60)
+        await queue.enqueue("a", {})
+
+        job = await queue.lease()
+        assert await queue.nack(job, "boom") == JobStatus.QUEUED.value
+        # Backing off, not available yet
+        assert await queue.lease() is None
+        assert (await stored("a")).available_at > datetime.utcnow() + timedelta(seconds=50)
+
+        await Job.get_motor_collection().update_one(
+            {"key": "a"}, {"$set": {"available_at": datetime.utcnow()}}
+        )
+        job = await queue.lease()
+        assert job["attempts"] == 2
+        assert await queue.nack(job, "boom again") == JobStatus.DEAD.value
+
+        dead = await stored("a")
+        assert dead.status == JobStatus.DEAD and dead.last_error == "boom again"
+        assert await queue.lease() is None
+        assert (await queue.counts())[JobStatus.DEAD.value] == 1
+
+    asyncio.run(run())
+
+
+def test_expired_lease_is_taken_over_and_the_old_ack_is_refused(mongo):
+    async def run():
+        await mongo()
+        queue = JobQueue("test", visibility_timeout=60)
+        await queue.enqueue("a", {})
+        stale = await queue.lease()
+
+        await Job.get_motor_collection().update_one(
+            {"key": "a"}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        job = await queue.lease()
+        assert job["attempts"] == 2 and job["lease_token"] != stale["lease_token"]
+
+        assert not await queue.ack(stale)
+        assert await queue.ack(job)
+
+    asyncio.run(run())
+
+
+def test_defer_keeps_the_attempt(mongo):
+    async def run():
+        await mongo()
+        queue = JobQueue("test")
+        await queue.enqueue("a", {})
+        job = await queue.lease()
+        await queue.defer(job, 60)
+
+        deferred = await stored("a")
+        assert deferred.status == JobStatus.QUEUED and deferred.attempts == 0
+        assert await queue.lease() is None
+
+    asyncio.run(run())
+
+
+def test_update_payload_leaves_leased_and_done_jobs_alone(mongo):
+    async def run():
+        await mongo()
+        queue = JobQueue("test")
+        await queue.enqueue("a", {"v": 1})
+        assert await queue.update_payload("a", {"v": 2})
+        assert (await stored("a")).payload == {"v": 2}
+
+        job = await queue.lease()
+        assert not await queue.update_payload("a", {"v": 3})
+        leased = await stored("a")
+        assert leased.status == JobStatus.LEASED and leased.attempts == 1
+        assert leased.payload == {"v": 2}
+
+        await queue.ack(job)
+        assert not await queue.update_payload("a", {"v": 3})
+        assert not await queue.update_payload("missing", {})
+
+    asyncio.run(run())
+
+
+def test_queues_share_the_collection_without_mixing(mongo):
+    async def run():
+        await mongo()
+        dial, completion = JobQueue("dial"), JobQueue("completion")
+        await dial.enqueue("same-key", {"queue": "dial"})
+        await completion.enqueue("same-key", {"queue": "completion"})
+
+        assert (await completion.lease())["payload"] == {"queue": "completion"}
+        assert (await dial.lease())["payload"] == {"queue": "dial"}
+        assert await dial.existing_keys(["same-key", "other"]) == {"same-key"}
+
+    asyncio.run(run())
+
+
+def test_worker_pool_acks_nacks_and_defers(mongo):
+    async def run():
+        await mongo()
+        queue = JobQueue("test", max_attempts=1)
+        handled = []
+
+        async def handler(job):
+            handled.append(job["key"])
+            if job["key"] == "fails":
+                raise RuntimeError("boom")
+            if job["key"] == "waits":
+                raise JobDeferred(60)
+
+        await queue.enqueue_many([("works", {}), ("fails", {}), ("waits", {})])
+        pool = JobWorkerPool(queue, handler, 2, poll_interval=0.01)
+        pool.start()
+        while len(handled) < 3:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await pool.stop()
+
+        assert (await stored("works")).status == JobStatus.DONE
+        assert (await stored("fails")).status == JobStatus.DEAD
+        waits = await stored("waits")
+        assert waits.status == JobStatus.QUEUED and waits.attempts == 0
+
+    asyncio.run(run())
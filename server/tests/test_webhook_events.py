@@ -0,0 +1,99 @@
+import asyncio
+
+from model.model import Job, WebhookEvent
+from utils import events
+from utils.webhook_events import (
+    DUPLICATE,
+    MERGE,
+    PROCESS,
+    record_webhook_event,
+    release_webhook_event,
+)
+
+
+def test_completion_events_of_a_call_are_processed_once(mongo):
+    async def run():
+        await mongo()
+        outcomes = [
+            await record_webhook_event("call-1", event_type)
+            for event_type in ("call.ended", "call.completed", "call.ended")
+        ]
+        assert outcomes == [PROCESS, DUPLICATE, DUPLICATE]
+
+        event = await WebhookEvent.find_one({"key": "call-1:completion"})
+        assert event.deliveries == 3
+        assert sorted(event.event_types) == ["call.completed", "call.ended"]
+
+    asyncio.run(run())
+
+
+def test_report_after_a_bare_completion_is_merged_once(mongo):
+    async def run():
+        await mongo()
+        assert await record_webhook_event("call-1", "call.ended") == PROCESS
+        assert await record_webhook_event("call-1", "end-of-call-report") == MERGE
+        assert await record_webhook_event("call-1", "end-of-call-report") == DUPLICATE
+
+        # Report first: the later bare events add nothing
+        assert await record_webhook_event("call-2", "end-of-call-report") == PROCESS
+        assert await record_webhook_event("call-2", "call.ended") == DUPLICATE
+
+    asyncio.run(run())
+
+
+def test_kinds_are_deduplicated_separately(mongo):
+    async def run():
+        await mongo()
+        assert await record_webhook_event("call-1", "call.started") == PROCESS
+        assert await record_webhook_event("call-1", "call.ended") == PROCESS
+        assert await record_webhook_event("call-1", "call.started") == DUPLICATE
+
+    asyncio.run(run())
+
+
+def test_released_delivery_is_processed_again(mongo):
+    async def run():
+        await mongo()
+        assert await record_webhook_event("call-1", "call.started") == PROCESS
+        await release_webhook_event("call-1", "call.started")
+        assert await record_webhook_event("call-1", "call.started") == PROCESS
+        assert await record_webhook_event("call-1", "call.started") == DUPLICATE
+
+        # A failed merge is merged again on the retry
+        assert await record_webhook_event("call-2", "call.ended") == PROCESS
+        assert await record_webhook_event("call-2", "end-of-call-report") == MERGE
+        await release_webhook_event("call-2", "end-of-call-report")
+        assert await record_webhook_event("call-2", "end-of-call-report") == MERGE
+
+    asyncio.run(run())
+
+
+def test_merge_swaps_the_payload_of_a_queued_completion(mongo):
+    async def run():
+        await mongo()
+        await events.enqueue_completion("call-1", {"type": "call.ended"})
+        assert await events.merge_completion("call-1", {"type": "report"}) == "merged"
+
+        jobs = await Job.find({"queue": events.completion_queue.name}).to_list()
+        assert [(job.key, job.payload) for job in jobs] == [("call-1", {"type": "report"})]
+
+    asyncio.run(run())
+
+
+def test_merge_leaves_a_leased_completion_alone(mongo):
+    async def run():
+        await mongo()
+        queue = events.completion_queue
+        await events.enqueue_completion("call-1", {"type": "call.ended"})
+        leased = await queue.lease()
+
+        assert await events.merge_completion("call-1", {"type": "report"}) == "follow_up"
+
+        job = await Job.find_one({"queue": queue.name, "key": "call-1"})
+        assert job.status == "leased" and job.attempts == 1
+        assert job.lease_token == leased["lease_token"]
+        assert job.payload == {"type": "call.ended"}
+        follow_up = await Job.find_one({"queue": queue.name, "key": "call-1:end-of-call-report"})
+        assert follow_up.status == "queued" and follow_up.payload == {"type": "report"}
+
+    asyncio.run(run())
@@ -0,0 +1,117 @@
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from model.model import AnalysisCacheEntry
+from utils.analyst import (
+    ANALYST_MODEL,
+    BATCH_ANALYSIS_PROMPT,
+    TRANSCRIPT_ANALYSIS_PROMPT,
+    AnalystResult,
+)
+
+# In-process LRU in front of the Mongo cache
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+
+# Prompt variants a result can come from
+SINGLE_PROMPT = "single"
+BATCH_PROMPT = "batch"
+
+# Change whenever a prompt's text changes, so stale analyses are never reused
+PROMPT_VERSIONS = {
+    SINGLE_PROMPT: hashlib.sha256(TRANSCRIPT_ANALYSIS_PROMPT.encode()).hexdigest()[:12],
+    BATCH_PROMPT: hashlib.sha256(BATCH_ANALYSIS_PROMPT.encode()).hexdigest()[:12],
+}
+
+
+class AnalysisCache:
+    """
+    Content addressed cache of analysis results: an in-process LRU backed by
+    the analysis_cache collection (TTL evicted by Mongo).
+    """
+
+    def __init__(self, max_size: int = ANALYSIS_CACHE_SIZE, model: str = ANALYST_MODEL):
+        self.max_size = max_size
+        self.model = model
+        self.memory: "OrderedDict[str, AnalystResult]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+    def key(self, transcript: str, prompt: str = SINGLE_PROMPT) -> str:
+        digest = hashlib.sha256()
+        for part in (PROMPT_VERSIONS[prompt], self.model, transcript):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _remember(self, key: str, result: AnalystResult):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def keys(self, transcript: str) -> List[str]:
+        """Keys of a transcript under every prompt variant, single call prompt first"""
+        return [self.key(transcript, prompt) for prompt in PROMPT_VERSIONS]
+
+    async def get(self, keys: List[str]) -> Optional[AnalystResult]:
+        """First cached result under any of the keys, one lookup however many there are"""
+        for key in keys:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self.memory[key]
+
+        try:
+            entries = await AnalysisCacheEntry.find({"key": {"$in": keys}}).to_list()
+        except Exception as e:
+            logger.error(f"❌ Analysis cache lookup failed: {e}")
+            entries = []
+
+        if not entries:
+            self.stats["misses"] += 1
+            return None
+
+        entry = min(entries, key=lambda entry: keys.index(entry.key))
+
+        result = AnalystResult(
+            summary=entry.summary,
+            quality_score=entry.quality_score,
+            customer_intent=entry.customer_intent,
+        )
+        self._remember(entry.key, result)
+        self.stats["db_hits"] += 1
+        return result
+
+    async def put(self, key: str, result: AnalystResult, prompt: str = SINGLE_PROMPT):
+        self._remember(key, result)
+        try:
+            await AnalysisCacheEntry.get_motor_collection().update_one(
+                {"key": key},
+                {
+                    "$setOnInsert": {
+                        "key": key,
+                        "prompt_version": PROMPT_VERSIONS[prompt],
+                        "model": self.model,
+                        **result.model_dump(),
+                        "created_at": datetime.utcnow(),
+                    }
+                },
+                upsert=True,
+            )
+            self.stats["writes"] += 1
+        except Exception as e:
+            logger.error(f"❌ Analysis cache write failed: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["db_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "prompt_versions": dict(PROMPT_VERSIONS),
+        }
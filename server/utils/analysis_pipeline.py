@@ -0,0 +1,393 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from loguru import logger
+from pydantic import BaseModel
+
+from model.model import Call
+from utils.analysis_cache import BATCH_PROMPT, SINGLE_PROMPT, AnalysisCache
+from utils.analyst import (
+    AnalystResult,
+    analyze_transcript_async,
+    analyze_transcripts_async,
+    default_analyst_result,
+)
+from utils.job_queue import JobQueue, JobWorkerPool
+
+# Pipeline tuning
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "500"))
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "60"))  # seconds per transcript
+ANALYSIS_SUBMIT_TIMEOUT = float(os.getenv("ANALYSIS_SUBMIT_TIMEOUT", "5"))  # seconds
+# Batch mode: a worker gathers up to ANALYSIS_BATCH_SIZE transcripts for at most
+# ANALYSIS_BATCH_WINDOW seconds and scores them in one request (1 disables batching)
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "8"))
+ANALYSIS_BATCH_WINDOW = float(os.getenv("ANALYSIS_BATCH_WINDOW", "2"))  # seconds
+ANALYSIS_BATCH_MAX_CHARS = int(os.getenv("ANALYSIS_BATCH_MAX_CHARS", "60000"))
+ANALYSIS_BATCH_TIMEOUT = float(os.getenv("ANALYSIS_BATCH_TIMEOUT", "180"))  # seconds per batch
+# Analyses are durable jobs, each job worker waits on one transcript so there
+# must be enough of them to fill the batches
+ANALYSIS_JOB_CONCURRENCY = int(
+    os.getenv("ANALYSIS_JOB_CONCURRENCY", str(ANALYSIS_CONCURRENCY * ANALYSIS_BATCH_SIZE))
+)
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "5"))
+# A job is leased for its whole wait in the pipeline, batch timeout included
+ANALYSIS_JOB_VISIBILITY_TIMEOUT = int(os.getenv("ANALYSIS_JOB_VISIBILITY_TIMEOUT", "600"))
+
+
+class AnalysisRequest(BaseModel):
+    """Transcript waiting to be analyzed for a Call"""
+
+    call_id: str
+    transcript: str
+    # Summary already provided by the webhook, kept instead of the model's one
+    summary: Optional[str] = None
+
+
+class AnalysisFailed(Exception):
+    """The model call for a transcript failed or timed out"""
+
+
+class AnalysisPipeline:
+    """
+    Bounded queue of transcripts analyzed by a fixed number of workers.
+    Completion handlers only enqueue a durable analysis job, so model latency
+    never blocks a request; the job workers feed this queue and wait here
+    until their result is saved.
+    """
+
+    def __init__(
+        self,
+        analyze: Callable[[str], Awaitable[AnalystResult]] = analyze_transcript_async,
+        analyze_many: Callable[
+            [Dict[str, str]], Awaitable[Dict[str, AnalystResult]]
+        ] = analyze_transcripts_async,
+        concurrency: int = ANALYSIS_CONCURRENCY,
+        queue_size: int = ANALYSIS_QUEUE_SIZE,
+        timeout: float = ANALYSIS_TIMEOUT,
+        submit_timeout: float = ANALYSIS_SUBMIT_TIMEOUT,
+        batch_size: int = ANALYSIS_BATCH_SIZE,
+        batch_window: float = ANALYSIS_BATCH_WINDOW,
+        batch_max_chars: int = ANALYSIS_BATCH_MAX_CHARS,
+        batch_timeout: float = ANALYSIS_BATCH_TIMEOUT,
+        cache: Optional[AnalysisCache] = None,
+    ):
+        self.analyze = analyze
+        self.analyze_many = analyze_many
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.submit_timeout = submit_timeout
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.batch_max_chars = batch_max_chars
+        self.batch_timeout = batch_timeout
+        self.cache = cache or AnalysisCache()
+        # Requests waiting on an identical transcript already queued or in flight,
+        # each with the future its caller awaits; the first one is the queued request
+        self.pending: Dict[str, List[Tuple[AnalysisRequest, asyncio.Future]]] = {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.workers: List[asyncio.Task] = []
+        self.stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "cached": 0,
+            "deduplicated": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "batches": 0,
+            "batched_transcripts": 0,
+            "total_seconds": 0.0,
+        }
+
+    def start(self):
+        for index in range(self.concurrency):
+            self.workers.append(asyncio.create_task(self._run(index)))
+        logger.info(f"🟢 Started {self.concurrency} analysis workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("🔴 Stopped analysis workers")
+
+    async def submit(self, request: AnalysisRequest) -> AnalystResult:
+        """
+        Analyze a transcript and save the result on its call, returning once it
+        is saved. Cached transcripts are answered right away and identical
+        transcripts share one model call. When the queue is full the caller
+        waits up to submit_timeout (backpressure); raises when rejected or when
+        the save fails, so the analysis job is retried; AnalysisFailed when the
+        model call fails or times out.
+        """
+        key = self.cache.key(request.transcript)
+        cached = await self.cache.get(self.cache.keys(request.transcript))
+        if cached:
+            self.stats["cached"] += 1
+            logger.info(f"♻️ Reusing cached analysis for call {request.call_id}")
+            await save_analysis(request, cached)
+            return cached
+
+        future = asyncio.get_running_loop().create_future()
+        if key in self.pending:
+            self.stats["deduplicated"] += 1
+            self.pending[key].append((request, future))
+            logger.info(f"♻️ Call {request.call_id} joins an identical pending analysis")
+            return await future
+
+        self.pending[key] = [(request, future)]
+        try:
+            await asyncio.wait_for(self.queue.put(request), timeout=self.submit_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            logger.error(f"❌ Analysis queue full, rejecting analysis for call {request.call_id}")
+            self._fail(key, RuntimeError("Analysis queue full"))
+            return await future
+
+        self.stats["submitted"] += 1
+        logger.info(
+            f"📥 Queued analysis for call {request.call_id} (queue: {self.queue.qsize()})"
+        )
+        return await future
+
+    async def _run(self, index: int):
+        while True:
+            batch = await self._next_batch()
+            try:
+                if len(batch) == 1:
+                    await self._process(batch[0])
+                else:
+                    await self._process_batch(batch)
+            except Exception as e:
+                call_ids = [request.call_id for request in batch]
+                logger.error(f"❌ [analysis#{index}] Error for calls {call_ids}: {e}")
+            finally:
+                for request in batch:
+                    self._release(request)
+                    self.queue.task_done()
+
+    async def _next_batch(self) -> List[AnalysisRequest]:
+        """Wait for one request, then gather more until the batch is full or the window closes"""
+        batch = [await self.queue.get()]
+        chars = len(batch[0].transcript)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+
+        while len(batch) < self.batch_size and chars < self.batch_max_chars:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            chars += len(request.transcript)
+
+        return batch
+
+    async def _process_batch(self, batch: List[AnalysisRequest]):
+        """Score a batch in one request and fan the results back out to the calls"""
+        started = time.monotonic()
+        transcripts = {str(position): request.transcript for position, request in enumerate(batch)}
+        try:
+            results = await asyncio.wait_for(
+                self.analyze_many(transcripts), timeout=self.batch_timeout
+            )
+        except Exception as e:
+            logger.error(f"❌ Batch analysis of {len(batch)} transcripts failed: {e}")
+            results = {}
+        finally:
+            self.stats["total_seconds"] += time.monotonic() - started
+
+        self.stats["batches"] += 1
+        leftovers = []
+        for position, request in enumerate(batch):
+            result = results.get(str(position))
+            if result is None:
+                leftovers.append(request)
+                continue
+            self.stats["completed"] += 1
+            self.stats["batched_transcripts"] += 1
+            try:
+                await self._finish(request, result, prompt=BATCH_PROMPT)
+            finally:
+                self._release(request)
+
+        # Anything the batch response missed is analyzed on its own
+        for request in leftovers:
+            try:
+                await self._process(request)
+            finally:
+                self._release(request)
+
+    async def _process(self, request: AnalysisRequest):
+        """Analyze one transcript, a failure is raised to every caller waiting on it"""
+        started = time.monotonic()
+        key = self.cache.key(request.transcript)
+        try:
+            result = await asyncio.wait_for(
+                self.analyze(request.transcript), timeout=self.timeout
+            )
+            self.stats["completed"] += 1
+        except asyncio.TimeoutError:
+            logger.error(f"⏰ Analysis timed out after {self.timeout}s for call {request.call_id}")
+            self.stats["timed_out"] += 1
+            self._fail(key, AnalysisFailed(f"Analysis timed out after {self.timeout}s"))
+            return
+        except Exception as e:
+            logger.error(f"❌ Error analyzing transcript for call {request.call_id}: {e}")
+            self.stats["failed"] += 1
+            self._fail(key, AnalysisFailed(f"Analysis failed: {e}"))
+            return
+        finally:
+            self.stats["total_seconds"] += time.monotonic() - started
+
+        await self._finish(request, result, prompt=SINGLE_PROMPT)
+
+    async def _finish(self, request: AnalysisRequest, result: AnalystResult, prompt: str):
+        """
+        Save the result for the request and every duplicate waiting on it,
+        caching it under the prompt variant that produced it
+        """
+        waiters = self.pending.pop(self.cache.key(request.transcript), [])
+        try:
+            await self.cache.put(self.cache.key(request.transcript, prompt), result, prompt)
+        except Exception as e:
+            logger.error(f"❌ Failed to cache analysis for call {request.call_id}: {e}")
+        for waiter, future in waiters:
+            try:
+                await save_analysis(waiter, result)
+            except Exception as e:
+                logger.error(f"❌ Failed to save analysis for call {waiter.call_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(result)
+
+    def _fail(self, key: str, error: Exception):
+        """Drop a pending entry, failing every caller waiting on it"""
+        for _, future in self.pending.pop(key, []):
+            if not future.done():
+                future.set_exception(error)
+
+    def _release(self, request: AnalysisRequest):
+        """
+        Fail the pending entry a queued request owns if it was never finished,
+        so later identical transcripts don't wait on it forever and the jobs
+        behind it are retried. An entry started by a newer request for the
+        same transcript is left alone.
+        """
+        key = self.cache.key(request.transcript)
+        waiters = self.pending.get(key)
+        if waiters and waiters[0][0] is request:
+            logger.warning(
+                f"⚠️ Analysis for call {request.call_id} never finished, "
+                f"failing {len(waiters)} waiting analyses"
+            )
+            self._fail(key, RuntimeError("Analysis never finished"))
+
+    def metrics(self) -> Dict[str, Any]:
+        processed = self.stats["completed"] + self.stats["failed"] + self.stats["timed_out"]
+        return {
+            **{key: value for key, value in self.stats.items() if key != "total_seconds"},
+            "queued": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "cache": self.cache.metrics(),
+            "avg_seconds": (
+                round(self.stats["total_seconds"] / processed, 3) if processed else 0.0
+            ),
+        }
+
+
+async def save_analysis(request: AnalysisRequest, result: AnalystResult, failed: bool = False):
+    """
+    Write the analysis fields into the call's call_result. failed marks the
+    placeholder written once every attempt failed, batch stats leave it out
+    """
+    update_data = {
+        "call_result.summary": request.summary or result.summary,
+        "call_result.quality_score": result.quality_score,
+        "call_result.customer_intent": result.customer_intent,
+        "call_result.analysis_failed": failed,
+        "call_result.updated_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+    await Call.find_one({"_id": ObjectId(request.call_id)}).update({"$set": update_data})
+    logger.success(f"✅ Analysis saved for call {request.call_id}: {result.summary}")
+
+
+ANALYSIS_QUEUE = "analysis"
+
+# Analysis jobs are keyed on Call._id and only acked once the result is saved,
+# so queued analyses survive restarts and deploys
+analysis_queue = JobQueue(
+    ANALYSIS_QUEUE,
+    visibility_timeout=ANALYSIS_JOB_VISIBILITY_TIMEOUT,
+    max_attempts=ANALYSIS_MAX_ATTEMPTS,
+)
+analysis_workers: Optional[JobWorkerPool] = None
+
+# Global pipeline, started on startup and stopped on shutdown
+analysis_pipeline: Optional[AnalysisPipeline] = None
+
+
+async def enqueue_analysis(request: AnalysisRequest) -> int:
+    """Persist a transcript for the analysis workers"""
+    return await analysis_queue.enqueue(request.call_id, request.model_dump())
+
+
+async def handle_analysis_job(job: Dict[str, Any]):
+    """
+    Analyze a leased job's transcript, raising so the queue retries it. Only
+    the last attempt gives up and saves the default result.
+    """
+    request = AnalysisRequest(**job["payload"])
+    try:
+        await get_analysis_pipeline().submit(request)
+    except Exception as e:
+        if job["attempts"] < job.get("max_attempts", analysis_queue.max_attempts):
+            raise
+        logger.error(f"❌ Giving up on analysis for call {request.call_id}: {e}")
+        await save_analysis(request, default_analyst_result(), failed=True)
+
+
+def start_analysis_pipeline() -> AnalysisPipeline:
+    """Create the shared analysis pipeline and start its workers and job workers"""
+    global analysis_pipeline, analysis_workers
+
+    analysis_pipeline = AnalysisPipeline()
+    analysis_pipeline.start()
+    analysis_workers = JobWorkerPool(analysis_queue, handle_analysis_job, ANALYSIS_JOB_CONCURRENCY)
+    analysis_workers.start()
+    return analysis_pipeline
+
+
+async def stop_analysis_pipeline():
+    """Stop the analysis workers, unacked jobs are picked up again after a restart"""
+    global analysis_pipeline, analysis_workers
+
+    if analysis_workers:
+        await analysis_workers.stop()
+        analysis_workers = None
+    if analysis_pipeline:
+        await analysis_pipeline.stop()
+        analysis_pipeline = None
+
+
+def get_analysis_pipeline() -> AnalysisPipeline:
+    """Get the shared analysis pipeline"""
+    global analysis_pipeline
+
+    if not analysis_pipeline:
+        raise RuntimeError("Analysis pipeline not started. Call start_analysis_pipeline() first.")
+
+    return analysis_pipeline
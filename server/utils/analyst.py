@@ -1,9 +1,15 @@
-from litellm import completion, embedding
+from litellm import completion, acompletion, embedding
 import os
 from pydantic import BaseModel
+from typing import Dict, List, Type
 
 from loguru import logger
 
+# Model used for analysis. ANALYST_API_BASE points it at any OpenAI compatible
+# server (e.g. a local stub model), ANALYST_MOCK_RESPONSE skips the network entirely
+ANALYST_MODEL = os.getenv("ANALYST_MODEL", "openrouter/openai/gpt-5-nano")
+ANALYST_API_BASE = os.getenv("ANALYST_API_BASE")
+ANALYST_MOCK_RESPONSE = os.getenv("ANALYST_MOCK_RESPONSE")
 
 TRANSCRIPT_ANALYSIS_PROMPT = """
 You are an AI assistant that analyzes phone call transcripts. Please analyze the following transcript and provide output in JSON format with the following fields:
@@ -36,39 +42,80 @@ You are an AI assistant that analyzes phone call transcripts. Please analyze the
 """
 
 
+BATCH_ANALYSIS_PROMPT = (
+    TRANSCRIPT_ANALYSIS_PROMPT
+    + """
+### Batch mode:
+You will receive several transcripts, each starting with a line `### Transcript <id>`.
+Analyze every transcript independently and return a JSON object with a `results`
+array holding one entry per transcript: the transcript `id` plus the fields above.
+"""
+)
+
+
 class AnalystResult(BaseModel):
     summary: str
     quality_score: float
     customer_intent: str
 
 
+class BatchAnalystItem(AnalystResult):
+    id: str
+
+
+class BatchAnalystResult(BaseModel):
+    results: List[BatchAnalystItem]
+
+
+def _completion_kwargs(
+    content: str,
+    prompt: str = TRANSCRIPT_ANALYSIS_PROMPT,
+    response_format: Type[BaseModel] = AnalystResult,
+) -> dict:
+    """Arguments shared by the sync, async and batch completion calls"""
+    kwargs = {
+        "api_key": os.getenv("OPENROUTER_API_KEY"),
+        "model": ANALYST_MODEL,
+        "messages": [
+            {"content": prompt, "role": "system"},
+            {"content": content, "role": "user"},
+        ],
+        "response_format": response_format,
+    }
+    if ANALYST_API_BASE:
+        kwargs["api_base"] = ANALYST_API_BASE
+    if ANALYST_MOCK_RESPONSE:
+        kwargs["mock_response"] = ANALYST_MOCK_RESPONSE
+    return kwargs
+
+
+def _parse_result(response, result_type: Type[BaseModel] = AnalystResult):
+    """Parse the response content as AnalystResult (or the given result type)"""
+    content = response.choices[0].message.content
+    if isinstance(content, result_type):
+        return content
+
+    # If it's a string, try to parse it as JSON
+    import json
+
+    data = json.loads(content)
+    return result_type(**data)
+
+
+def default_analyst_result() -> AnalystResult:
+    return AnalystResult(
+        summary="Analysis failed", quality_score=0.0, customer_intent="unknown"
+    )
+
+
 def analyze_transcript(transcript: str) -> AnalystResult:
     """Analyze transcript"""
     try:
         # Log input transcript
         logger.info(f"📝 Analyzing transcript (length: {len(transcript)} characters)")
-    
-
-        response = completion(
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-            model="openrouter/openai/gpt-5-nano",
-            messages=[
-                {"content": TRANSCRIPT_ANALYSIS_PROMPT, "role": "system"},
-                {"content": transcript, "role": "user"},
-            ],
-            response_format=AnalystResult,
-        )
-
-        # Parse the response content as AnalystResult
-        content = response.choices[0].message.content
-        if isinstance(content, AnalystResult):
-            result = content
-        else:
-            # If it's a string, try to parse it as JSON
-            import json
-
-            data = json.loads(content)
-            result = AnalystResult(**data)
+
+        response = completion(**_completion_kwargs(transcript))
+        result = _parse_result(response)
 
         # Log the generated response
         logger.info(f"✅ Transcript analysis completed successfully")
@@ -79,10 +126,39 @@ def analyze_transcript(transcript: str) -> AnalystResult:
     except Exception as e:
         logger.error(f"❌ Error analyzing transcript: {e}")
         # Return a default result if analysis fails
-        default_result = AnalystResult(
-            summary="Analysis failed", quality_score=0.0, customer_intent="unknown"
-        )
+        default_result = default_analyst_result()
         logger.error(f"🔄 Returning default result due to error: {default_result}")
         return default_result
 
 
+async def analyze_transcript_async(transcript: str) -> AnalystResult:
+    """Analyze transcript without blocking the event loop, raises on failure"""
+    logger.info(f"📝 Analyzing transcript (length: {len(transcript)} characters)")
+    response = await acompletion(**_completion_kwargs(transcript))
+    result = _parse_result(response)
+    logger.info(f"✅ Transcript analysis completed successfully")
+    return result
+
+
+async def analyze_transcripts_async(transcripts: Dict[str, str]) -> Dict[str, AnalystResult]:
+    """
+    Analyze several transcripts in a single request, keyed by caller chosen ids.
+    Ids the model leaves out are simply missing from the returned dict.
+    """
+    logger.info(f"📝 Analyzing {len(transcripts)} transcripts in one request")
+    content = "\n\n".join(
+        f"### Transcript {transcript_id}\n{transcript}"
+        for transcript_id, transcript in transcripts.items()
+    )
+    response = await acompletion(
+        **_completion_kwargs(content, BATCH_ANALYSIS_PROMPT, BatchAnalystResult)
+    )
+    batch_result = _parse_result(response, BatchAnalystResult)
+
+    results = {
+        item.id: AnalystResult(**item.model_dump(exclude={"id"}))
+        for item in batch_result.results
+        if item.id in transcripts
+    }
+    logger.info(f"✅ Batch analysis returned {len(results)}/{len(transcripts)} results")
+    return results
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from loguru import logger
+
+from model.model import Call
+
+# Events buffered per subscriber, the oldest ones are dropped when a client lags
+CALL_EVENTS_QUEUE_SIZE = int(os.getenv("CALL_EVENTS_QUEUE_SIZE", "1000"))
+# Seconds between SSE keepalive comments, keeps proxies from closing idle streams
+CALL_EVENTS_KEEPALIVE = float(os.getenv("CALL_EVENTS_KEEPALIVE", "15"))
+# Fan out from a Mongo change stream instead of in-process publishes, so events
+# written by any server process reach every subscriber (needs a replica set)
+CALL_EVENTS_CHANGE_STREAM = os.getenv("CALL_EVENTS_CHANGE_STREAM", "false").lower() == "true"
+
+
+def _status_value(status: Any) -> Any:
+    return getattr(status, "value", status)
+
+
+class CallEventBroker:
+    """
+    In-process pub/sub of call status changes, one topic per batch.
+    Every subscriber gets its own bounded queue so a slow client never
+    blocks a webhook handler.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = CALL_EVENTS_QUEUE_SIZE,
+        use_change_stream: bool = CALL_EVENTS_CHANGE_STREAM,
+    ):
+        self.queue_size = queue_size
+        self.use_change_stream = use_change_stream
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.watcher: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def start(self):
+        if self.use_change_stream:
+            self.watcher = asyncio.create_task(self._watch())
+        logger.info(
+            f"🟢 Call events ready ({'change stream' if self.use_change_stream else 'in-process'})"
+        )
+
+    async def stop(self):
+        if self.watcher:
+            self.watcher.cancel()
+            await asyncio.gather(self.watcher, return_exceptions=True)
+            self.watcher = None
+        logger.info("🔴 Stopped call events")
+
+    def subscribe(self, batch_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[batch_id].add(queue)
+        return queue
+
+    def unsubscribe(self, batch_id: str, queue: asyncio.Queue):
+        subscribers = self.subscribers.get(batch_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self.subscribers[batch_id]
+
+    def publish(self, event: Dict[str, Any], local: bool = True):
+        """
+        Hand an event to the batch's subscribers. With the change stream on,
+        local publishes are skipped - the watcher delivers the same change.
+        """
+        if local and self.use_change_stream:
+            return
+
+        self.stats["published"] += 1
+        for queue in self.subscribers.get(event["batch_id"], ()):
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(event)
+            self.stats["delivered"] += 1
+
+    async def _watch(self):
+        """Publish every status change of the calls collection"""
+        pipeline = [
+            {"$match": {"operationType": "update"}},
+            {"$match": {"updateDescription.updatedFields.status": {"$exists": True}}},
+        ]
+        try:
+            async with Call.get_motor_collection().watch(
+                pipeline, full_document="updateLookup"
+            ) as stream:
+                async for change in stream:
+                    document = change.get("fullDocument")
+                    if document:
+                        self.publish(call_event_from_document(document), local=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone servers have no change streams, fall back to local publishes
+            logger.warning(f"⚠️ Call change stream unavailable, using in-process events: {e}")
+            self.use_change_stream = False
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "mode": "change_stream" if self.use_change_stream else "in_process",
+            "batches": len(self.subscribers),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+        }
+
+
+def call_event_from_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    updated_at = document.get("updated_at")
+    return {
+        "call_id": str(document["_id"]),
+        "batch_id": document.get("batch_id"),
+        "status": _status_value(document.get("status")),
+        "vapi_call_id": document.get("vapi_call_id"),
+        "updated_at": updated_at.isoformat() if isinstance(updated_at, datetime) else updated_at,
+    }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event as a Server-Sent Events message"""
+    return f"event: call\ndata: {json.dumps(event)}\n\n"
+
+
+# Global broker, started on startup and stopped on shutdown
+call_events: Optional[CallEventBroker] = None
+
+
+def publish_call_event(call_id: Any, batch_id: str, status: Any, **fields):
+    """Publish a call's status change, a no-op until the broker is started"""
+    if not call_events:
+        return
+
+    event = {
+        "call_id": str(call_id),
+        "batch_id": batch_id,
+        "status": _status_value(status),
+        "updated_at": datetime.utcnow().isoformat(),
+        **fields,
+    }
+    call_events.publish(event)
+
+
+def start_call_events() -> CallEventBroker:
+    """Create the shared call event broker"""
+    global call_events
+
+    call_events = CallEventBroker()
+    call_events.start()
+    return call_events
+
+
+async def stop_call_events():
+    """Stop the call event broker"""
+    global call_events
+
+    if call_events:
+        await call_events.stop()
+        call_events = None
+
+
+def get_call_events() -> CallEventBroker:
+    """Get the shared call event broker"""
+    global call_events
+
+    if not call_events:
+        raise RuntimeError("Call events not started. Call start_call_events() first.")
+
+    return call_events
@@ -8,11 +8,18 @@ from model.model import CallStatus
 # Add success level if it doesn't exist
 if not hasattr(logger, "success"):
     logger.success = logger.info
-import asyncio
-import aiohttp
+import httpx
+from bson import ObjectId
 
 from model.vapi_model import VAPICallRequest, CallCustomer
-from utils.vapi_client import VAPIClient
+from utils.vapi_client import (
+    VAPIClient,
+    CallNotPlaced,
+    CallOutcomeUnknown,
+    parse_vapi_time,
+    vapi_time,
+)
+from utils.call_status import set_call_status
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,6 +28,9 @@ load_dotenv()
 # Get assistant ID from environment variables
 # ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+# Looking up a call whose create request failed midway
+PLACED_CALL_PAGE_SIZE = int(os.getenv("PLACED_CALL_PAGE_SIZE", "100"))
+PLACED_CALL_SKEW = int(os.getenv("PLACED_CALL_SKEW", "5"))  # seconds of clock skew allowed
 
 
 class CallExecutor:
@@ -30,13 +40,20 @@ class CallExecutor:
         self.vapi_client = vapi_client
 
     async def execute_call(
-        self, call_data: Dict[str, Any], assistant_id: str
+        self,
+        call_data: Dict[str, Any],
+        assistant_id: str,
+        phone_number_id: Optional[str] = None,
     ) -> Tuple[bool, Optional[str], Optional[str]]:
         """
         Execute a VAPI call for the given call data using standardized assistants
+        phone_number_id overrides the default PHONE_NUMBER_ID when given
 
         Returns:
             Tuple[success: bool, vapi_call_id: Optional[str], error_message: Optional[str]]
+
+        Raises CallNotPlaced (retryable) when VAPI never got the call, the only
+        failure where dialing again can't phone the customer twice
         """
         try:
             # Handle both dictionary and object inputs
@@ -59,7 +76,7 @@ class CallExecutor:
             # Step 1: Get assistant ID from customer data
             logger.info(f"📋 [Call {call_id}] Step 1: Selecting assistant...")
 
-            phone_number_id = PHONE_NUMBER_ID
+            phone_number_id = phone_number_id or PHONE_NUMBER_ID
             if not assistant_id:
                 error_msg = "No assistant ID found for customer"
                 logger.error(f"❌ [Call {call_id}] {error_msg}")
@@ -91,6 +108,8 @@ class CallExecutor:
                 phoneNumberId=phone_number_id,
                 customer=customer,
                 assistantOverrides=assistant_overrides,
+                # Lets an ambiguous failure be matched to the call VAPI may have placed
+                metadata={"call_id": call_id},
             )
 
             logger.info(
@@ -99,36 +118,52 @@ class CallExecutor:
 
             # Step 3: Execute VAPI call
             logger.info(f"🎯 [Call {call_id}] Step 3: Executing VAPI call...")
-            vapi_response = await self.vapi_client.initiate_call(call_request)
-
-            if vapi_response and vapi_response.id:
-
-                vapi_call_id = vapi_response.id
+            requested_at = datetime.utcnow()
+            try:
+                vapi_call_id = (await self.vapi_client.initiate_call(call_request)).id
+            except CallNotPlaced as e:
+                if e.retryable:
+                    # Safe to dial again, the dialer's queue retries it
+                    raise
+                logger.error(f"❌ [Call {call_id}] VAPI rejected the call: {e}")
+                return False, None, str(e)
+            except CallOutcomeUnknown as e:
+                # VAPI may have placed it anyway, never dial the customer twice
+                logger.warning(f"⚠️ [Call {call_id}] {e}, looking the call up on VAPI")
+                vapi_call_id = await self._find_placed_call(call_id, assistant_id, requested_at)
+                if not vapi_call_id:
+                    return False, None, f"Call outcome unknown, not redialing: {e}"
+                logger.info(f"🔎 [Call {call_id}] Found the placed call on VAPI: {vapi_call_id}")
+
+            if vapi_call_id:
                 logger.success(f"✅ [Call {call_id}] VAPI call created successfully!")
                 logger.success(f"🎉 [Call {call_id}] VAPI Call ID: {vapi_call_id}")
                 logger.info(f"📞 [Call {call_id}] Call initiated to {phone_number}")
 
-                # Wait a moment to check initial call status
-                logger.info(f"⏳ [Call {call_id}] Checking initial call status...")
-                await asyncio.sleep(2)
-                call_status = await self._check_call_status(vapi_call_id)
-
-                if call_status:
-                    logger.info(
-                        f"📊 [Call {call_id}] Initial status: {call_status.get('status', 'unknown')}"
-                    )
-
+                # Persist the VAPI call ID right away so the webhooks that drive
+                # the rest of the status changes can find the call
+                if hasattr(call_data, "vapi_call_id"):
                     call_data.vapi_call_id = vapi_call_id
                     call_data.status = CallStatus.INITIATED
-                    await call_data.save()
+                try:
+                    await set_call_status(
+                        {"_id": ObjectId(call_id)},
+                        CallStatus.INITIATED,
+                        {"vapi_call_id": vapi_call_id, "phone_number_id": phone_number_id},
+                    )
+                except Exception as e:
+                    # The call is already placed, failing here would get it dialed again
+                    logger.error(f"❌ [Call {call_id}] Failed to save VAPI call ID {vapi_call_id}: {e}")
 
                 return True, vapi_call_id, None
 
             else:
-                error_msg = f"VAPI call creation failed: {vapi_response}"
+                error_msg = "VAPI call creation failed: no call ID"
                 logger.error(f"❌ [Call {call_id}] {error_msg}")
                 return False, None, error_msg
 
+        except CallNotPlaced:
+            raise
         except Exception as e:
             error_msg = f"Call execution error: {str(e)}"
             logger.error(f"❌ [Call {call_id}] {error_msg}")
@@ -137,6 +172,40 @@ class CallExecutor:
             logger.error(f"📊 [Call {call_id}] Stack trace: {traceback.format_exc()}")
             return False, None, error_msg
 
+    async def _find_placed_call(
+        self, call_id: str, assistant_id: str, requested_at: datetime
+    ) -> Optional[str]:
+        """
+        VAPI ID of the call placed for call_id since requested_at, if VAPI has
+        one. Pages through the window newest first like the reconciler, each
+        page ending at the oldest createdAt of the previous one.
+        """
+        start = vapi_time(requested_at - timedelta(seconds=PLACED_CALL_SKEW))
+        cursor = datetime.utcnow() + timedelta(seconds=PLACED_CALL_SKEW)
+        seen = set()
+        while True:
+            page = await self.vapi_client.list_calls(
+                assistantId=assistant_id,
+                createdAtGe=start,
+                createdAtLe=vapi_time(cursor),
+                limit=PLACED_CALL_PAGE_SIZE,
+            )
+            unseen = [vapi_call for vapi_call in page or [] if vapi_call.get("id") not in seen]
+            for vapi_call in unseen:
+                if (vapi_call.get("metadata") or {}).get("call_id") == call_id:
+                    return vapi_call.get("id")
+            if not unseen or len(page) < PLACED_CALL_PAGE_SIZE:
+                return None
+
+            created = {
+                vapi_call.get("id"): parse_vapi_time(vapi_call["createdAt"]) for vapi_call in page
+            }
+            oldest = min(created.values())
+            if oldest < cursor:
+                seen = set()
+            cursor = oldest
+            seen |= {vapi_call_id for vapi_call_id, at in created.items() if at == cursor}
+
     async def execute_custom_call(
         self, call_data: Dict[str, Any], custom_url: str
     ) -> Tuple[bool, Optional[str], Optional[str]]:
@@ -171,63 +240,64 @@ class CallExecutor:
 
             logger.info(f"📤 [Custom Call {call_id}] Sending payload: {payload}")
 
-            # Make API call to custom endpoint
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    custom_url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=aiohttp.ClientTimeout(total=30),
-                ) as response:
-                    response_data = await response.json()
-
-                    if response.status == 200:
-                        # Extract custom call details from response
-                        call_sid = response_data.get("call_sid")
-                        call_status = response_data.get("status")
-                        phone_number = response_data.get("phone_number")
-                        customer_name = response_data.get("customer_name")
-
-                        # Validate required fields
-                        if not call_sid:
-                            error_msg = "Missing call_sid in custom API response"
-                            logger.error(f"❌ [Custom Call {call_id}] {error_msg}")
-                            return False, None, error_msg
-
-                        logger.success(
-                            f"✅ [Custom Call {call_id}] Custom API call successful!"
-                        )
-                        logger.success(
-                            f"🎉 [Custom Call {call_id}] Call SID: {call_sid}"
-                        )
-                        logger.info(f"📞 [Custom Call {call_id}] Status: {call_status}")
-                        logger.info(f"📞 [Custom Call {call_id}] Phone: {phone_number}")
-                        logger.info(
-                            f"📞 [Custom Call {call_id}] Customer: {customer_name}"
-                        )
-                        logger.info(
-                            f"📞 [Custom Call {call_id}] Full Response: {response_data}"
-                        )
-
-                        # Update call data with custom call details
-                        if hasattr(call_data, "vapi_call_id"):
-                            call_data.vapi_call_id = call_sid
-                            # Map custom status to CallStatus enum
-                            if call_status == "call_initiated":
-                                call_data.status = CallStatus.INITIATED
-                            else:
-                                call_data.status = (
-                                    CallStatus.INITIATED
-                                )  # Default fallback
-                            await call_data.save()
-
-                        return True, call_sid, None
+            # Make API call to custom endpoint over the shared connection pool
+            response = await self.vapi_client.http.post(
+                custom_url,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=30.0,
+            )
+            response_data = response.json()
+
+            if response.status_code == 200:
+                # Extract custom call details from response
+                call_sid = response_data.get("call_sid")
+                call_status = response_data.get("status")
+                phone_number = response_data.get("phone_number")
+                customer_name = response_data.get("customer_name")
+
+                # Validate required fields
+                if not call_sid:
+                    error_msg = "Missing call_sid in custom API response"
+                    logger.error(f"❌ [Custom Call {call_id}] {error_msg}")
+                    return False, None, error_msg
+
+                logger.success(
+                    f"✅ [Custom Call {call_id}] Custom API call successful!"
+                )
+                logger.success(
+                    f"🎉 [Custom Call {call_id}] Call SID: {call_sid}"
+                )
+                logger.info(f"📞 [Custom Call {call_id}] Status: {call_status}")
+                logger.info(f"📞 [Custom Call {call_id}] Phone: {phone_number}")
+                logger.info(
+                    f"📞 [Custom Call {call_id}] Customer: {customer_name}"
+                )
+                logger.info(
+                    f"📞 [Custom Call {call_id}] Full Response: {response_data}"
+                )
+
+                # Update call data with custom call details
+                if hasattr(call_data, "vapi_call_id"):
+                    call_data.vapi_call_id = call_sid
+                    # Map custom status to CallStatus enum
+                    if call_status == "call_initiated":
+                        call_data.status = CallStatus.INITIATED
                     else:
-                        error_msg = f"Custom API call failed with status {response.status}: {response_data}"
-                        logger.error(f"❌ [Custom Call {call_id}] {error_msg}")
-                        return False, None, error_msg
+                        call_data.status = (
+                            CallStatus.INITIATED
+                        )  # Default fallback
+                    await set_call_status(
+                        {"_id": call_data.id}, call_data.status, {"vapi_call_id": call_sid}
+                    )
+
+                return True, call_sid, None
+            else:
+                error_msg = f"Custom API call failed with status {response.status_code}: {response_data}"
+                logger.error(f"❌ [Custom Call {call_id}] {error_msg}")
+                return False, None, error_msg
 
-        except asyncio.TimeoutError:
+        except httpx.TimeoutException:
             error_msg = "Custom API call timed out"
             logger.error(f"❌ [Custom Call {call_id}] {error_msg}")
             return False, None, error_msg
@@ -240,20 +310,3 @@ class CallExecutor:
                 f"📊 [Custom Call {call_id}] Stack trace: {traceback.format_exc()}"
             )
             return False, None, error_msg
-
-    async def _check_call_status(self, vapi_call_id: str) -> Optional[Dict[str, Any]]:
-        """Check the status of a VAPI call"""
-        try:
-            # Get call details from VAPI
-            call_details = await self.vapi_client.get_call(vapi_call_id)
-
-            if call_details:
-                status = call_details.get("status", "unknown")
-                logger.info(f"📞 Call {vapi_call_id} status: {status}")
-                return call_details
-
-            return None
-
-        except Exception as e:
-            logger.error(f"Error checking call status: {e}")
-            return None
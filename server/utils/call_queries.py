@@ -0,0 +1,287 @@
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from model.model import Batch, Call
+from utils.call_status import batch_counters
+
+# Page size of the batch calls listing
+CALLS_PAGE_SIZE = int(os.getenv("CALLS_PAGE_SIZE", "100"))
+CALLS_MAX_PAGE_SIZE = int(os.getenv("CALLS_MAX_PAGE_SIZE", "1000"))
+
+# Page size of the batches listing
+BATCHES_PAGE_SIZE = int(os.getenv("BATCHES_PAGE_SIZE", "50"))
+BATCHES_MAX_PAGE_SIZE = int(os.getenv("BATCHES_MAX_PAGE_SIZE", "200"))
+
+# Transcripts are the bulk of a call document, listings leave them out
+TRANSCRIPT_FIELD = "call_result.transcript"
+
+# updated_at is stamped by each writer before its update commits, so a write
+# may land behind a cursor that already moved past it. Delta syncs re-scan the
+# last CALLS_SYNC_OVERLAP seconds and clients de-dupe by call id.
+CALLS_SYNC_OVERLAP = int(os.getenv("CALLS_SYNC_OVERLAP", "30"))
+
+
+def parse_statuses(status: Optional[str]) -> List[str]:
+    """Split a comma separated status filter ("failed,no_show") into values"""
+    if not status:
+        return []
+    return [value.strip() for value in status.split(",") if value.strip()]
+
+
+def _isoformat(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def serialize_call(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a raw (possibly projected) call document into the API shape"""
+    user = document.get("user") or {}
+    call_result = document.get("call_result")
+    if call_result is not None:
+        call_result = {key: _isoformat(value) for key, value in call_result.items()}
+
+    return {
+        "id": str(document["_id"]),
+        "batch_id": document.get("batch_id"),
+        "status": document.get("status"),
+        "user": {
+            "name": user.get("name"),
+            "email": user.get("email"),
+            "phone": user.get("phone"),
+        },
+        "call_id": document.get("vapi_call_id"),
+        "call_result": call_result,
+        "created_at": _isoformat(document.get("created_at")),
+        "updated_at": _isoformat(document.get("updated_at")),
+    }
+
+
+async def find_batch_calls(
+    batch_id: str,
+    statuses: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = CALLS_PAGE_SIZE,
+    include_transcript: bool = False,
+) -> Dict[str, Any]:
+    """
+    One page of a batch's calls in _id (creation) order. cursor is the id of
+    the last call of the previous page, so every page is an index range scan
+    no matter how deep it is.
+    """
+    query: Dict[str, Any] = {"batch_id": batch_id}
+    if statuses:
+        query["status"] = {"$in": statuses}
+    if cursor:
+        query["_id"] = {"$gt": ObjectId(cursor)}
+
+    projection = None if include_transcript else {TRANSCRIPT_FIELD: 0}
+
+    # Fetch one extra document to know whether another page exists
+    documents = (
+        await Call.get_motor_collection()
+        .find(query, projection)
+        .sort("_id", 1)
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    return {
+        "calls": [serialize_call(document) for document in documents],
+        "next_cursor": str(documents[-1]["_id"]) if has_more else None,
+        "has_more": has_more,
+    }
+
+
+# Time keyset cursors are "<epoch ms>_<document id>", Mongo keeps datetimes in ms
+EPOCH = datetime(1970, 1, 1)
+ZERO_OBJECT_ID = ObjectId("0" * 24)
+
+
+def encode_time_cursor(timestamp: datetime, document_id: ObjectId) -> str:
+    return f"{(timestamp - EPOCH) // timedelta(milliseconds=1)}_{document_id}"
+
+
+def decode_time_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for anything that isn't a cursor made by encode_time_cursor"""
+    millis, _, document_id = cursor.partition("_")
+    if not document_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    try:
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(document_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def settled_cursor(cursor: str, overlap: int = CALLS_SYNC_OVERLAP) -> str:
+    """The cursor, moved back to the start of the overlap window if it lies inside it"""
+    settled = datetime.utcnow() - timedelta(seconds=overlap)
+    if decode_time_cursor(cursor)[0] < settled:
+        return cursor
+    return encode_time_cursor(settled, ZERO_OBJECT_ID)
+
+
+async def latest_sync_cursor(batch_id: str) -> str:
+    """Cursor of the most recently updated call, where a delta sync starts from"""
+    documents = (
+        await Call.get_motor_collection()
+        .find({"batch_id": batch_id}, {"updated_at": 1})
+        .sort([("updated_at", -1), ("_id", -1)])
+        .limit(1)
+        .to_list(length=1)
+    )
+    if not documents:
+        return encode_time_cursor(EPOCH, ZERO_OBJECT_ID)
+    return settled_cursor(encode_time_cursor(documents[0]["updated_at"], documents[0]["_id"]))
+
+
+async def find_batch_changes(
+    batch_id: str,
+    since: str,
+    limit: int = CALLS_PAGE_SIZE,
+    include_transcript: bool = False,
+) -> Dict[str, Any]:
+    """
+    Calls of a batch updated after the since cursor, oldest change first.
+    Pages of one sync follow each other exactly on the unique (updated_at, _id)
+    pair. The cursor handed back with the last page never goes past the
+    overlap window, so the next poll sees the last CALLS_SYNC_OVERLAP seconds
+    again: writes that committed late are picked up and clients de-dupe the
+    repeats by call id. The cost only depends on how many calls changed.
+    """
+    updated_at, call_id = decode_time_cursor(since)
+    query = {
+        "batch_id": batch_id,
+        "$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": call_id}},
+        ],
+    }
+    projection = None if include_transcript else {TRANSCRIPT_FIELD: 0}
+
+    documents = (
+        await Call.get_motor_collection()
+        .find(query, projection)
+        .sort([("updated_at", 1), ("_id", 1)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    next_cursor = since
+    if documents:
+        next_cursor = encode_time_cursor(documents[-1]["updated_at"], documents[-1]["_id"])
+    if not has_more:
+        next_cursor = settled_cursor(next_cursor)
+
+    return {
+        "calls": [serialize_call(document) for document in documents],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
+
+
+def serialize_batch(batch: Batch) -> Dict[str, Any]:
+    return {
+        "id": str(batch.id),
+        "file_name": batch.file_name,
+        "url": batch.url,
+        "ingest_status": batch.ingest_status,
+        "total_calls": batch.total_calls,
+        "counters": batch_counters(batch),
+        "created_at": batch.created_at.isoformat(),
+    }
+
+
+async def find_batches(cursor: Optional[str] = None, limit: int = BATCHES_PAGE_SIZE) -> Dict[str, Any]:
+    """One page of batches, latest first, keyed on (created_at, _id)"""
+    query: Dict[str, Any] = {}
+    if cursor:
+        created_at, batch_id = decode_time_cursor(cursor)
+        query = {
+            "$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": batch_id}},
+            ]
+        }
+
+    batches = (
+        await Batch.find(query)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list()
+    )
+    has_more = len(batches) > limit
+    batches = batches[:limit]
+
+    return {
+        "batches": [serialize_batch(batch) for batch in batches],
+        "next_cursor": (
+            encode_time_cursor(batches[-1].created_at, batches[-1].id) if has_more else None
+        ),
+        "has_more": has_more,
+    }
+
+
+async def aggregate_batch_stats(batch_id: str) -> Dict[str, Any]:
+    """
+    Status counts, average quality score and intent distribution of a batch,
+    computed by Mongo in one aggregation instead of shipping every call.
+    Calls whose analysis failed for good hold a placeholder and are left out
+    """
+    pipeline = [
+        {"$match": {"batch_id": batch_id}},
+        {
+            "$facet": {
+                "statuses": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "quality": [
+                    {
+                        "$match": {
+                            "call_result.quality_score": {"$type": "number"},
+                            "call_result.analysis_failed": {"$ne": True},
+                        }
+                    },
+                    {
+                        "$group": {
+                            "_id": None,
+                            "avg": {"$avg": "$call_result.quality_score"},
+                            "count": {"$sum": 1},
+                        }
+                    },
+                ],
+                "intents": [
+                    {
+                        "$match": {
+                            "call_result.customer_intent": {"$type": "string"},
+                            "call_result.analysis_failed": {"$ne": True},
+                        }
+                    },
+                    {"$group": {"_id": "$call_result.customer_intent", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                ],
+            }
+        },
+    ]
+    results = await Call.get_motor_collection().aggregate(pipeline).to_list(length=1)
+    facets = results[0] if results else {"statuses": [], "quality": [], "intents": []}
+
+    by_status = {group["_id"]: group["count"] for group in facets["statuses"]}
+    quality = facets["quality"][0] if facets["quality"] else {"avg": None, "count": 0}
+
+    return {
+        "total_calls": sum(by_status.values()),
+        "by_status": by_status,
+        "avg_quality_score": round(quality["avg"], 2) if quality["avg"] is not None else None,
+        "scored_calls": quality["count"],
+        "customer_intents": {group["_id"]: group["count"] for group in facets["intents"]},
+    }
+
+
+async def find_call(call_id: str) -> Optional[Dict[str, Any]]:
+    """Full call document, transcript included"""
+    document = await Call.get_motor_collection().find_one({"_id": ObjectId(call_id)})
+    return serialize_call(document) if document else None
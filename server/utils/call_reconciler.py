@@ -0,0 +1,393 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from pymongo import UpdateOne
+
+from model.model import Call, CallStatus
+from utils.call_events import publish_call_event
+from utils.call_status import bulk_set_call_status
+from utils.events import completion_queue
+from utils.vapi_client import VAPIClient, VAPIRequestFailed, parse_vapi_time, vapi_time
+
+# Webhooks drive call statuses, the reconciler only catches calls that never got one
+CALL_RECONCILER_ENABLED = os.getenv("CALL_RECONCILER_ENABLED", "false").lower() == "true"
+CALL_RECONCILE_INTERVAL = float(os.getenv("CALL_RECONCILE_INTERVAL", "300"))  # seconds between runs
+CALL_RECONCILE_STALE_AFTER = int(os.getenv("CALL_RECONCILE_STALE_AFTER", "900"))  # seconds without an update
+CALL_RECONCILE_BATCH_SIZE = int(os.getenv("CALL_RECONCILE_BATCH_SIZE", "10000"))
+# Concurrent list-calls requests, each walks one time window page by page
+CALL_RECONCILE_CONCURRENCY = int(os.getenv("CALL_RECONCILE_CONCURRENCY", "5"))
+CALL_RECONCILE_PAGE_SIZE = int(os.getenv("CALL_RECONCILE_PAGE_SIZE", "1000"))
+CALL_RECONCILE_WINDOW = int(os.getenv("CALL_RECONCILE_WINDOW", "3600"))  # seconds per list window
+# How long before its last status change a VAPI call may have been created
+CALL_RECONCILE_LOOKBACK = int(os.getenv("CALL_RECONCILE_LOOKBACK", "7200"))
+# Calls the list pages didn't cover are fetched one by one, up to this many per run
+CALL_RECONCILE_MAX_LOOKUPS = int(os.getenv("CALL_RECONCILE_MAX_LOOKUPS", "50"))
+# A call VAPI doesn't return is looked up again after interval * 2^misses seconds,
+# and marked failed once it has been missed this many times
+CALL_RECONCILE_MAX_MISSES = int(os.getenv("CALL_RECONCILE_MAX_MISSES", "5"))
+
+# Statuses a call only leaves through a webhook
+RECONCILED_STATUSES = (
+    CallStatus.INITIATED.value,
+    CallStatus.IN_PROGRESS.value,
+    CallStatus.ACTIVE.value,
+)
+
+
+def completion_payload(vapi_call: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a VAPI call object like the end-of-call-report handle_call_completion expects"""
+    return {
+        "message": {
+            "type": "end-of-call-report",
+            "endedReason": vapi_call.get("endedReason"),
+            "artifact": vapi_call.get("artifact") or {},
+            "analysis": vapi_call.get("analysis") or {},
+            "call": vapi_call,
+        },
+        "call": vapi_call,
+    }
+
+
+def list_windows(
+    timestamps: List[datetime], lookback: int, window: int
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Time windows covering [t - lookback, t + 1 minute] for every timestamp,
+    overlapping ranges merged and then cut into slices of at most window seconds
+    """
+    merged: List[List[datetime]] = []
+    for timestamp in sorted(timestamps):
+        start = timestamp - timedelta(seconds=lookback)
+        end = timestamp + timedelta(minutes=1)
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    windows = []
+    for start, end in merged:
+        while start < end:
+            windows.append((start, min(end, start + timedelta(seconds=window))))
+            start += timedelta(seconds=window)
+    return windows
+
+
+class CallReconciler:
+    """
+    Periodically checks calls that have sat in a live status for too long
+    against VAPI. Stale calls are found with one (status, updated_at) index
+    scan and matched against VAPI's call list, fetched page by page over the
+    time windows they were placed in. Ended calls go through the completion
+    queue exactly like a late webhook would, unless a completion job already
+    exists for them; calls VAPI reports as in progress are moved forward in
+    a single bulk_write. Calls VAPI doesn't return are backed off and end up
+    failed after max_misses lookups.
+    """
+
+    def __init__(
+        self,
+        vapi_client: VAPIClient,
+        interval: float = CALL_RECONCILE_INTERVAL,
+        stale_after: int = CALL_RECONCILE_STALE_AFTER,
+        batch_size: int = CALL_RECONCILE_BATCH_SIZE,
+        concurrency: int = CALL_RECONCILE_CONCURRENCY,
+        page_size: int = CALL_RECONCILE_PAGE_SIZE,
+        window: int = CALL_RECONCILE_WINDOW,
+        lookback: int = CALL_RECONCILE_LOOKBACK,
+        max_lookups: int = CALL_RECONCILE_MAX_LOOKUPS,
+        max_misses: int = CALL_RECONCILE_MAX_MISSES,
+    ):
+        self.vapi_client = vapi_client
+        self.interval = interval
+        self.stale_after = stale_after
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.window = window
+        self.lookback = lookback
+        self.max_lookups = max_lookups
+        self.max_misses = max_misses
+        self.slots = asyncio.Semaphore(concurrency)
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {
+            "runs": 0,
+            "checked": 0,
+            "pages": 0,
+            "lookups": 0,
+            "lookup_errors": 0,
+            "completed": 0,
+            "advanced": 0,
+            "unchanged": 0,
+            "not_found": 0,
+            "already_queued": 0,
+            "backed_off": 0,
+            "failed": 0,
+        }
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._loop())
+        logger.info(
+            f"🟢 Call reconciler ready: every {self.interval}s, calls stale for {self.stale_after}s"
+        )
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        logger.info("🔴 Stopped call reconciler")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Call reconciliation failed: {e}")
+
+    async def find_stale_calls(self) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.stale_after)
+        return (
+            await Call.get_motor_collection()
+            .find(
+                {
+                    "status": {"$in": list(RECONCILED_STATUSES)},
+                    "updated_at": {"$lt": cutoff},
+                    "vapi_call_id": {"$type": "string"},
+                    # Backed off after VAPI didn't return them
+                    "reconcile_after": {"$not": {"$gt": now}},
+                },
+                {
+                    "batch_id": 1,
+                    "status": 1,
+                    "vapi_call_id": 1,
+                    "updated_at": 1,
+                    "reconcile_misses": 1,
+                },
+            )
+            .sort("updated_at", 1)
+            .limit(self.batch_size)
+            .to_list(length=self.batch_size)
+        )
+
+    async def _list_window(
+        self, start: datetime, end: datetime, remaining: Set[str], found: Dict[str, Dict[str, Any]]
+    ):
+        """
+        Walk one window newest first, stopping once every wanted call is found.
+        Each page ends at the oldest createdAt of the previous one, inclusive,
+        so calls sharing that timestamp across a page boundary aren't lost;
+        the ones already seen are skipped by id.
+        """
+        cursor = end
+        seen: Set[str] = set()
+        async with self.slots:
+            while remaining:
+                page = await self.vapi_client.list_calls(
+                    createdAtGe=vapi_time(start),
+                    createdAtLe=vapi_time(cursor),
+                    limit=self.page_size,
+                )
+                self.stats["pages"] += 1
+                if not page:
+                    return
+
+                unseen = [vapi_call for vapi_call in page if vapi_call.get("id") not in seen]
+                if not unseen:
+                    # A whole page shares one timestamp, lookups cover what's left
+                    return
+                for vapi_call in unseen:
+                    if vapi_call.get("id") in remaining:
+                        remaining.discard(vapi_call["id"])
+                        found[vapi_call["id"]] = vapi_call
+                if len(page) < self.page_size:
+                    return
+
+                created = {
+                    vapi_call.get("id"): parse_vapi_time(vapi_call["createdAt"]) for vapi_call in page
+                }
+                oldest = min(created.values())
+                if oldest < cursor:
+                    seen = set()
+                cursor = oldest
+                seen |= {vapi_call_id for vapi_call_id, at in created.items() if at == cursor}
+
+    async def _lookup(self, vapi_call_id: str, found: Dict[str, Dict[str, Any]], missed: Set[str]):
+        """Look one call up, only a 404 counts as a miss, other failures are retried next run"""
+        try:
+            async with self.slots:
+                vapi_call = await self.vapi_client.lookup_call(vapi_call_id)
+        except VAPIRequestFailed as e:
+            self.stats["lookup_errors"] += 1
+            logger.warning(f"⚠️ Lookup of call {vapi_call_id} failed, checking again next run: {e}")
+            return
+        self.stats["lookups"] += 1
+        if vapi_call:
+            found[vapi_call_id] = vapi_call
+        else:
+            missed.add(vapi_call_id)
+
+    async def fetch_vapi_calls(
+        self, calls: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Dict[str, Any]], Set[str]]:
+        """
+        VAPI's view of the given calls keyed by VAPI call ID, plus the IDs that
+        neither the list pages nor a lookup of their own returned
+        """
+        remaining = {call["vapi_call_id"] for call in calls}
+        found: Dict[str, Dict[str, Any]] = {}
+        missed: Set[str] = set()
+
+        windows = list_windows([call["updated_at"] for call in calls], self.lookback, self.window)
+        await asyncio.gather(
+            *(self._list_window(start, end, remaining, found) for start, end in windows)
+        )
+
+        # calls come oldest first, so the calls stuck longest are looked up first
+        lookups = [call["vapi_call_id"] for call in calls if call["vapi_call_id"] in remaining]
+        await asyncio.gather(
+            *(self._lookup(vapi_call_id, found, missed) for vapi_call_id in lookups[: self.max_lookups])
+        )
+        return found, missed
+
+    async def back_off(self, calls: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Push back the next check of calls VAPI didn't return, exponentially per
+        miss, and fail the ones missed max_misses times. Returns (backed off, failed)
+        """
+        now = datetime.utcnow()
+        retry, lost = [], []
+        for call in calls:
+            misses = call.get("reconcile_misses", 0) + 1
+            if misses >= self.max_misses:
+                lost.append(call)
+            else:
+                retry.append(
+                    UpdateOne(
+                        {"_id": call["_id"]},
+                        {
+                            "$set": {
+                                "reconcile_misses": misses,
+                                "reconcile_after": now + timedelta(seconds=self.interval * 2**misses),
+                            }
+                        },
+                    )
+                )
+
+        if retry:
+            await Call.get_motor_collection().bulk_write(retry, ordered=False)
+        failed = await bulk_set_call_status(lost, CallStatus.FAILED)
+        for call in lost:
+            logger.warning(f"⚠️ VAPI has no call {call['vapi_call_id']}, marking it failed")
+            publish_call_event(
+                call["_id"], call["batch_id"], CallStatus.FAILED, vapi_call_id=call["vapi_call_id"]
+            )
+        return len(retry), failed
+
+    async def run_once(self) -> Dict[str, int]:
+        """Check up to batch_size stale calls, oldest first"""
+        calls = await self.find_stale_calls()
+        summary = {
+            "checked": len(calls),
+            "completed": 0,
+            "advanced": 0,
+            "unchanged": 0,
+            "not_found": 0,
+            "already_queued": 0,
+            "backed_off": 0,
+            "failed": 0,
+        }
+        if calls:
+            vapi_calls, missed = await self.fetch_vapi_calls(calls)
+
+            ended: List[Tuple[str, Dict[str, Any]]] = []
+            started: List[Dict[str, Any]] = []
+            lost: List[Dict[str, Any]] = []
+            for call in calls:
+                vapi_call = vapi_calls.get(call["vapi_call_id"])
+                if not vapi_call:
+                    summary["not_found"] += 1
+                    if call["vapi_call_id"] in missed:
+                        lost.append(call)
+                elif vapi_call.get("status") == "ended":
+                    ended.append((call["vapi_call_id"], completion_payload(vapi_call)))
+                elif (
+                    vapi_call.get("status") == "in-progress"
+                    and call["status"] == CallStatus.INITIATED.value
+                ):
+                    started.append(call)
+                else:
+                    summary["unchanged"] += 1
+
+            # Ended calls still need their transcript and analysis, the completion
+            # workers do that; enqueue_many is a single bulk_write. Re-enqueueing
+            # would reset a job in flight or dead-lettered, so those are left alone
+            queued = await completion_queue.existing_keys(key for key, _ in ended)
+            summary["already_queued"] = len(queued)
+            summary["completed"] = await completion_queue.enqueue_many(
+                (key, payload) for key, payload in ended if key not in queued
+            )
+
+            summary["advanced"] = await bulk_set_call_status(started, CallStatus.IN_PROGRESS)
+            for call in started:
+                publish_call_event(
+                    call["_id"], call["batch_id"], CallStatus.IN_PROGRESS, vapi_call_id=call["vapi_call_id"]
+                )
+
+            summary["backed_off"], summary["failed"] = await self.back_off(lost)
+
+        for name, count in summary.items():
+            self.stats[name] += count
+        self.stats["runs"] += 1
+        self.last_run_at = datetime.utcnow()
+        if calls:
+            logger.info(f"🔁 Reconciled stale calls: {summary}")
+        return summary
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+# Global reconciler, only started when enabled
+call_reconciler: Optional[CallReconciler] = None
+
+
+def start_call_reconciler(vapi_client: VAPIClient) -> Optional[CallReconciler]:
+    """Start the periodic reconciler if CALL_RECONCILER_ENABLED is set"""
+    global call_reconciler
+
+    if not CALL_RECONCILER_ENABLED:
+        return None
+
+    call_reconciler = CallReconciler(vapi_client)
+    call_reconciler.start()
+    return call_reconciler
+
+
+async def stop_call_reconciler():
+    """Stop the periodic reconciler"""
+    global call_reconciler
+
+    if call_reconciler:
+        await call_reconciler.stop()
+        call_reconciler = None
+
+
+def get_call_reconciler() -> CallReconciler:
+    """Get the shared call reconciler"""
+    global call_reconciler
+
+    if not call_reconciler:
+        raise RuntimeError("Call reconciler not started. Set CALL_RECONCILER_ENABLED=true.")
+
+    return call_reconciler
@@ -0,0 +1,263 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from bson import ObjectId
+from loguru import logger
+from pymongo import ReturnDocument, UpdateOne
+
+from model.model import Batch, Call, CallStatus
+
+# Dashboard progress buckets of the raw call statuses
+STATUS_BUCKETS = {
+    CallStatus.PENDING.value: "pending",
+    CallStatus.INITIATED.value: "in_progress",
+    CallStatus.IN_PROGRESS.value: "in_progress",
+    CallStatus.ACTIVE.value: "in_progress",
+    "redialed": "in_progress",
+    CallStatus.COMPLETED.value: "completed",
+    CallStatus.DONE.value: "completed",
+    CallStatus.ENDED.value: "completed",
+    CallStatus.FAILED.value: "failed",
+    CallStatus.CANCELLED.value: "failed",
+    CallStatus.NO_SHOW.value: "failed",
+    CallStatus.TERMINATED.value: "failed",
+}
+COUNTER_NAMES = ("pending", "in_progress", "completed", "failed")
+
+# A call in one of these is on the line (or ringing) and holds its phone number
+LIVE_STATUSES = (
+    CallStatus.INITIATED.value,
+    CallStatus.IN_PROGRESS.value,
+    CallStatus.ACTIVE.value,
+)
+
+# How far along a call is, webhooks may only move a call forward
+STATUS_RANK = {
+    CallStatus.PENDING.value: 0,
+    "redialed": 0,
+    CallStatus.INITIATED.value: 1,
+    CallStatus.IN_PROGRESS.value: 2,
+    CallStatus.ACTIVE.value: 2,
+    CallStatus.COMPLETED.value: 3,
+    CallStatus.DONE.value: 3,
+    CallStatus.ENDED.value: 3,
+    CallStatus.FAILED.value: 3,
+    CallStatus.CANCELLED.value: 3,
+    CallStatus.NO_SHOW.value: 3,
+    CallStatus.TERMINATED.value: 3,
+}
+
+
+def _status_value(status: Any) -> str:
+    return getattr(status, "value", status)
+
+
+async def bump_batch_counters(batch_id: str, old_status: Optional[str], new_status: str):
+    """Move one call from old_status to new_status in the batch's status_counts"""
+    increments = {f"status_counts.{_status_value(new_status)}": 1}
+    if old_status:
+        increments[f"status_counts.{_status_value(old_status)}"] = -1
+    try:
+        await Batch.get_motor_collection().update_one(
+            {"_id": ObjectId(batch_id)}, {"$inc": increments}
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to update counters of batch {batch_id}: {e}")
+
+
+async def set_call_status(
+    query: Dict[str, Any], status: Any, fields: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Atomically set a call's status (plus any other fields) and move it between
+    the batch counters. Returns the call as it was before the update, or None
+    when no call matched.
+    """
+    status = _status_value(status)
+    previous = await Call.get_motor_collection().find_one_and_update(
+        query,
+        {"$set": {**(fields or {}), "status": status, "updated_at": datetime.utcnow()}},
+        projection={"batch_id": 1, "status": 1, "vapi_call_id": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if previous and previous.get("status") != status:
+        await bump_batch_counters(previous["batch_id"], previous.get("status"), status)
+    return previous
+
+
+async def bulk_set_call_status(calls: List[Dict[str, Any]], status: Any) -> int:
+    """
+    Move many calls to status with one bulk_write. calls are raw documents
+    with _id, batch_id and status as they were read; a call whose status
+    changed since is left alone. Returns how many calls were updated.
+    """
+    status = _status_value(status)
+    if not calls:
+        return 0
+
+    op = uuid4().hex
+    now = datetime.utcnow()
+    result = await Call.get_motor_collection().bulk_write(
+        [
+            UpdateOne(
+                {"_id": call["_id"], "status": call["status"]},
+                {"$set": {"status": status, "updated_at": now, "status_op": op}},
+            )
+            for call in calls
+        ],
+        ordered=False,
+    )
+
+    await _move_batch_counters(calls, status, result.modified_count, op)
+    return result.modified_count
+
+
+async def set_calls_status(
+    calls: List[Dict[str, Any]], status: Any, fields: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Move many calls to status (plus any other fields) with one update_many
+    per prior status. calls are raw documents with _id, batch_id and status
+    as they were read; a call whose status changed since is left alone.
+    Returns how many calls were updated.
+    """
+    status = _status_value(status)
+    if not calls:
+        return 0
+
+    by_status: Dict[str, List[Any]] = defaultdict(list)
+    for call in calls:
+        by_status[call["status"]].append(call["_id"])
+
+    op = uuid4().hex
+    update = {
+        "$set": {**(fields or {}), "status": status, "updated_at": datetime.utcnow(), "status_op": op}
+    }
+    modified = 0
+    for prior, ids in by_status.items():
+        result = await Call.get_motor_collection().update_many(
+            {"_id": {"$in": ids}, "status": prior}, update
+        )
+        modified += result.modified_count
+
+    await _move_batch_counters(calls, status, modified, op)
+    return modified
+
+
+async def _move_batch_counters(calls: List[Dict[str, Any]], status: str, modified: int, op: str):
+    """
+    Move the counters of a bulk status change, one write per batch. Only the
+    calls the update actually modified move, found by the op tag it set when
+    some calls had already moved on.
+    """
+    if not modified:
+        return
+    if modified < len(calls):
+        collection = Call.get_motor_collection()
+        moved = {
+            doc["_id"]
+            async for doc in collection.find(
+                {"_id": {"$in": [call["_id"] for call in calls]}, "status_op": op}, {"_id": 1}
+            )
+        }
+        calls = [call for call in calls if call["_id"] in moved]
+
+    increments: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for call in calls:
+        if call["status"] == status:
+            continue
+        increments[call["batch_id"]][f"status_counts.{call['status']}"] -= 1
+        increments[call["batch_id"]][f"status_counts.{status}"] += 1
+    if increments:
+        await Batch.get_motor_collection().bulk_write(
+            [
+                UpdateOne({"_id": ObjectId(batch_id)}, {"$inc": dict(counts)})
+                for batch_id, counts in increments.items()
+            ],
+            ordered=False,
+        )
+
+
+def statuses_not_before(status: str) -> List[str]:
+    """Statuses a call must not be in to move to status (same status is allowed, it merges)"""
+    rank = STATUS_RANK.get(status, 0)
+    return [other for other, other_rank in STATUS_RANK.items() if other_rank >= rank and other != status]
+
+
+async def advance_call_status(
+    vapi_call_id: str, status: Any, fields: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Move the call with this VAPI ID to status in one round trip, unless it is
+    already further along (e.g. a late call.started after completion).
+    Returns (call before the update, outcome) where outcome is "updated",
+    "stale" or "not_found".
+    """
+    status = _status_value(status)
+    previous = await set_call_status(
+        {"vapi_call_id": vapi_call_id, "status": {"$nin": statuses_not_before(status)}},
+        status,
+        fields,
+    )
+    if previous:
+        return previous, "updated"
+
+    # Only the miss path pays for a second lookup, to tell the two cases apart
+    current = await Call.get_motor_collection().find_one(
+        {"vapi_call_id": vapi_call_id}, {"batch_id": 1, "status": 1}
+    )
+    if current:
+        logger.info(
+            f"⏭️ Ignoring {status} for call {vapi_call_id}, it is already {current.get('status')}"
+        )
+        return current, "stale"
+    return None, "not_found"
+
+
+def batch_counters(batch: Batch) -> Dict[str, int]:
+    """total/pending/in_progress/completed/failed of a batch from its status_counts"""
+    counters = {"total": batch.total_calls, **{name: 0 for name in COUNTER_NAMES}}
+    for status, count in (batch.status_counts or {}).items():
+        bucket = STATUS_BUCKETS.get(status)
+        if bucket:
+            counters[bucket] += count
+    return counters
+
+
+async def reset_batch_counters(batch_id: str, by_status: Dict[str, int]):
+    """Overwrite the counters with freshly aggregated ones, repairs any drift"""
+    await Batch.get_motor_collection().update_one(
+        {"_id": ObjectId(batch_id)},
+        {"$set": {"status_counts": by_status, "total_calls": sum(by_status.values())}},
+    )
+
+
+async def recount_batch_counters(batch_id: str) -> bool:
+    """
+    Recompute a batch's status_counts from its calls. The write only lands if
+    the counters still hold what was read before counting, so an $inc that
+    arrives meanwhile is never overwritten. Returns whether it was written.
+    """
+    batch = await Batch.get_motor_collection().find_one(
+        {"_id": ObjectId(batch_id)}, {"status_counts": 1}
+    )
+    if not batch:
+        return False
+
+    pipeline = [
+        {"$match": {"batch_id": batch_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]
+    by_status = {
+        row["_id"]: row["count"]
+        async for row in Call.get_motor_collection().aggregate(pipeline)
+    }
+    result = await Batch.get_motor_collection().update_one(
+        {"_id": ObjectId(batch_id), "status_counts": batch.get("status_counts", {})},
+        {"$set": {"status_counts": by_status, "total_calls": sum(by_status.values())}},
+    )
+    if not result.matched_count:
+        logger.warning(f"⚠️ Counters of batch {batch_id} changed while recounting, left as they are")
+    return bool(result.matched_count)
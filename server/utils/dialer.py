@@ -0,0 +1,398 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from bson import ObjectId
+from model.model import Call, CallStatus, Job, JobStatus
+from utils.call_executor import CallExecutor
+from utils.vapi_client import CallNotPlaced
+from utils.call_events import publish_call_event
+from utils.call_status import LIVE_STATUSES, set_call_status, set_calls_status
+from utils.job_queue import JobDeferred, JobQueue, JobWorkerPool
+
+# Load environment variables
+load_dotenv()
+
+# Dialer tuning - shared by every batch. The concurrency limits cap live calls
+# (placed and not yet ended), counted in Mongo so every process sees them
+DIALER_MAX_CONCURRENCY = int(os.getenv("DIALER_MAX_CONCURRENCY", "10"))
+DIALER_CALLS_PER_SECOND = float(os.getenv("DIALER_CALLS_PER_SECOND", "5"))
+DIALER_BURST = int(os.getenv("DIALER_BURST", str(max(1, int(DIALER_CALLS_PER_SECOND)))))
+DIALER_PER_NUMBER_CONCURRENCY = int(os.getenv("DIALER_PER_NUMBER_CONCURRENCY", "5"))
+# How often a dial waiting for a free number re-counts live calls, and how long
+# it waits before its job is put back on the queue
+DIALER_SLOT_POLL_INTERVAL = float(os.getenv("DIALER_SLOT_POLL_INTERVAL", "2"))  # seconds
+DIALER_SLOT_WAIT = float(os.getenv("DIALER_SLOT_WAIT", "30"))  # seconds
+DIALER_SLOT_RETRY_DELAY = float(os.getenv("DIALER_SLOT_RETRY_DELAY", "15"))  # seconds
+
+# Only finished calls can be redialed in bulk, live ones would be dialed twice.
+# Calls that went through are redialed only when asked for explicitly
+REDIAL_STATUSES = (
+    CallStatus.FAILED.value,
+    CallStatus.NO_SHOW.value,
+    CallStatus.CANCELLED.value,
+    CallStatus.TERMINATED.value,
+)
+COMPLETED_REDIAL_STATUSES = (
+    CallStatus.COMPLETED.value,
+    CallStatus.DONE.value,
+    CallStatus.ENDED.value,
+)
+
+# Comma separated list of VAPI phone number ids to spread calls over,
+# falls back to the single PHONE_NUMBER_ID used by CallExecutor
+PHONE_NUMBER_IDS = [
+    number_id.strip()
+    for number_id in os.getenv("PHONE_NUMBER_IDS", os.getenv("PHONE_NUMBER_ID", "")).split(",")
+    if number_id.strip()
+]
+
+
+class TokenBucket:
+    """Async token bucket limiting how many calls are started per second"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NoFreeNumber(Exception):
+    """Every phone number (or the global cap) stayed at its live call limit"""
+
+
+async def count_live_calls() -> Dict[Optional[str], int]:
+    """Live calls per phone_number_id, calls placed before it was recorded count under None"""
+    pipeline = [
+        {"$match": {"status": {"$in": list(LIVE_STATUSES)}}},
+        {"$group": {"_id": "$phone_number_id", "count": {"$sum": 1}}},
+    ]
+    return {
+        row["_id"]: row["count"]
+        async for row in Call.get_motor_collection().aggregate(pipeline)
+    }
+
+
+class PhoneNumberPool:
+    """
+    Hands out phone number ids while keeping each number's live calls under
+    per_number_limit and all live calls under total_limit. A call holds its
+    slot until the webhooks or the reconciler move it out of a live status;
+    dials started here but not yet saved as initiated are counted on top.
+    """
+
+    def __init__(
+        self,
+        phone_number_ids: List[str],
+        per_number_limit: int,
+        total_limit: Optional[int] = None,
+        live_counts: Callable[[], Awaitable[Dict[Optional[str], int]]] = count_live_calls,
+        poll_interval: float = DIALER_SLOT_POLL_INTERVAL,
+    ):
+        # None means "let CallExecutor use its default PHONE_NUMBER_ID"
+        self.dialing: Dict[Optional[str], int] = {
+            number_id: 0 for number_id in (phone_number_ids or [None])
+        }
+        self.per_number_limit = per_number_limit
+        self.total_limit = total_limit
+        self.live_counts = live_counts
+        self.poll_interval = poll_interval
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Wait for the least busy number with spare capacity, NoFreeNumber after timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        async with self._condition:
+            while True:
+                live = await self.live_counts()
+                busy = {
+                    number_id: live.get(number_id, 0) + dialing
+                    for number_id, dialing in self.dialing.items()
+                }
+                total = sum(live.values()) + sum(self.dialing.values())
+                number_id = min(busy, key=busy.get)
+                if busy[number_id] < self.per_number_limit and (
+                    self.total_limit is None or total < self.total_limit
+                ):
+                    self.dialing[number_id] += 1
+                    return number_id
+
+                wait = self.poll_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - loop.time())
+                    if wait <= 0:
+                        raise NoFreeNumber(f"All phone numbers at their live call limit ({busy})")
+                try:
+                    # Woken early by a local release, live calls ending elsewhere are polled
+                    await asyncio.wait_for(self._condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, number_id: Optional[str]):
+        """The dial is over, a placed call is now counted through its live status"""
+        async with self._condition:
+            self.dialing[number_id] -= 1
+            self._condition.notify()
+
+
+class DialerStats:
+    """Running counters used to report dialer throughput"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.dialed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.total_dial_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "dialed": self.dialed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "elapsed_seconds": round(elapsed, 2),
+            "calls_per_second": round(self.dialed / elapsed, 2) if elapsed > 0 else 0.0,
+            "avg_dial_seconds": (
+                round(self.total_dial_seconds / self.dialed, 3) if self.dialed else 0.0
+            ),
+        }
+
+
+class Dialer:
+    """Dials calls under a rate limit, a global live call cap and per-number caps"""
+
+    def __init__(
+        self,
+        call_executor: CallExecutor,
+        max_concurrency: int = DIALER_MAX_CONCURRENCY,
+        calls_per_second: float = DIALER_CALLS_PER_SECOND,
+        burst: int = DIALER_BURST,
+        phone_number_ids: Optional[List[str]] = None,
+        per_number_concurrency: int = DIALER_PER_NUMBER_CONCURRENCY,
+    ):
+        self.call_executor = call_executor
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(calls_per_second, burst)
+        self.numbers = PhoneNumberPool(
+            phone_number_ids if phone_number_ids is not None else PHONE_NUMBER_IDS,
+            per_number_concurrency,
+            total_limit=max_concurrency,
+        )
+        self.stats = DialerStats()
+        self.batch_stats: Dict[str, DialerStats] = {}
+
+    async def dial(
+        self,
+        call: Call,
+        assistant_id: str,
+        batch_stats: Optional[DialerStats] = None,
+        can_retry: bool = False,
+        slot_wait: Optional[float] = None,
+    ) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        Dial a single call once all limits allow it. A failed call is marked
+        failed, except that with can_retry a CallNotPlaced (VAPI never got the
+        call) is raised instead so the caller can try again. Raises
+        NoFreeNumber when no number frees up within slot_wait seconds.
+        """
+        number_id = await self.numbers.acquire(timeout=slot_wait)
+        counters = [self.stats] + ([batch_stats] if batch_stats else [])
+        try:
+            await self.bucket.acquire()
+            for stats in counters:
+                stats.in_flight += 1
+            started = time.monotonic()
+            try:
+                success, vapi_call_id, error_message = await self.call_executor.execute_call(
+                    call_data=call, assistant_id=assistant_id, phone_number_id=number_id
+                )
+            except CallNotPlaced as e:
+                if can_retry:
+                    for stats in counters:
+                        stats.failed += 1
+                    raise
+                success, vapi_call_id, error_message = False, None, str(e)
+            finally:
+                elapsed = time.monotonic() - started
+                for stats in counters:
+                    stats.in_flight -= 1
+                    stats.dialed += 1
+                    stats.total_dial_seconds += elapsed
+        finally:
+            # A placed call is saved as initiated by now and holds the number from Mongo
+            await self.numbers.release(number_id)
+
+        for stats in counters:
+            if success:
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+
+        if success:
+            publish_call_event(
+                call.id, call.batch_id, CallStatus.INITIATED, vapi_call_id=vapi_call_id
+            )
+        else:
+            await set_call_status({"_id": call.id}, CallStatus.FAILED)
+            publish_call_event(call.id, call.batch_id, CallStatus.FAILED)
+        return success, vapi_call_id, error_message
+
+    def stats_for(self, batch_id: str) -> DialerStats:
+        """Get the throughput counters of a batch, creating them on first use"""
+        if batch_id not in self.batch_stats:
+            self.batch_stats[batch_id] = DialerStats()
+        return self.batch_stats[batch_id]
+
+
+DIAL_QUEUE = "dial"
+
+# Process wide dialer and its durable job queue, shared by every upload and redial
+dialer: Optional[Dialer] = None
+dial_queue = JobQueue(DIAL_QUEUE)
+dial_workers: Optional[JobWorkerPool] = None
+
+
+async def enqueue_calls(
+    call_ids: List[str], batch_id: str, assistant_id: str, redial_id: Optional[str] = None
+) -> int:
+    """Enqueue dial jobs keyed on Call._id, redial_id tags the jobs of a bulk redial"""
+    payload = {"batch_id": batch_id, "assistant_id": assistant_id}
+    if redial_id:
+        payload["redial_id"] = redial_id
+    return await dial_queue.enqueue_many((call_id, payload) for call_id in call_ids)
+
+
+async def redial_batch(batch_id: str, statuses: List[str], assistant_id: str) -> Dict[str, Any]:
+    """
+    Reset a batch's calls in the given statuses to pending and hand them to
+    the dial queue. One indexed query picks the calls and one update_many
+    resets them; the returned redial_id tracks the dial jobs.
+    """
+    calls = (
+        await Call.get_motor_collection()
+        .find({"batch_id": batch_id, "status": {"$in": statuses}}, {"batch_id": 1, "status": 1})
+        .to_list(length=None)
+    )
+    redial_id = uuid.uuid4().hex
+    reset = await set_calls_status(
+        calls, CallStatus.PENDING, {"call_result": None, "vapi_call_id": None}
+    )
+    # A call that moved on in the meantime is skipped by handle_dial_job
+    await enqueue_calls([str(call["_id"]) for call in calls], batch_id, assistant_id, redial_id)
+    for call in calls:
+        publish_call_event(call["_id"], batch_id, CallStatus.PENDING, vapi_call_id=None)
+
+    logger.info(f"🔁 Redial {redial_id}: {reset}/{len(calls)} calls of batch {batch_id} requeued")
+    return {
+        "redial_id": redial_id,
+        "batch_id": batch_id,
+        "statuses": statuses,
+        "selected": len(calls),
+        "reset": reset,
+        "progress": await redial_progress(redial_id),
+    }
+
+
+async def redial_progress(redial_id: str) -> Dict[str, int]:
+    """
+    Dial job counts of a bulk redial: done jobs were dialed (or no longer
+    pending), dead ones failed every attempt, the rest are still to go
+    """
+    pipeline = [
+        {"$match": {"queue": DIAL_QUEUE, "payload.redial_id": redial_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]
+    counts = {status.value: 0 for status in JobStatus}
+    async for row in Job.get_motor_collection().aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    return {"total": sum(counts.values()), **counts}
+
+
+async def handle_dial_job(job: Dict[str, Any]):
+    """
+    Dial the call behind a leased job. Only failures that happened before
+    VAPI got the request (connect errors, 429) raise so the queue retries;
+    anything that may have placed the call marks it failed instead. While
+    every number is busy the job is put back well before its lease expires.
+    """
+    call = await Call.get(ObjectId(job["key"]))
+    if not call or call.status != CallStatus.PENDING:
+        # Already dialed (e.g. by a worker whose lease expired) or removed
+        logger.info(f"⏭️ Skipping dial job {job['key']}: call is not pending")
+        return
+
+    payload = job["payload"]
+    final_attempt = job["attempts"] >= job.get("max_attempts", dial_queue.max_attempts)
+    try:
+        success, _, error_message = await get_dialer().dial(
+            call,
+            assistant_id=payload["assistant_id"],
+            batch_stats=get_dialer().stats_for(payload["batch_id"]),
+            can_retry=not final_attempt,
+            slot_wait=DIALER_SLOT_WAIT,
+        )
+    except NoFreeNumber as e:
+        raise JobDeferred(DIALER_SLOT_RETRY_DELAY, str(e))
+    if not success:
+        logger.warning(f"⚠️ Dial job {job['key']} failed for good: {error_message}")
+
+
+def start_dialer(call_executor: CallExecutor) -> Dialer:
+    """Create the shared dialer and start its queue workers, call on application startup"""
+    global dialer, dial_workers
+
+    dialer = Dialer(call_executor)
+    dial_workers = JobWorkerPool(dial_queue, handle_dial_job, DIALER_MAX_CONCURRENCY)
+    dial_workers.start()
+    logger.info(
+        f"🟢 Dialer ready: concurrency={DIALER_MAX_CONCURRENCY}, "
+        f"rate={DIALER_CALLS_PER_SECOND}/s, numbers={PHONE_NUMBER_IDS or ['default']}"
+    )
+    return dialer
+
+
+async def stop_dialer():
+    """Stop the dial workers, unacked jobs are picked up again after a restart"""
+    global dial_workers
+
+    if dial_workers:
+        await dial_workers.stop()
+        dial_workers = None
+
+
+def get_dialer() -> Dialer:
+    """Get the shared dialer instance"""
+    global dialer
+
+    if not dialer:
+        raise RuntimeError("Dialer not started. Call start_dialer() first.")
+
+    return dialer
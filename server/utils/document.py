@@ -1,115 +1,215 @@
 import pandas as pd
 from loguru import logger
-from typing import List
+from typing import Dict, Iterator, List, Optional
+from itertools import islice
+from datetime import datetime
 from model.model import User
 import os
 
-def read_xlsx_file(file_path: str) -> List[User]:
+# Rows parsed and normalized at a time, keeps memory flat for large lead lists
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+
+# Lead file formats accepted by /upload
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+CSV_EXTENSIONS = (".csv",)
+ARROW_EXTENSIONS = (".parquet", ".arrow", ".feather")
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + CSV_EXTENSIONS + ARROW_EXTENSIONS
+
+try:
+    import pyarrow  # noqa: F401 - needed for the Parquet/Arrow fast path
+
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Expected column names (case-insensitive)
+name_columns = ['name', 'full_name', 'fullname', 'user_name', 'username']
+first_name_columns = ['first_name', 'firstname', 'fname', 'first']
+last_name_columns = ['last_name', 'lastname', 'lname', 'last']
+email_columns = ['email', 'email_address', 'e_mail']
+phone_columns = ['phone', 'phone_number', 'mobile', 'mobile_number', 'contact']
+
+
+def detect_columns(columns: List) -> Dict[str, Optional[str]]:
     """
-    Read Excel file and extract user data (name, email, phone number)
-    Returns a list of User objects
+    Find the actual name/email/phone column names (case-insensitive)
+    Raises ValueError when a required column is missing
     """
+    found = {"name": None, "first_name": None, "last_name": None, "email": None, "phone": None}
+    aliases = {
+        "name": name_columns,
+        "first_name": first_name_columns,
+        "last_name": last_name_columns,
+        "email": email_columns,
+        "phone": phone_columns,
+    }
+
+    for col in columns:
+        if col is None:
+            continue
+        col_lower = str(col).lower().strip()
+        for field, names in aliases.items():
+            if col_lower in names and found[field] is None:
+                found[field] = col
+                break
+
+    # Check if we found required columns
+    missing_columns = []
+    if found["name"] is None and (found["first_name"] is None or found["last_name"] is None):
+        missing_columns.append("name (or first_name + last_name)")
+    if found["email"] is None:
+        missing_columns.append("email")
+    if found["phone"] is None:
+        missing_columns.append("phone")
+
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {missing_columns}. Available columns: {list(columns)}")
+
+    return found
+
+
+def _iter_xlsx_frames(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Stream an .xlsx sheet with openpyxl read-only mode, chunk_size rows at a time"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
     try:
-        # Read the Excel file
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = list(header)
+        yielded = False
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yielded = True
+            yield pd.DataFrame(chunk, columns=columns)
+        if not yielded:
+            # Header only, still let the caller validate the columns
+            yield pd.DataFrame(columns=columns)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_frames(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Stream a CSV file; everything is read as text so phone numbers stay intact"""
+    with pd.read_csv(file_path, dtype=str, chunksize=chunk_size) as reader:
+        yielded = False
+        for frame in reader:
+            yielded = True
+            yield frame
+    if not yielded:
+        yield pd.read_csv(file_path, dtype=str, nrows=0)
+
+
+def _arrow_needed_columns(names: List[str]) -> List[str]:
+    """Only the detected lead columns are read from columnar files"""
+    columns = detect_columns(names)
+    return [column for column in columns.values() if column is not None]
+
+
+def _iter_arrow_frames(file_path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read Parquet row groups or memory-mapped Arrow IPC batches, lead columns only"""
+    if not ARROW_AVAILABLE:
+        raise ValueError("Parquet/Arrow uploads need the 'pyarrow' package to be installed")
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if file_path.lower().endswith(".parquet"):
+        parquet_file = pq.ParquetFile(file_path)
+        needed = _arrow_needed_columns(parquet_file.schema_arrow.names)
+        batches = parquet_file.iter_batches(batch_size=chunk_size, columns=needed)
+        empty = parquet_file.schema_arrow.empty_table().select(needed)
+    else:
+        # Arrow IPC / Feather v2 file, memory mapped so batches are zero-copy views
+        reader = pa.ipc.open_file(pa.memory_map(file_path, "r"))
+        needed = _arrow_needed_columns(reader.schema.names)
+        table = reader.read_all().select(needed)
+        batches = table.to_batches(max_chunksize=chunk_size)
+        empty = table.schema.empty_table()
+
+    yielded = False
+    for batch in batches:
+        yielded = True
+        yield batch.to_pandas()
+    if not yielded:
+        yield empty.to_pandas()
+
+
+def iter_frames(file_path: str, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yield the raw rows of a lead file as DataFrames of at most chunk_size rows"""
+    lower_path = file_path.lower()
+    if lower_path.endswith(".xlsx"):
+        yield from _iter_xlsx_frames(file_path, chunk_size)
+    elif lower_path.endswith(CSV_EXTENSIONS):
+        yield from _iter_csv_frames(file_path, chunk_size)
+    elif lower_path.endswith(ARROW_EXTENSIONS):
+        yield from _iter_arrow_frames(file_path, chunk_size)
+    else:
+        # Legacy .xls can't be streamed, read it whole and slice it
         raw_data = pd.read_excel(file_path)
-        logger.info(f"Successfully read xlsx file: {file_path}")
-        
-        # List to store User objects
-        users = []
-        
-        # Expected column names (case-insensitive)
-        name_columns = ['name', 'full_name', 'fullname', 'user_name', 'username']
-        first_name_columns = ['first_name', 'firstname', 'fname', 'first']
-        last_name_columns = ['last_name', 'lastname', 'lname', 'last']
-        email_columns = ['email', 'email_address', 'e_mail']
-        phone_columns = ['phone', 'phone_number', 'mobile', 'mobile_number', 'contact']
-        
-        # Find the actual column names (case-insensitive)
-        name_col = None
-        first_name_col = None
-        last_name_col = None
-        email_col = None
-        phone_col = None
-        
-        for col in raw_data.columns:
-            col_lower = col.lower().strip()
-            if col_lower in name_columns and name_col is None:
-                name_col = col
-            elif col_lower in first_name_columns and first_name_col is None:
-                first_name_col = col
-            elif col_lower in last_name_columns and last_name_col is None:
-                last_name_col = col
-            elif col_lower in email_columns and email_col is None:
-                email_col = col
-            elif col_lower in phone_columns and phone_col is None:
-                phone_col = col
-        
-        # Check if we found required columns
-        missing_columns = []
-        if name_col is None and (first_name_col is None or last_name_col is None):
-            missing_columns.append("name (or first_name + last_name)")
-        if email_col is None:
-            missing_columns.append("email")
-        if phone_col is None:
-            missing_columns.append("phone")
-        
-        if missing_columns:
-            raise ValueError(f"Missing required columns: {missing_columns}. Available columns: {list(raw_data.columns)}")
-        
-        # Process each row
-        for index, row in raw_data.iterrows():
-            try:
-                # Extract data and clean it
-                if name_col:
-                    # Single name column
-                    name = str(row[name_col]).strip() if pd.notna(row[name_col]) else ""
-                else:
-                    # Separate first and last name columns
-                    first_name = str(row[first_name_col]).strip() if pd.notna(row[first_name_col]) else ""
-                    last_name = str(row[last_name_col]).strip() if pd.notna(row[last_name_col]) else ""
-                    name = f"{first_name} {last_name}".strip()
-                
-                email = str(row[email_col]).strip() if pd.notna(row[email_col]) else ""
-                phone = str(row[phone_col]).strip() if pd.notna(row[phone_col]) else ""
-                
-                # Format phone number - extract country code and add + prefix
-                if phone:
-                    # Remove all non-digit characters to get clean number
-                    phone_clean = ''.join(filter(str.isdigit, phone))
-                    
-                    # Check if the number already has a country code (starts with common country codes)
-                    # Common country codes: 1, 7, 20-27, 30-34, 36, 39, 40-49, 51-58, 60-66, 81, 82, 84, 86, 90-95, 98
-                    if phone_clean and len(phone_clean) >= 10:
-                        # Add + prefix to the clean number
-                        phone = f"+{phone_clean}"
-                    else:
-                        # If number is too short or empty, keep original
-                        phone = phone_clean if phone_clean else phone
-                
-                # Skip rows with empty required fields
-                if not name or not email or not phone:
-                    logger.warning(f"Skipping row {index + 1}: Missing required data (name: {name}, email: {email}, phone: {phone})")
-                    continue
-                
-                # Create User object
-                user = User(
-                    name=name,
-                    email=email,
-                    phone=phone
-                )
-                users.append(user)
-                
-            except Exception as e:
-                logger.error(f"Error processing row {index + 1}: {e}")
-                continue
-        if os.path.exists(file_path):
-            logger.info(f"Removing file: {file_path}")
-            os.remove(file_path)
-        logger.info(f"Successfully extracted {len(users)} users from Excel file")
-        return users
-        
-    except Exception as e:
-        logger.error(f"Error reading xlsx file: {e}")
-        raise e
+        for start in range(0, max(len(raw_data), 1), chunk_size):
+            yield raw_data.iloc[start:start + chunk_size]
 
 
+def _clean(series: pd.Series) -> pd.Series:
+    """Vectorized str(value).strip(), with missing values as empty strings"""
+    return series.astype("string").fillna("").str.strip()
+
+
+def normalize_frame(frame: pd.DataFrame, columns: Dict[str, Optional[str]]) -> pd.DataFrame:
+    """
+    Build clean name/email/phone columns for a chunk of rows and drop the rows
+    missing any of them
+    """
+    if columns["name"] is not None:
+        # Single name column
+        name = _clean(frame[columns["name"]])
+    else:
+        # Separate first and last name columns
+        name = (_clean(frame[columns["first_name"]]) + " " + _clean(frame[columns["last_name"]])).str.strip()
+
+    email = _clean(frame[columns["email"]])
+    phone = _clean(frame[columns["phone"]])
+
+    # Format phone number - keep digits only (numeric cells may come back as "9190...0.0")
+    # and add a + prefix when the number is long enough to carry a country code
+    phone_clean = phone.str.replace(r"\.0$", "", regex=True).str.replace(r"\D", "", regex=True)
+    phone = phone.where(phone_clean == "", phone_clean)
+    phone = phone.where(phone_clean.str.len() < 10, "+" + phone_clean)
+
+    normalized = pd.DataFrame({"name": name, "email": email, "phone": phone})
+
+    # Skip rows with empty required fields
+    valid = (normalized["name"] != "") & (normalized["email"] != "") & (normalized["phone"] != "")
+    skipped = int((~valid).sum())
+    if skipped:
+        logger.warning(f"Skipping {skipped} rows with missing name, email or phone")
+
+    return normalized[valid]
+
+
+def iter_user_chunks(file_path: str, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[List[User]]:
+    """
+    Stream a lead file and yield lists of at most chunk_size User objects,
+    so memory use doesn't grow with the size of the file
+    """
+    columns = None
+    for frame in iter_frames(file_path, chunk_size):
+        if columns is None:
+            columns = detect_columns(list(frame.columns))
+        normalized = normalize_frame(frame, columns)
+        # Values are already clean strings, skip per-row validation and default factories
+        now = datetime.utcnow()
+        yield [
+            User.model_construct(name=name, email=email, phone=phone, created_at=now, updated_at=now)
+            for name, email, phone in zip(
+                normalized["name"].tolist(), normalized["email"].tolist(), normalized["phone"].tolist()
+            )
+        ]
+
+    if columns is None:
+        raise ValueError("File has no header row")
@@ -1,15 +1,29 @@
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional
 from loguru import logger
-from model.model import Call
 from bson import ObjectId
-from datetime import datetime
-from utils.vapi_client import VAPIClient
-from utils.analyst import analyze_transcript
+from utils.vapi_client import get_vapi_client
+from utils.analysis_pipeline import AnalysisRequest, enqueue_analysis
+from utils.call_events import publish_call_event
+from utils.call_status import advance_call_status
+from utils.job_queue import JobQueue, JobWorkerPool
+from utils.recording_store import archive_recording
+from utils.webhook_events import END_OF_CALL_REPORT
 import os
 
 # Environment variables
 CUSTOM_DOMAIN = os.getenv("BASE_URL", "https://your-domain.com")
 VAPI_STORAGE_DOMAIN = "https://storage.vapi.ai"
+# Transcript fallback to the VAPI API when the webhook artifact is truncated
+TRANSCRIPT_FETCH_ATTEMPTS = int(os.getenv("TRANSCRIPT_FETCH_ATTEMPTS", "3"))
+TRANSCRIPT_FETCH_BACKOFF = float(os.getenv("TRANSCRIPT_FETCH_BACKOFF", "1"))  # seconds, doubled per retry
+
+# Completion webhooks are processed by a bounded worker pool off a durable queue
+COMPLETION_CONCURRENCY = int(os.getenv("COMPLETION_CONCURRENCY", "4"))
+COMPLETION_MAX_ATTEMPTS = int(os.getenv("COMPLETION_MAX_ATTEMPTS", "5"))
+
+# Where completion transcripts came from since startup
+transcript_sources = {"webhook": 0, "api": 0, "webhook_fallback": 0, "none": 0}
 
 def replace_vapi_domain_with_custom(url: str) -> str:
     """
@@ -26,6 +40,53 @@ def replace_vapi_domain_with_custom(url: str) -> str:
     return url
 
 
+def vapi_storage_path(url: Optional[str]) -> Optional[str]:
+    """Path of a VAPI storage URL, the key /media and the recording store use"""
+    if not url or not url.startswith(VAPI_STORAGE_DOMAIN):
+        return None
+    return url[len(VAPI_STORAGE_DOMAIN):].lstrip("/")
+
+
+def artifact_is_complete(
+    message_data: Dict[str, Any], call_info: Dict[str, Any], transcript: str
+) -> bool:
+    """
+    The webhook artifact is final once the call has an endedReason and the
+    transcript is there and reaches the last spoken message
+    """
+    ended_reason = message_data.get("endedReason") or call_info.get("endedReason")
+    if not ended_reason or not transcript:
+        return False
+
+    messages = message_data.get("artifact", {}).get("messages") or []
+    spoken = [
+        message.get("message", "")
+        for message in messages
+        if message.get("role") in ("user", "bot", "assistant") and message.get("message")
+    ]
+    if spoken and spoken[-1].strip() not in transcript:
+        return False
+
+    return True
+
+
+async def fetch_transcript(vapi_call_id: str) -> Optional[str]:
+    """Get the transcript from the VAPI API, retrying with backoff"""
+    vapi_client = get_vapi_client()
+    for attempt in range(1, TRANSCRIPT_FETCH_ATTEMPTS + 1):
+        transcript = await vapi_client.get_call_transcript(vapi_call_id)
+        if transcript:
+            return transcript
+        if attempt < TRANSCRIPT_FETCH_ATTEMPTS:
+            delay = TRANSCRIPT_FETCH_BACKOFF * 2 ** (attempt - 1)
+            logger.warning(
+                f"⚠️ Transcript fetch {attempt}/{TRANSCRIPT_FETCH_ATTEMPTS} for {vapi_call_id} "
+                f"came back empty, retrying in {delay}s"
+            )
+            await asyncio.sleep(delay)
+    return None
+
+
 async def handle_call_completion(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
     """Process call completion webhook data with transcript retrieval and Gemini analysis"""
     try:
@@ -39,6 +100,7 @@ async def handle_call_completion(webhook_data: Dict[str, Any]) -> Dict[str, Any]
         
         # Extract essential artifact information
         stereo_recording_url = artifact_data.get("stereoRecordingUrl")
+        recording_path = vapi_storage_path(stereo_recording_url)
         
         # Replace VAPI domain with custom domain
         if stereo_recording_url:
@@ -65,15 +127,6 @@ async def handle_call_completion(webhook_data: Dict[str, Any]) -> Dict[str, Any]
 
         logger.info(f"🎯 Processing call completion for VAPI call: {vapi_call_id}")
 
-        call_record = await Call.find_one({"vapi_call_id": vapi_call_id})
-
-        if not call_record:
-            logger.error(f"❌ No call found with VAPI ID: {vapi_call_id}")
-            return {"status": "error", "message": "Call not found"}
-
-        logger.info(f"✅ Found call record: {call_record.id}")
-        call_id = str(call_record.id)
-
         # Extract call details from webhook - check multiple locations
         status = (
             call_info.get("status", "unknown")
@@ -94,7 +147,6 @@ async def handle_call_completion(webhook_data: Dict[str, Any]) -> Dict[str, Any]
 
         logger.info(f"📝 Webhook transcript length: {len(webhook_transcript)}")
 
-        vapi_client = VAPIClient()
         # Process all calls (including end-of-call-report with unknown status)
         # For end-of-call-report events, we should process regardless of status
         should_process = status in ["completed", "ended"] or status == "unknown"
@@ -102,31 +154,32 @@ async def handle_call_completion(webhook_data: Dict[str, Any]) -> Dict[str, Any]
         if should_process:
             logger.info(f"✅ Processing call with status: {status}")
 
-            # Step 1: Retrieve full transcript from VAPI API
+            # Step 1: Use the webhook transcript when it is final, the VAPI API otherwise
+            if artifact_is_complete(message_data, call_info, webhook_transcript):
+                final_transcript = webhook_transcript
+                transcript_source = "webhook"
+            else:
+                logger.info(
+                    f"📜 Webhook transcript incomplete, retrieving it from VAPI API for call: {vapi_call_id}"
+                )
+                full_transcript = await fetch_transcript(vapi_call_id)
+                if full_transcript and len(full_transcript) > len(webhook_transcript):
+                    final_transcript = full_transcript
+                    transcript_source = "api"
+                elif webhook_transcript:
+                    final_transcript = webhook_transcript
+                    transcript_source = "webhook_fallback"
+                else:
+                    final_transcript = ""
+                    transcript_source = "none"
+
+            transcript_sources[transcript_source] += 1
             logger.info(
-                f"📜 Retrieving full transcript from VAPI API for call: {vapi_call_id}"
-            )
-
-            try:
-                full_transcript = await vapi_client.get_call_transcript(vapi_call_id)
-                logger.info(f"📜 VAPI API transcript retrieval completed")
-            except Exception as e:
-                logger.error(f"❌ Error retrieving transcript from VAPI API: {e}")
-                full_transcript = None
-            # Use the more complete transcript (API vs webhook)
-            final_transcript = (
-                full_transcript
-                if full_transcript and len(full_transcript) > len(webhook_transcript)
-                else webhook_transcript
+                f"📝 Transcript source for {vapi_call_id}: {transcript_source} ({len(final_transcript)} chars)"
             )
-            logger.info(f"📝 Final transcript length: {final_transcript}")
             if not final_transcript:
                 logger.warning(f"⚠️ No transcript available for call {vapi_call_id}")
                 final_transcript = "No transcript available"
-            else:
-                logger.info(
-                    f"✅ Retrieved transcript with {len(final_transcript)} characters"
-                )
 
             # Extract analysis data from webhook if available
             analysis_data = (
@@ -136,45 +189,52 @@ async def handle_call_completion(webhook_data: Dict[str, Any]) -> Dict[str, Any]
             webhook_summary = analysis_data.get("summary", "")
             success_evaluation = analysis_data.get("successEvaluation", "")
 
-            # Step 3: Analyze transcript with Gemini if available
-            logger.info(f"📋 Analyzing transcript with Gemini for call: {vapi_call_id}")
-            try:
-                analyst_result = analyze_transcript(final_transcript)
-                logger.info(f"📋 Analyst result: {analyst_result}")
-            except Exception as e:
-                logger.error(f"❌ Error analyzing transcript: {e}")
-                # Create a default result if analysis fails
-                from utils.analyst import AnalysisResult
-
-                analyst_result = AnalysisResult(
-                    summary="Analysis failed",
-                    quality_score=0.0,
-                    customer_intent="unknown",
-                )
-
-            # Use webhook analysis if available, otherwise use Gemini analysis
-            final_summary = (
-                webhook_summary if webhook_summary else analyst_result.summary
-            )
-            final_quality_score = analyst_result.quality_score
-            final_customer_intent = analyst_result.customer_intent
-
             update_data = {
-                "status": "completed",
                 "call_result": {
-                    "summary": final_summary,
-                    "quality_score": final_quality_score,
-                    "customer_intent": final_customer_intent,
+                    "summary": webhook_summary or None,
                     "transcript": final_transcript,
+                    "transcript_source": transcript_source,
                     "recording_url": stereo_recording_url,
                 },
-                "updated_at": datetime.utcnow(),
             }
 
             logger.info(f"💾 Updating call record with data: {update_data}")
             try:
-                await call_record.update({"$set": update_data})
+                # One guarded round trip, a completed call can be re-completed (merge)
+                # but never regresses
+                previous, outcome = await advance_call_status(
+                    vapi_call_id, "completed", update_data
+                )
+                if outcome == "not_found":
+                    logger.error(f"❌ No call found with VAPI ID: {vapi_call_id}")
+                    return {"status": "error", "message": "Call not found"}
+                if outcome == "stale":
+                    return {
+                        "status": "skipped",
+                        "message": f"Call is already {previous.get('status')}",
+                    }
+
+                call_id = str(previous["_id"])
                 logger.info(f"✅ Call result updated successfully: {call_id}")
+                publish_call_event(
+                    call_id, previous["batch_id"], "completed", vapi_call_id=vapi_call_id
+                )
+                if recording_path:
+                    # Prefetch the recording so playback doesn't wait on VAPI storage
+                    archive_recording(
+                        recording_path,
+                        f"{VAPI_STORAGE_DOMAIN}/{recording_path}",
+                        {"Referer": f"{VAPI_STORAGE_DOMAIN}/"},
+                    )
+
+                # Step 3: Hand the transcript to the analysis workers as a durable job
+                await enqueue_analysis(
+                    AnalysisRequest(
+                        call_id=call_id,
+                        transcript=final_transcript,
+                        summary=webhook_summary or None,
+                    )
+                )
                 
                 # Final success summary
                 logger.info(f"🎉 Call processing complete - ID: {call_id}, Stereo: {stereo_recording_url}")
@@ -222,18 +282,72 @@ async def handle_call_started(webhook_data: Dict[str, Any]) -> Dict[str, Any]:
 
         logger.info(f"📞 Call started: {vapi_call_id}")
 
-        call_record = await Call.find_one({"vapi_call_id": vapi_call_id})
+        # A late call.started must not pull a finished call back to in_progress
+        previous, outcome = await advance_call_status(vapi_call_id, "in_progress")
 
-        if call_record:
-            await call_record.update(
-                {"$set": {"status": "in_progress", "updated_at": datetime.utcnow()}}
+        if outcome == "updated":
+            publish_call_event(
+                previous["_id"], previous["batch_id"], "in_progress", vapi_call_id=vapi_call_id
             )
             logger.info(f"✅ Updated call {vapi_call_id} to in_progress")
-        else:
+        elif outcome == "not_found":
             logger.warning(f"⚠️ Call not found for VAPI ID: {vapi_call_id}")
 
-        return {"status": "success", "vapi_call_id": vapi_call_id}
+        return {"status": "success", "vapi_call_id": vapi_call_id, "outcome": outcome}
 
     except Exception as e:
         logger.error(f"Error handling call started: {e}")
         return {"status": "error", "message": str(e)}
+
+
+COMPLETION_QUEUE = "completion"
+
+# Completion jobs are keyed on the VAPI call ID, a later richer webhook for the
+# same call replaces the payload of a job that hasn't run yet
+completion_queue = JobQueue(COMPLETION_QUEUE, max_attempts=COMPLETION_MAX_ATTEMPTS)
+completion_workers: Optional[JobWorkerPool] = None
+
+
+async def enqueue_completion(vapi_call_id: str, webhook_data: Dict[str, Any]) -> int:
+    """Persist a completion webhook for the workers, survives restarts and deploys"""
+    return await completion_queue.enqueue(vapi_call_id, webhook_data)
+
+
+async def merge_completion(vapi_call_id: str, webhook_data: Dict[str, Any]) -> str:
+    """
+    Hand a late end-of-call-report to the workers without resetting the call's
+    completion job. A job still queued just takes the report as its payload;
+    one already leased or done keeps its state and the report gets a
+    follow-up job of its own. Returns "merged" or "follow_up".
+    """
+    if await completion_queue.update_payload(vapi_call_id, webhook_data):
+        return "merged"
+    await completion_queue.enqueue(f"{vapi_call_id}:{END_OF_CALL_REPORT}", webhook_data)
+    return "follow_up"
+
+
+async def handle_completion_job(job: Dict[str, Any]):
+    """Process a leased completion job, raising so the queue retries or dead-letters it"""
+    result = await handle_call_completion(job["payload"])
+    if result.get("status") == "error":
+        raise RuntimeError(result.get("message") or "Call completion failed")
+
+
+def start_completion_workers() -> JobWorkerPool:
+    """Start the completion workers, call on application startup"""
+    global completion_workers
+
+    completion_workers = JobWorkerPool(
+        completion_queue, handle_completion_job, COMPLETION_CONCURRENCY
+    )
+    completion_workers.start()
+    return completion_workers
+
+
+async def stop_completion_workers():
+    """Stop the completion workers, unacked jobs are picked up again after a restart"""
+    global completion_workers
+
+    if completion_workers:
+        await completion_workers.stop()
+        completion_workers = None
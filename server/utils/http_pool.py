@@ -0,0 +1,224 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+from loguru import logger
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Pool tuning
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # seconds
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))  # seconds waiting for a slot
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))  # seconds
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+# Recording downloads get their own pool, a long playback holds its connection
+# for minutes and must never starve VAPI and webhook requests
+MEDIA_HTTP_MAX_CONNECTIONS = int(os.getenv("MEDIA_HTTP_MAX_CONNECTIONS", "20"))
+MEDIA_HTTP_TIMEOUT = float(os.getenv("MEDIA_HTTP_TIMEOUT", "60"))  # seconds
+
+try:
+    import h2  # noqa: F401 - httpx needs it for HTTP/2
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class PoolMetrics:
+    """Counters describing how the shared pool is used"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_request_seconds = 0.0
+
+
+class PooledHTTPClient:
+    """
+    Application scoped httpx client with keep-alive, HTTP/2 and bounded
+    connections. Every outbound request should go through one instance so
+    connections (and their TLS handshakes) are reused.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        pool_timeout: float = HTTP_POOL_TIMEOUT,
+        timeout: float = HTTP_TIMEOUT,
+        http2: bool = HTTP2_ENABLED,
+    ):
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("⚠️ HTTP/2 requested but 'h2' is not installed, using HTTP/1.1")
+            http2 = False
+
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, pool=pool_timeout),
+        )
+        # Mirrors the connection limit so we can measure time spent waiting for the pool
+        self._slots = asyncio.Semaphore(max_connections)
+        self.stats = PoolMetrics()
+
+    async def _acquire_slot(self):
+        started = time.monotonic()
+        await asyncio.wait_for(self._slots.acquire(), timeout=self.pool_timeout)
+        waited = time.monotonic() - started
+        self.stats.total_wait_seconds += waited
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+        self.stats.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+
+    def _release_slot(self):
+        self.stats.in_flight -= 1
+        self._slots.release()
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request over the shared pool and record its metrics"""
+        await self._acquire_slot()
+        started = time.monotonic()
+        try:
+            return await self.client.request(method, url, **kwargs)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.requests += 1
+            self.stats.total_request_seconds += time.monotonic() - started
+            self._release_slot()
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Send a request and hand back the response before its body is read.
+        The pool slot is held until the body is consumed and the context exits,
+        so long lived streams belong on the media client.
+        """
+        await self._acquire_slot()
+        started = time.monotonic()
+        try:
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.requests += 1
+            self.stats.total_request_seconds += time.monotonic() - started
+            self._release_slot()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def _connection_counts(self) -> Dict[str, Optional[int]]:
+        # httpx keeps its pool private, read it defensively
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {"open_connections": None, "idle_connections": None}
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"open_connections": len(connections), "idle_connections": idle}
+
+    def metrics(self) -> Dict[str, Any]:
+        stats = self.stats
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "in_use": stats.in_flight,
+            "max_in_use": stats.max_in_flight,
+            **self._connection_counts(),
+            "requests": stats.requests,
+            "errors": stats.errors,
+            "avg_wait_ms": (
+                round(stats.total_wait_seconds / stats.requests * 1000, 2)
+                if stats.requests
+                else 0.0
+            ),
+            "max_wait_ms": round(stats.max_wait_seconds * 1000, 2),
+            "avg_request_ms": (
+                round(stats.total_request_seconds / stats.requests * 1000, 2)
+                if stats.requests
+                else 0.0
+            ),
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# Global pooled clients, created on startup and closed on shutdown
+http_client: Optional[PooledHTTPClient] = None
+media_http_client: Optional[PooledHTTPClient] = None
+
+
+def start_http_client() -> PooledHTTPClient:
+    """Create the shared pooled HTTP clients, should be called on application startup"""
+    global http_client, media_http_client
+
+    http_client = PooledHTTPClient()
+    media_http_client = PooledHTTPClient(
+        max_connections=MEDIA_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=MEDIA_HTTP_MAX_CONNECTIONS,
+        timeout=MEDIA_HTTP_TIMEOUT,
+    )
+    logger.info(
+        f"🟢 HTTP pool ready: max_connections={HTTP_MAX_CONNECTIONS}, http2={http_client.http2}, "
+        f"media max_connections={MEDIA_HTTP_MAX_CONNECTIONS}"
+    )
+    return http_client
+
+
+async def close_http_client():
+    """Close the shared pooled HTTP clients, should be called on application shutdown"""
+    global http_client, media_http_client
+
+    if http_client:
+        logger.info("🔴 Closing HTTP pool...")
+        await http_client.close()
+        http_client = None
+    if media_http_client:
+        await media_http_client.close()
+        media_http_client = None
+
+
+def get_http_client() -> PooledHTTPClient:
+    """Get the shared pooled HTTP client"""
+    global http_client
+
+    if not http_client:
+        raise RuntimeError("HTTP client not started. Call start_http_client() first.")
+
+    return http_client
+
+
+def get_media_http_client() -> PooledHTTPClient:
+    """Get the pooled HTTP client reserved for recording downloads and streams"""
+    global media_http_client
+
+    if not media_http_client:
+        raise RuntimeError("HTTP client not started. Call start_http_client() first.")
+
+    return media_http_client
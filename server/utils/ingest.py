@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from loguru import logger
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from model.model import Batch, Call, CallStatus
+from utils.call_status import reset_batch_counters
+from utils.dialer import enqueue_calls
+from utils.document import iter_user_chunks
+
+# Upload limits
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Dial jobs handed to the queue per bulk write once a batch is fully ingested
+INGEST_ENQUEUE_CHUNK = int(os.getenv("INGEST_ENQUEUE_CHUNK", "5000"))
+# An ingest silent for this long died with its process (restart, crash, deploy)
+INGEST_STALE_AFTER = int(os.getenv("INGEST_STALE_AFTER", "600"))  # seconds
+
+# Background task failing stale ingests, see start_ingest_sweeper
+ingest_sweeper: Optional[asyncio.Task] = None
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload goes over MAX_UPLOAD_BYTES"""
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload is not a multipart body with a usable lead file"""
+
+
+def _multipart_boundary(content_type: str) -> bytes:
+    """Boundary of a multipart/form-data content type"""
+    media_type, params = parse_options_header(content_type)
+    if media_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise UploadRejected("Upload must be multipart/form-data")
+    return params[b"boundary"]
+
+
+async def save_upload(
+    request: Request,
+    upload_dir: str,
+    extensions: Tuple[str, ...],
+    field_name: str = "file",
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> Tuple[str, str, int, str]:
+    """
+    Stream a multipart upload straight from the request body to disk. The
+    body is fed through a multipart parser as it arrives, the file part is
+    written and hashed on the fly and the upload is aborted as soon as it
+    goes over max_bytes, so nothing is spooled first.
+    Returns (original filename, saved path, size in bytes, sha256 hex digest)
+    """
+    boundary = _multipart_boundary(request.headers.get("content-type", ""))
+
+    # Parser callbacks are sync, they only collect state for the loop below
+    part: Dict[str, Any] = {"headers": {}, "name": b"", "value": b""}
+    upload: Dict[str, Any] = {"filename": None, "reading": False, "done": False}
+    pending = bytearray()
+
+    def on_part_begin():
+        part["headers"] = {}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part["name"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["name"].lower()] = part["value"]
+        part["name"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        if upload["filename"] is None and options.get(b"name") == field_name.encode():
+            upload["filename"] = options.get(b"filename", b"").decode("utf-8", "replace")
+            upload["reading"] = True
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if upload["reading"]:
+            pending.extend(data[start:end])
+
+    def on_part_end():
+        if upload["reading"]:
+            upload["reading"] = False
+            upload["done"] = True
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    digest = hashlib.sha256()
+    size = 0
+    file_path = None
+    f = None
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise UploadRejected(f"Malformed multipart upload: {e}")
+
+            if upload["filename"] is not None and f is None:
+                filename = upload["filename"]
+                if not filename.lower().endswith(extensions):
+                    raise UploadRejected(
+                        f"Only lead files ({', '.join(extensions)}) are allowed"
+                    )
+                # Unique name on disk so concurrent uploads never clash
+                extension = os.path.splitext(filename)[1]
+                file_path = os.path.join(upload_dir, f"{uuid.uuid4()}{extension}")
+                f = open(file_path, "wb")
+
+            if pending:
+                size += len(pending)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File is larger than the {max_bytes} byte upload limit")
+                digest.update(pending)
+                await run_in_threadpool(f.write, bytes(pending))
+                pending.clear()
+
+            if upload["done"]:
+                break
+
+        if not upload["done"]:
+            raise UploadRejected(f"Upload has no complete '{field_name}' file part")
+    except BaseException:
+        if f is not None:
+            f.close()
+            os.remove(file_path)
+        raise
+
+    f.close()
+    return upload["filename"], file_path, size, digest.hexdigest()
+
+
+async def enqueue_batch_calls(batch_id: str, assistant_id: str, call_ids: List[Any]) -> int:
+    """Enqueue dial jobs for the inserted call ids of a batch, INGEST_ENQUEUE_CHUNK at a time"""
+    enqueued = 0
+    for start in range(0, len(call_ids), INGEST_ENQUEUE_CHUNK):
+        chunk = [str(call_id) for call_id in call_ids[start:start + INGEST_ENQUEUE_CHUNK]]
+        enqueued += await enqueue_calls(chunk, batch_id, assistant_id)
+    return enqueued
+
+
+async def discard_batch_calls(batch: Batch):
+    """
+    Remove a failed ingest's calls and zero its counters. Dial jobs already
+    enqueued for them are skipped by handle_dial_job once the call is gone.
+    """
+    batch_id = str(batch.id)
+    result = await Call.get_motor_collection().delete_many({"batch_id": batch_id})
+    await reset_batch_counters(batch_id, {})
+    logger.warning(f"🗑️ Batch {batch_id}: discarded {result.deleted_count} calls of a failed ingest")
+
+
+async def ingest_lead_file(batch: Batch, file_path: str, assistant_id: str) -> Dict[str, Any]:
+    """
+    Parse a lead file chunk by chunk and insert each chunk of calls with one
+    unordered bulk write, recording progress on the batch as chunks land.
+    Dial jobs are only enqueued once the whole file is in; if anything fails
+    the batch's calls are discarded, so a failed upload never dials anyone.
+    """
+    batch_id = str(batch.id)
+    total_calls = 0
+    chunks = 0
+    call_ids: List[Any] = []
+
+    try:
+        # Parsing is CPU bound, keep it off the event loop
+        async for users in iterate_in_threadpool(iter_user_chunks(file_path)):
+            if not users:
+                continue
+
+            calls = [
+                Call(batch_id=batch_id, status=CallStatus.PENDING, user=user)
+                for user in users
+            ]
+            result = await Call.insert_many(calls, ordered=False)
+            inserted = len(result.inserted_ids)
+            call_ids.extend(result.inserted_ids)
+
+            chunks += 1
+            total_calls += inserted
+            await batch.update(
+                {
+                    "$inc": {"total_calls": inserted, "status_counts.pending": inserted},
+                    "$set": {"ingest_updated_at": datetime.utcnow()},
+                }
+            )
+            logger.info(f"📥 Batch {batch_id}: chunk {chunks} inserted, {total_calls} calls so far")
+
+        await enqueue_batch_calls(batch_id, assistant_id, call_ids)
+
+    except Exception:
+        await batch.update({"$set": {"ingest_status": "failed"}})
+        await discard_batch_calls(batch)
+        raise
+
+    result = await Batch.get_motor_collection().update_one(
+        {"_id": batch.id, "ingest_status": "ingesting"},
+        {"$set": {"ingest_status": "ready", "ingest_updated_at": datetime.utcnow()}},
+    )
+    if not result.modified_count:
+        raise RuntimeError(f"Batch {batch_id} was swept as a stale ingest before it finished")
+    logger.success(f"✅ Batch {batch_id}: ingested {total_calls} calls in {chunks} chunks")
+    return {"total_calls": total_calls, "chunks": chunks}
+
+
+async def sweep_stale_ingests() -> int:
+    """
+    Fail the batches left ingesting by a process that died mid-upload and
+    discard their calls. Their lead file is only partly parsed and the
+    upload is gone with the request, so the batch can't be finished; it is
+    failed like any other broken upload and can be uploaded again.
+    Returns how many batches were swept.
+    """
+    collection = Batch.get_motor_collection()
+    cutoff = datetime.utcnow() - timedelta(seconds=INGEST_STALE_AFTER)
+    swept = 0
+    async for doc in collection.find(
+        {"ingest_status": "ingesting", "ingest_updated_at": {"$not": {"$gte": cutoff}}},
+        {"ingest_updated_at": 1, "url": 1},
+    ):
+        # Guard on the heartbeat read, an ingest that is still alive has moved it on
+        result = await collection.update_one(
+            {
+                "_id": doc["_id"],
+                "ingest_status": "ingesting",
+                "ingest_updated_at": doc.get("ingest_updated_at"),
+            },
+            {"$set": {"ingest_status": "failed", "ingest_updated_at": datetime.utcnow()}},
+        )
+        if not result.modified_count:
+            continue
+
+        await discard_batch_calls(await Batch.get(doc["_id"]))
+        if doc.get("url") and os.path.exists(doc["url"]):
+            os.remove(doc["url"])
+        swept += 1
+        logger.warning(f"🧹 Batch {doc['_id']}: stale ingest failed and cleaned up")
+
+    return swept
+
+
+async def _sweep_loop():
+    while True:
+        try:
+            await sweep_stale_ingests()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Stale ingest sweep failed: {e}")
+        await asyncio.sleep(INGEST_STALE_AFTER)
+
+
+def start_ingest_sweeper():
+    """
+    Sweep stale ingests now and every INGEST_STALE_AFTER seconds, so a batch
+    whose process died just before this one started is caught too
+    """
+    global ingest_sweeper
+
+    ingest_sweeper = asyncio.create_task(_sweep_loop())
+    logger.info(f"🟢 Stale ingest sweeper ready: every {INGEST_STALE_AFTER}s")
+
+
+async def stop_ingest_sweeper():
+    """Stop the stale ingest sweeper"""
+    global ingest_sweeper
+
+    if ingest_sweeper:
+        ingest_sweeper.cancel()
+        await asyncio.gather(ingest_sweeper, return_exceptions=True)
+        ingest_sweeper = None
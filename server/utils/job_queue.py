@@ -0,0 +1,298 @@
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+from pymongo import ReturnDocument, UpdateOne
+
+from model.model import Job, JobStatus
+
+# Default queue tuning
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "120"))  # seconds
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # seconds
+# Idle workers double their poll interval up to this, so an empty queue doesn't tie up the pool
+JOB_IDLE_POLL_MAX = float(os.getenv("JOB_IDLE_POLL_MAX", "15.0"))  # seconds
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5.0"))  # seconds, doubled per attempt
+
+
+class JobQueue:
+    """
+    Mongo backed work queue with lease/ack semantics.
+    A leased job that isn't acked before its visibility timeout becomes
+    available again, so work survives worker crashes and restarts.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        visibility_timeout: int = JOB_VISIBILITY_TIMEOUT,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        retry_backoff: float = JOB_RETRY_BACKOFF,
+    ):
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._wakeup = asyncio.Event()
+
+    def _collection(self):
+        return Job.get_motor_collection()
+
+    async def enqueue_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Enqueue (key, payload) pairs. Re-enqueueing an existing key resets it
+        to queued, so enqueueing is idempotent per key.
+        """
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"queue": self.name, "key": key},
+                {
+                    "$set": {
+                        "payload": payload,
+                        "status": JobStatus.QUEUED.value,
+                        "attempts": 0,
+                        "max_attempts": self.max_attempts,
+                        "available_at": now,
+                        "lease_token": None,
+                        "lease_expires_at": None,
+                        "last_error": None,
+                        "updated_at": now,
+                    },
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for key, payload in items
+        ]
+        if not operations:
+            return 0
+
+        await self._collection().bulk_write(operations, ordered=False)
+        self.wake()
+        logger.info(f"📥 Enqueued {len(operations)} jobs on queue '{self.name}'")
+        return len(operations)
+
+    async def enqueue(self, key: str, payload: Dict[str, Any]) -> int:
+        return await self.enqueue_many([(key, payload)])
+
+    async def update_payload(self, key: str, payload: Dict[str, Any]) -> bool:
+        """
+        Replace the payload of a job that is still waiting to run. False if the
+        job is leased, done, dead or missing; those are left as they are.
+        """
+        result = await self._collection().update_one(
+            {"queue": self.name, "key": key, "status": JobStatus.QUEUED.value},
+            {"$set": {"payload": payload, "updated_at": datetime.utcnow()}},
+        )
+        return result.modified_count == 1
+
+    async def existing_keys(self, keys: Iterable[str]) -> Set[str]:
+        """Keys that already have a job on this queue, whatever its status"""
+        keys = list(keys)
+        if not keys:
+            return set()
+        cursor = self._collection().find({"queue": self.name, "key": {"$in": keys}}, {"key": 1})
+        return {job["key"] async for job in cursor}
+
+    async def lease(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the next available job, or None if the queue is empty"""
+        now = datetime.utcnow()
+        return await self._collection().find_one_and_update(
+            {
+                "queue": self.name,
+                "$or": [
+                    {"status": JobStatus.QUEUED.value, "available_at": {"$lte": now}},
+                    # Lease expired without an ack, the worker is gone
+                    {"status": JobStatus.LEASED.value, "lease_expires_at": {"$lte": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": JobStatus.LEASED.value,
+                    "lease_token": uuid.uuid4().hex,
+                    "lease_expires_at": now + timedelta(seconds=self.visibility_timeout),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def ack(self, job: Dict[str, Any]) -> bool:
+        """Mark a leased job as done, False if the lease was lost meanwhile"""
+        result = await self._collection().update_one(
+            {"_id": job["_id"], "lease_token": job["lease_token"]},
+            {
+                "$set": {
+                    "status": JobStatus.DONE.value,
+                    "lease_token": None,
+                    "lease_expires_at": None,
+                    "updated_at": datetime.utcnow(),
+                }
+            },
+        )
+        return result.modified_count == 1
+
+    async def nack(self, job: Dict[str, Any], error: str) -> str:
+        """Release a failed job for a later retry, or dead-letter it when out of attempts"""
+        now = datetime.utcnow()
+        if job["attempts"] >= job.get("max_attempts", self.max_attempts):
+            status = JobStatus.DEAD.value
+            available_at = now
+        else:
+            status = JobStatus.QUEUED.value
+            available_at = now + timedelta(
+                seconds=self.retry_backoff * 2 ** (job["attempts"] - 1)
+            )
+
+        await self._collection().update_one(
+            {"_id": job["_id"], "lease_token": job["lease_token"]},
+            {
+                "$set": {
+                    "status": status,
+                    "available_at": available_at,
+                    "lease_token": None,
+                    "lease_expires_at": None,
+                    "last_error": error,
+                    "updated_at": now,
+                }
+            },
+        )
+        return status
+
+    async def defer(self, job: Dict[str, Any], delay: float):
+        """Put a leased job back for later, its attempt isn't counted"""
+        now = datetime.utcnow()
+        await self._collection().update_one(
+            {"_id": job["_id"], "lease_token": job["lease_token"]},
+            {
+                "$set": {
+                    "status": JobStatus.QUEUED.value,
+                    "available_at": now + timedelta(seconds=delay),
+                    "lease_token": None,
+                    "lease_expires_at": None,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": -1},
+            },
+        )
+
+    async def counts(self) -> Dict[str, int]:
+        """Number of jobs per status on this queue"""
+        pipeline = [
+            {"$match": {"queue": self.name}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]
+        counts = {status.value: 0 for status in JobStatus}
+        async for row in self._collection().aggregate(pipeline):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    def wake(self):
+        """Wake the workers waiting on this queue in this process"""
+        self._wakeup.set()
+
+    async def wait_for_work(self, timeout: float) -> bool:
+        """
+        Sleep until something is enqueued in this process or the timeout
+        passes. True if woken up before the timeout.
+        """
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            woken = True
+        except asyncio.TimeoutError:
+            woken = False
+        self._wakeup.clear()
+        return woken
+
+
+class JobDeferred(Exception):
+    """Raised by a handler that can't run its job yet, it is put back without using an attempt"""
+
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason or f"Deferred for {delay}s")
+        self.delay = delay
+
+
+class JobWorkerPool:
+    """Runs `concurrency` worker coroutines that lease jobs and pass them to a handler"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        concurrency: int,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        idle_poll_max: float = JOB_IDLE_POLL_MAX,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.idle_poll_max = max(idle_poll_max, poll_interval)
+        self.workers: List[asyncio.Task] = []
+
+    def start(self):
+        for index in range(self.concurrency):
+            self.workers.append(asyncio.create_task(self._run(index)))
+        logger.info(
+            f"🟢 Started {self.concurrency} workers on queue '{self.queue.name}'"
+        )
+
+    async def stop(self):
+        """Cancel the workers, any job they held is retried once its lease expires"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info(f"🔴 Stopped workers on queue '{self.queue.name}'")
+
+    async def _run(self, index: int):
+        idle_wait = self.poll_interval
+        while True:
+            try:
+                job = await self.queue.lease()
+            except Exception as e:
+                logger.error(f"❌ [{self.queue.name}#{index}] Lease failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if not job:
+                # Back off while the queue stays empty, jittered so idle workers
+                # don't poll in lockstep; a local enqueue wakes them right away
+                woken = await self.queue.wait_for_work(idle_wait * random.uniform(0.5, 1.0))
+                idle_wait = self.poll_interval if woken else min(idle_wait * 2, self.idle_poll_max)
+                continue
+
+            if idle_wait > self.poll_interval:
+                # Work showed up while backing off (another instance, or a retry
+                # coming due), wake the other idle workers to help
+                idle_wait = self.poll_interval
+                self.queue.wake()
+
+            try:
+                await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except JobDeferred as e:
+                await self.queue.defer(job, e.delay)
+                logger.info(f"⏳ [{self.queue.name}#{index}] Job {job['key']} deferred: {e}")
+                continue
+            except Exception as e:
+                status = await self.queue.nack(job, str(e))
+                logger.error(
+                    f"❌ [{self.queue.name}#{index}] Job {job['key']} failed "
+                    f"(attempt {job['attempts']}, now {status}): {e}"
+                )
+                continue
+
+            if not await self.queue.ack(job):
+                logger.warning(
+                    f"⚠️ [{self.queue.name}#{index}] Lease lost before ack for job {job['key']}"
+                )
@@ -0,0 +1,387 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from email.utils import formatdate
+from typing import Any, Dict, Optional, Set
+
+import httpx
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from loguru import logger
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from utils.http_pool import get_media_http_client
+
+# Disk cache of proxied recordings
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Seconds a cached file is served without asking the origin, unless it sends its own max-age
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "86400"))
+MEDIA_CACHE_FILL_CONCURRENCY = int(os.getenv("MEDIA_CACHE_FILL_CONCURRENCY", "2"))
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(64 * 1024)))
+
+# Origin response headers passed through to the browser
+FORWARDED_HEADERS = (
+    "content-type",
+    "content-length",
+    "content-range",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+    "cache-control",
+)
+
+
+def _max_age(cache_control: Optional[str], default: int) -> Optional[int]:
+    """max-age of a Cache-Control header, None when the response mustn't be stored"""
+    if not cache_control:
+        return default
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else default
+
+
+class MediaEntry(BaseModel):
+    """A recording on local disk plus the validators needed to revalidate it"""
+
+    path: str
+    file_path: str
+    size: int
+    content_type: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float
+    max_age: int
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.fetched_at + self.max_age
+
+
+class MediaCache:
+    """
+    Size bounded LRU of recordings on local disk, keyed by storage path.
+    Each file has a JSON sidecar with its validators so the index survives
+    restarts; entries past their max-age are revalidated with a conditional GET.
+    """
+
+    def __init__(
+        self,
+        directory: str = MEDIA_CACHE_DIR,
+        max_bytes: int = MEDIA_CACHE_MAX_BYTES,
+        max_age: int = MEDIA_CACHE_MAX_AGE,
+        fill_concurrency: int = MEDIA_CACHE_FILL_CONCURRENCY,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.entries: "OrderedDict[str, MediaEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.fill_slots = asyncio.Semaphore(fill_concurrency)
+        self.filling: Set[str] = set()
+        self.fill_tasks: Set[asyncio.Task] = set()
+        self.stats = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "passthrough": 0,
+            "stored": 0,
+            "evicted": 0,
+        }
+
+    def key(self, path: str) -> str:
+        return hashlib.sha256(path.encode()).hexdigest()
+
+    def _file_path(self, path: str) -> str:
+        return os.path.join(self.directory, self.key(path))
+
+    def load(self):
+        """Rebuild the index from the sidecars on disk, least recently used first"""
+        os.makedirs(self.directory, exist_ok=True)
+        loaded = []
+        for name in os.listdir(self.directory):
+            if name.startswith("tmp-"):
+                # Download interrupted by a restart
+                os.remove(os.path.join(self.directory, name))
+                continue
+            if not name.endswith(".json"):
+                continue
+            sidecar = os.path.join(self.directory, name)
+            try:
+                with open(sidecar) as f:
+                    entry = MediaEntry(**json.load(f))
+                loaded.append((os.path.getatime(entry.file_path), entry))
+            except Exception:
+                # Half written or orphaned, drop it
+                self._remove_files(sidecar[: -len(".json")])
+
+        for _, entry in sorted(loaded, key=lambda item: item[0]):
+            self.entries[entry.path] = entry
+            self.total_bytes += entry.size
+        self._evict()
+        logger.info(
+            f"🟢 Media cache ready: {len(self.entries)} files, {self.total_bytes} bytes in {self.directory}"
+        )
+
+    def get(self, path: str) -> Optional[MediaEntry]:
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.file_path):
+            self.discard(path)
+            return None
+        self.entries.move_to_end(path)
+        return entry
+
+    def temp_path(self) -> str:
+        return os.path.join(self.directory, f"tmp-{uuid.uuid4().hex}")
+
+    def _write_sidecar(self, entry: MediaEntry):
+        with open(f"{entry.file_path}.json", "w") as f:
+            f.write(entry.model_dump_json())
+
+    def commit(self, path: str, temp_file: str, headers: httpx.Headers) -> Optional[MediaEntry]:
+        """Move a completely downloaded body into the cache"""
+        max_age = _max_age(headers.get("cache-control"), self.max_age)
+        if max_age is None:
+            os.remove(temp_file)
+            return None
+
+        self.discard(path)
+        file_path = self._file_path(path)
+        os.replace(temp_file, file_path)
+        entry = MediaEntry(
+            path=path,
+            file_path=file_path,
+            size=os.path.getsize(file_path),
+            content_type=headers.get("content-type"),
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            fetched_at=time.time(),
+            max_age=max_age,
+        )
+        self._write_sidecar(entry)
+        self.entries[path] = entry
+        self.total_bytes += entry.size
+        self.stats["stored"] += 1
+        self._evict()
+        return entry
+
+    def refresh(self, entry: MediaEntry, headers: httpx.Headers):
+        """The origin answered 304, the cached file is good for another max-age"""
+        max_age = _max_age(headers.get("cache-control"), self.max_age)
+        entry.fetched_at = time.time()
+        entry.max_age = max_age or 0
+        entry.etag = headers.get("etag") or entry.etag
+        self._write_sidecar(entry)
+        self.stats["revalidated"] += 1
+
+    def discard(self, path: str):
+        entry = self.entries.pop(path, None)
+        if entry:
+            self.total_bytes -= entry.size
+            self._remove_files(entry.file_path)
+
+    def _remove_files(self, file_path: str):
+        for name in (file_path, f"{file_path}.json"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            path, _ = next(iter(self.entries.items()))
+            self.discard(path)
+            self.stats["evicted"] += 1
+
+    def schedule_fill(self, path: str, url: str, headers: Optional[Dict[str, str]] = None):
+        """Download a recording into the cache in the background, once per path"""
+        if path in self.filling or path in self.entries:
+            return
+        self.filling.add(path)
+        task = asyncio.create_task(self._fill(path, url, headers or {}))
+        self.fill_tasks.add(task)
+        task.add_done_callback(self.fill_tasks.discard)
+
+    async def _fill(self, path: str, url: str, headers: Dict[str, str]):
+        try:
+            async with self.fill_slots:
+                temp_file = self.temp_path()
+                try:
+                    async with get_media_http_client().stream("GET", url, headers=headers) as upstream:
+                        if upstream.status_code != 200:
+                            logger.warning(f"⚠️ Media cache fill of {path} got {upstream.status_code}")
+                            return
+                        with open(temp_file, "wb") as f:
+                            async for chunk in upstream.aiter_bytes(MEDIA_CHUNK_SIZE):
+                                await run_in_threadpool(f.write, chunk)
+                        self.commit(path, temp_file, upstream.headers)
+                        logger.info(f"💾 Cached media {path}")
+                finally:
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+        except Exception as e:
+            logger.error(f"❌ Media cache fill of {path} failed: {e}")
+        finally:
+            self.filling.discard(path)
+
+    async def stop(self):
+        for task in list(self.fill_tasks):
+            task.cancel()
+        await asyncio.gather(*self.fill_tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "files": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "filling": len(self.filling),
+        }
+
+
+def cached_response(entry: MediaEntry, request: Request) -> Response:
+    """Serve a cached recording, FileResponse handles Range and uses zero-copy sends"""
+    headers = {"cache-control": f"public, max-age={entry.max_age}"}
+    if entry.etag:
+        headers["etag"] = entry.etag
+        if request.headers.get("if-none-match") == entry.etag:
+            return Response(status_code=304, headers=headers)
+    headers["last-modified"] = entry.last_modified or formatdate(entry.fetched_at, usegmt=True)
+    return FileResponse(entry.file_path, media_type=entry.content_type, headers=headers)
+
+
+def _forwarded_headers(upstream: httpx.Response) -> Dict[str, str]:
+    headers = {name: upstream.headers[name] for name in FORWARDED_HEADERS if name in upstream.headers}
+    if "content-encoding" in upstream.headers:
+        # httpx hands back decoded bytes, the origin's length no longer applies
+        headers.pop("content-length", None)
+    return headers
+
+
+async def serve_media(path: str, url: str, request: Request, origin_headers: Dict[str, str]) -> Response:
+    """
+    Serve a recording from the disk cache, revalidating it when stale, or
+    stream it from the origin. Full downloads are written to the cache as they
+    stream; Range requests on a miss are passed through and the whole file is
+    fetched in the background.
+    """
+    cache = get_media_cache()
+    entry = cache.get(path)
+    if entry and entry.is_fresh():
+        cache.stats["hits"] += 1
+        return cached_response(entry, request)
+
+    headers = dict(origin_headers)
+    client_range = request.headers.get("range")
+    if entry:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    elif client_range:
+        headers["Range"] = client_range
+        if "if-range" in request.headers:
+            headers["If-Range"] = request.headers["if-range"]
+
+    stack = AsyncExitStack()
+    try:
+        upstream = await stack.enter_async_context(
+            get_media_http_client().stream("GET", url, headers=headers)
+        )
+    except Exception:
+        await stack.aclose()
+        raise
+
+    if upstream.status_code == 304 and entry:
+        await stack.aclose()
+        cache.refresh(entry, upstream.headers)
+        return cached_response(entry, request)
+
+    cacheable = (
+        upstream.status_code == 200
+        and _max_age(upstream.headers.get("cache-control"), cache.max_age) is not None
+    )
+    if not cacheable:
+        cache.stats["passthrough"] += 1
+        if upstream.status_code == 206 and not entry:
+            cache.schedule_fill(path, url, origin_headers)
+        return StreamingResponse(
+            _passthrough(upstream, stack),
+            status_code=upstream.status_code,
+            headers=_forwarded_headers(upstream),
+        )
+
+    cache.stats["misses"] += 1
+    return StreamingResponse(
+        _stream_to_cache(cache, path, upstream, stack),
+        status_code=200,
+        headers=_forwarded_headers(upstream),
+    )
+
+
+async def _passthrough(upstream: httpx.Response, stack: AsyncExitStack):
+    try:
+        async for chunk in upstream.aiter_bytes(MEDIA_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await stack.aclose()
+
+
+async def _stream_to_cache(cache: MediaCache, path: str, upstream: httpx.Response, stack: AsyncExitStack):
+    """Yield the origin body to the client while writing it to the cache"""
+    temp_file = cache.temp_path()
+    complete = False
+    try:
+        with open(temp_file, "wb") as f:
+            async for chunk in upstream.aiter_bytes(MEDIA_CHUNK_SIZE):
+                await run_in_threadpool(f.write, chunk)
+                yield chunk
+        complete = True
+    finally:
+        await stack.aclose()
+        if complete:
+            cache.commit(path, temp_file, upstream.headers)
+        elif os.path.exists(temp_file):
+            # Client went away mid-stream, don't keep a truncated file
+            os.remove(temp_file)
+
+
+# Global media cache, loaded on startup
+media_cache: Optional[MediaCache] = None
+
+
+def start_media_cache() -> MediaCache:
+    """Create the shared media cache and index what is already on disk"""
+    global media_cache
+
+    media_cache = MediaCache()
+    media_cache.load()
+    return media_cache
+
+
+async def stop_media_cache():
+    """Cancel background cache fills"""
+    global media_cache
+
+    if media_cache:
+        await media_cache.stop()
+        media_cache = None
+
+
+def get_media_cache() -> MediaCache:
+    """Get the shared media cache"""
+    global media_cache
+
+    if not media_cache:
+        raise RuntimeError("Media cache not started. Call start_media_cache() first.")
+
+    return media_cache
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from loguru import logger
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from utils.http_pool import get_media_http_client
+
+# Copy every finished call's recording to local storage instead of leaving
+# playback dependent on VAPI storage
+RECORDING_ARCHIVE = os.getenv("RECORDING_ARCHIVE", "false").lower() == "true"
+RECORDING_STORE_DIR = os.getenv("RECORDING_STORE_DIR", "recordings")
+RECORDING_ARCHIVE_CONCURRENCY = int(os.getenv("RECORDING_ARCHIVE_CONCURRENCY", "2"))
+# "opus" re-encodes archived recordings with ffmpeg (when installed), "none" keeps the original
+RECORDING_TRANSCODE = os.getenv("RECORDING_TRANSCODE", "opus").lower()
+RECORDING_OPUS_BITRATE = os.getenv("RECORDING_OPUS_BITRATE", "32k")
+RECORDING_CHUNK_SIZE = int(os.getenv("RECORDING_CHUNK_SIZE", str(64 * 1024)))
+
+OPUS_CONTENT_TYPE = "audio/ogg"
+
+
+class StoredRecording(BaseModel):
+    """Where a storage path's recording lives in the content addressed store"""
+
+    path: str
+    digest: str
+    file_name: str
+    content_type: Optional[str] = None
+    original_size: int
+    size: int
+
+    @property
+    def served_path(self) -> str:
+        """
+        Path the recording is served under: its storage path, with the stored
+        file's extension once it was transcoded (calls/x.wav -> calls/x.opus)
+        """
+        stem, extension = os.path.splitext(self.path)
+        stored_extension = os.path.splitext(self.file_name)[1]
+        if self.content_type != OPUS_CONTENT_TYPE or stored_extension == extension:
+            return self.path
+        return f"{stem}{stored_extension}"
+
+
+class RecordingStore:
+    """
+    Local archive of call recordings. Blobs are named after the sha256 of the
+    original download so a recording is kept once however many paths point
+    at it; refs/ maps each storage path to its blob.
+    """
+
+    def __init__(
+        self,
+        directory: str = RECORDING_STORE_DIR,
+        concurrency: int = RECORDING_ARCHIVE_CONCURRENCY,
+        transcode: str = RECORDING_TRANSCODE,
+    ):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.ref_dir = os.path.join(directory, "refs")
+        self.ffmpeg = shutil.which("ffmpeg") if transcode == "opus" else None
+        self.recordings: Dict[str, StoredRecording] = {}
+        # Transcoded recordings by the path they are served under
+        self.served: Dict[str, StoredRecording] = {}
+        self.slots = asyncio.Semaphore(concurrency)
+        self.pending: Set[str] = set()
+        self.tasks: Set[asyncio.Task] = set()
+        self.stats = {"archived": 0, "deduplicated": 0, "transcoded": 0, "failed": 0, "served": 0}
+
+        if transcode == "opus" and not self.ffmpeg:
+            logger.warning("⚠️ ffmpeg not found, recordings are archived without transcoding")
+
+    def _ref_path(self, path: str) -> str:
+        return os.path.join(self.ref_dir, f"{hashlib.sha256(path.encode()).hexdigest()}.json")
+
+    def load(self):
+        """Index the refs already on disk and clear downloads cut off by a restart"""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.ref_dir, exist_ok=True)
+        for name in os.listdir(self.blob_dir):
+            if name.startswith("tmp-"):
+                os.remove(os.path.join(self.blob_dir, name))
+
+        for name in os.listdir(self.ref_dir):
+            try:
+                with open(os.path.join(self.ref_dir, name)) as f:
+                    recording = StoredRecording(**json.load(f))
+            except Exception:
+                os.remove(os.path.join(self.ref_dir, name))
+                continue
+            if os.path.exists(self.file_path(recording)):
+                self._index(recording)
+
+        logger.info(
+            f"🟢 Recording store ready: {len(self.recordings)} recordings in {self.directory}"
+            f" (transcode: {'opus' if self.ffmpeg else 'off'})"
+        )
+
+    def file_path(self, recording: StoredRecording) -> str:
+        return os.path.join(self.blob_dir, recording.file_name)
+
+    def _index(self, recording: StoredRecording):
+        self.recordings[recording.path] = recording
+        self.served[recording.served_path] = recording
+
+    def get(self, path: str) -> Optional[StoredRecording]:
+        """The recording archived from path, or served under it"""
+        return self.recordings.get(path) or self.served.get(path)
+
+    def schedule(self, path: str, url: str, headers: Optional[Dict[str, str]] = None):
+        """Archive a recording in the background, once per path"""
+        if path in self.pending or path in self.recordings:
+            return
+        self.pending.add(path)
+        task = asyncio.create_task(self._archive(path, url, headers or {}))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _archive(self, path: str, url: str, headers: Dict[str, str]):
+        temp_file = os.path.join(self.blob_dir, f"tmp-{uuid.uuid4().hex}")
+        try:
+            async with self.slots:
+                digest, original_size, content_type = await self._download(url, headers, temp_file)
+                if digest is None:
+                    return
+
+                extension = "opus" if self.ffmpeg else (os.path.splitext(path)[1].lstrip(".") or "bin")
+                file_name = f"{digest}.{extension}"
+                blob = os.path.join(self.blob_dir, file_name)
+                if os.path.exists(blob):
+                    self.stats["deduplicated"] += 1
+                elif self.ffmpeg:
+                    await self._transcode(temp_file, blob)
+                else:
+                    os.replace(temp_file, blob)
+
+                recording = StoredRecording(
+                    path=path,
+                    digest=digest,
+                    file_name=file_name,
+                    content_type=OPUS_CONTENT_TYPE if self.ffmpeg else content_type,
+                    original_size=original_size,
+                    size=os.path.getsize(blob),
+                )
+                with open(self._ref_path(path), "w") as f:
+                    f.write(recording.model_dump_json())
+                self._index(recording)
+                self.stats["archived"] += 1
+                logger.info(
+                    f"💾 Archived recording {path}: {recording.original_size} -> {recording.size} bytes"
+                )
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"❌ Failed to archive recording {path}: {e}")
+        finally:
+            self.pending.discard(path)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    async def _download(self, url: str, headers: Dict[str, str], temp_file: str):
+        """Stream the recording to temp_file, hashing it on the way"""
+        digest = hashlib.sha256()
+        size = 0
+        async with get_media_http_client().stream("GET", url, headers=headers) as upstream:
+            if upstream.status_code != 200:
+                logger.warning(f"⚠️ Recording download {url} got {upstream.status_code}")
+                return None, 0, None
+            with open(temp_file, "wb") as f:
+                async for chunk in upstream.aiter_bytes(RECORDING_CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            return digest.hexdigest(), size, upstream.headers.get("content-type")
+
+    async def _transcode(self, source: str, blob: str):
+        """Re-encode to Opus next to the blob, then move it into place"""
+        output = f"{source}.opus"
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg,
+            "-nostdin", "-loglevel", "error", "-y",
+            "-i", source,
+            "-c:a", "libopus", "-b:a", RECORDING_OPUS_BITRATE, "-application", "voip",
+            "-f", "ogg", output,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr.decode().strip()}")
+            os.replace(output, blob)
+            self.stats["transcoded"] += 1
+        finally:
+            if process.returncode is None:
+                process.kill()
+            if os.path.exists(output):
+                os.remove(output)
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "recordings": len(self.recordings),
+            "pending": len(self.pending),
+            "original_bytes": sum(r.original_size for r in self.recordings.values()),
+            "stored_bytes": sum(r.size for r in self.recordings.values()),
+            "transcode": "opus" if self.ffmpeg else None,
+        }
+
+
+def stored_response(recording: StoredRecording, request: Request, path: str) -> Response:
+    """
+    Serve an archived recording requested as path, blobs never change so they
+    are cached for good. A transcoded recording asked for under its original
+    path (e.g. .wav) is redirected to its real extension, so players get a
+    URL that matches the audio/ogg they receive.
+    """
+    if path != recording.served_path and request.url.path.endswith(path):
+        served_url = request.url.replace(
+            path=request.url.path[: -len(path)] + recording.served_path
+        )
+        return RedirectResponse(str(served_url), status_code=301)
+
+    store = get_recording_store()
+    store.stats["served"] += 1
+    etag = f'"{recording.digest}"'
+    headers = {"etag": etag, "cache-control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(store.file_path(recording), media_type=recording.content_type, headers=headers)
+
+
+# Global recording store, loaded on startup
+recording_store: Optional[RecordingStore] = None
+
+
+def archive_recording(path: str, url: str, headers: Optional[Dict[str, str]] = None):
+    """Queue a finished call's recording for archival, a no-op unless enabled"""
+    if not RECORDING_ARCHIVE or not recording_store or not path:
+        return
+    recording_store.schedule(path, url, headers)
+
+
+def start_recording_store() -> RecordingStore:
+    """Create the shared recording store and index what is already archived"""
+    global recording_store
+
+    recording_store = RecordingStore()
+    recording_store.load()
+    return recording_store
+
+
+async def stop_recording_store():
+    """Cancel archival downloads still in flight"""
+    global recording_store
+
+    if recording_store:
+        await recording_store.stop()
+        recording_store = None
+
+
+def get_recording_store() -> RecordingStore:
+    """Get the shared recording store"""
+    global recording_store
+
+    if not recording_store:
+        raise RuntimeError("Recording store not started. Call start_recording_store() first.")
+
+    return recording_store
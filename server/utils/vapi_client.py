@@ -1,31 +1,75 @@
+import asyncio
 import httpx
 import json
 import os
+from datetime import datetime
 from typing import Dict, Any, Optional, List
 from loguru import logger
 from dotenv import load_dotenv
 from model.vapi_model import VAPICallRequest, VAPICallResponse
+from utils.http_pool import PooledHTTPClient, get_http_client
 
 # Load environment variables
 load_dotenv()
 from model.vapi_model import VAPICallRequest, VAPICallResponse
 
 
+class CallNotPlaced(Exception):
+    """VAPI did not create the call, retryable tells whether trying again can help"""
+
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CallOutcomeUnknown(Exception):
+    """The request may have reached VAPI (timeout, 5xx), the call may have been placed"""
+
+
+class VAPIRequestFailed(Exception):
+    """VAPI couldn't answer (transport error, 5xx, auth), this says nothing about the call"""
+
+
+def vapi_time(value: datetime) -> str:
+    """A naive UTC datetime in the ISO 8601 form VAPI's list filters take"""
+    return f"{value.isoformat(timespec='milliseconds')}Z"
+
+
+def parse_vapi_time(value: str) -> datetime:
+    """A VAPI ISO 8601 timestamp as a naive UTC datetime"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
 class VAPIClient:
     """VAPI API Client for managing assistants and calls"""
 
-    def __init__(self):
+    def __init__(self, http_client: Optional[PooledHTTPClient] = None):
+        # Requests go through the shared connection pool unless one is given
+        self.http_client = http_client
         self.base_url = os.getenv("VAPI_BASE_URL", "https://api.vapi.ai")
         self.api_key = os.getenv("VAPI_API_KEY")
 
+        # Checked on use, so the API still boots (read-only) without a key
         if not self.api_key:
-            raise ValueError("VAPI_API_KEY environment variable is not set")
+            logger.warning("⚠️ VAPI_API_KEY environment variable is not set, VAPI requests will fail")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
 
-        self.headers = {
+    @property
+    def headers(self) -> Dict[str, str]:
+        if not self.api_key:
+            raise ValueError("VAPI_API_KEY environment variable is not set")
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
 
+    @property
+    def http(self) -> PooledHTTPClient:
+        return self.http_client or get_http_client()
+
     # async def test_connection(self) -> bool:
     #     """Test VAPI API connectivity"""
     #     try:
@@ -42,57 +86,97 @@ class VAPIClient:
     #         logger.error(f"VAPI connection test failed: {e}")
     #         return False
 
-    async def initiate_call(
-        self, call_data: VAPICallRequest
-    ) -> Optional[VAPICallResponse]:
-        """Initiate a call using VAPI"""
+    async def initiate_call(self, call_data: VAPICallRequest) -> VAPICallResponse:
+        """
+        Initiate a call using VAPI. Raises CallNotPlaced when VAPI certainly
+        didn't create the call, CallOutcomeUnknown when it may have
+        """
+        logger.info(f"Initiating call: {call_data.model_dump(exclude_none=True)} 🟢🟢")
+        if not self.configured:
+            raise CallNotPlaced("VAPI_API_KEY environment variable is not set", retryable=True)
         try:
-            async with httpx.AsyncClient() as client:
-                logger.info(f"Initiating call: {call_data.model_dump(exclude_none=True)} 🟢🟢")
-                response = await client.post(
-                    f"{self.base_url}/call",
-                    headers=self.headers,
-                    json=call_data.model_dump(exclude_none=True),
-                    timeout=30.0,
-                )
-
-                if response.status_code == 201:
-                    data = response.json()
-                    logger.info(f"Call initiated successfully: {data.get('id')}")
-
-                    return VAPICallResponse(**data)
-                else:
-                    logger.error(
-                        f"Failed to initiate call: {response.status_code} - {response.text}"
-                    )
-                    return None
-
+            response = await self.http.post(
+                f"{self.base_url}/call",
+                headers=self.headers,
+                json=call_data.model_dump(exclude_none=True),
+                timeout=30.0,
+            )
+        except (asyncio.TimeoutError, httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # Failed while waiting for a pool slot or a connection, nothing was sent
+            logger.error(f"Could not reach VAPI to initiate call: {e!r}")
+            raise CallNotPlaced(f"Could not reach VAPI: {e!r}", retryable=True)
         except Exception as e:
-            logger.error(f"Error initiating call: {e}")
-            return None
+            logger.error(f"Error initiating call: {e!r}")
+            raise CallOutcomeUnknown(f"No answer from VAPI: {e!r}")
+
+        if response.status_code == 201:
+            try:
+                data = response.json()
+                logger.info(f"Call initiated successfully: {data.get('id')}")
+                return VAPICallResponse(**data)
+            except Exception as e:
+                # Created, but we can't tell by what ID
+                raise CallOutcomeUnknown(f"Unreadable VAPI response: {e!r}")
+
+        logger.error(f"Failed to initiate call: {response.status_code} - {response.text}")
+        message = f"VAPI answered {response.status_code}: {response.text}"
+        if response.status_code == 429:
+            raise CallNotPlaced(message, retryable=True)
+        if 400 <= response.status_code < 500:
+            raise CallNotPlaced(message, retryable=False)
+        raise CallOutcomeUnknown(message)
 
     async def get_call(self, call_id: str) -> Optional[Dict[str, Any]]:
         """Get call details by ID"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/call/{call_id}",
-                    headers=self.headers,
-                    timeout=10.0,
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    logger.info(f"Retrieved call: {call_id}")
-                    return data
-                else:
-                    logger.error(
-                        f"Failed to get call {call_id}: {response.status_code}"
-                    )
-                    return None
+            return await self.lookup_call(call_id)
+        except VAPIRequestFailed as e:
+            logger.error(f"Error getting call {call_id}: {e}")
+            return None
 
+    async def lookup_call(self, call_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get call details by ID. None only when VAPI answers 404, any other
+        failure raises VAPIRequestFailed since it doesn't tell whether the call exists
+        """
+        try:
+            response = await self.http.get(
+                f"{self.base_url}/call/{call_id}",
+                headers=self.headers,
+                timeout=10.0,
+            )
         except Exception as e:
-            logger.error(f"Error getting call {call_id}: {e}")
+            raise VAPIRequestFailed(f"Request failed: {e}") from e
+
+        if response.status_code == 200:
+            logger.info(f"Retrieved call: {call_id}")
+            return response.json()
+        if response.status_code == 404:
+            logger.warning(f"VAPI has no call {call_id}")
+            return None
+        raise VAPIRequestFailed(f"VAPI answered {response.status_code}")
+
+    async def list_calls(self, **filters: Any) -> Optional[List[Dict[str, Any]]]:
+        """
+        List calls, newest first. filters are passed as query parameters,
+        e.g. limit, createdAtGe, createdAtLt (ISO 8601 timestamps)
+        """
+        try:
+            response = await self.http.get(
+                f"{self.base_url}/call",
+                headers=self.headers,
+                params=filters,
+                timeout=30.0,
+            )
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Failed to list calls {filters}: {response.status_code}")
+                return None
+
+        except Exception as e:
+            logger.error(f"Error listing calls {filters}: {e}")
             return None
 
     async def get_call_transcript(self, call_id: str) -> Optional[str]:
@@ -144,3 +228,17 @@ class VAPIClient:
     #     except Exception as e:
     #         logger.error(f"Error getting recording for call {call_id}: {e}")
     #         return None
+
+
+# Shared client, cheap to keep around since requests use the pooled HTTP client
+vapi_client: Optional[VAPIClient] = None
+
+
+def get_vapi_client() -> VAPIClient:
+    """Get the shared VAPI client, creating it on first use"""
+    global vapi_client
+
+    if not vapi_client:
+        vapi_client = VAPIClient()
+
+    return vapi_client
@@ -0,0 +1,108 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from pymongo import ReturnDocument
+
+from model.model import WebhookEvent
+
+# VAPI sends several of these for the same finished call, they all mean "completed"
+COMPLETION_EVENT_TYPES = ("call.completed", "call.ended", "end-of-call-report")
+# The only completion event carrying the artifact (transcript, recording, analysis)
+END_OF_CALL_REPORT = "end-of-call-report"
+
+# Delivery counters since startup
+webhook_stats = {"received": 0, "processed": 0, "duplicates": 0, "merged": 0, "released": 0}
+
+# record_webhook_event outcomes
+PROCESS = "process"
+MERGE = "merge"
+DUPLICATE = "duplicate"
+
+
+def extract_vapi_call_id(webhook_data: Dict[str, Any]) -> Optional[str]:
+    """Get the VAPI call ID from the possible locations in a webhook payload"""
+    message_data = webhook_data.get("message", {})
+    call_info = webhook_data.get("call", {})
+    return call_info.get("id") or message_data.get("call", {}).get("id")
+
+
+def event_kind(event_type: str) -> str:
+    return "completion" if event_type in COMPLETION_EVENT_TYPES else event_type
+
+
+async def record_webhook_event(vapi_call_id: str, event_type: str) -> str:
+    """
+    Log a webhook delivery and decide whether it still needs processing.
+
+    The first event of a kind for a call is processed and later ones are
+    dropped, except that an end-of-call-report following a bare call.ended or
+    call.completed is merged so its artifact isn't lost. Returns PROCESS,
+    MERGE or DUPLICATE; a delivery that then fails to process must be
+    released with release_webhook_event so a retry isn't dropped.
+    """
+    webhook_stats["received"] += 1
+    kind = event_kind(event_type)
+    now = datetime.utcnow()
+
+    try:
+        previous = await WebhookEvent.get_motor_collection().find_one_and_update(
+            {"key": f"{vapi_call_id}:{kind}"},
+            {
+                "$setOnInsert": {
+                    "vapi_call_id": vapi_call_id,
+                    "kind": kind,
+                    "received_at": now,
+                },
+                "$addToSet": {"event_types": event_type},
+                "$inc": {"deliveries": 1},
+                "$set": {"last_received_at": now},
+            },
+            upsert=True,
+            projection={"event_types": 1, "deliveries": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+    except Exception as e:
+        # Better to do the work twice than to lose a completion
+        logger.error(f"❌ Failed to record webhook {event_type} for call {vapi_call_id}: {e}")
+        webhook_stats["processed"] += 1
+        return PROCESS
+
+    if previous is None:
+        webhook_stats["processed"] += 1
+        return PROCESS
+
+    seen = previous.get("event_types", [])
+    if not seen:
+        # Every earlier delivery of this kind was released after failing
+        webhook_stats["processed"] += 1
+        return PROCESS
+    if event_type == END_OF_CALL_REPORT and END_OF_CALL_REPORT not in seen:
+        webhook_stats["merged"] += 1
+        logger.info(f"🔀 {event_type} for call {vapi_call_id} follows {seen}, merging its artifact")
+        return MERGE
+
+    webhook_stats["duplicates"] += 1
+    logger.info(
+        f"♻️ Duplicate {event_type} for call {vapi_call_id} "
+        f"(delivery {previous.get('deliveries', 1) + 1}, already seen {seen}), skipping"
+    )
+    return DUPLICATE
+
+
+async def release_webhook_event(vapi_call_id: str, event_type: str):
+    """
+    Forget a delivery that failed to process, so the next delivery of the
+    same event (a VAPI retry, or call.started once the call is saved) is
+    processed instead of dropped as a duplicate.
+    """
+    try:
+        await WebhookEvent.get_motor_collection().update_one(
+            {"key": f"{vapi_call_id}:{event_kind(event_type)}"},
+            {"$pull": {"event_types": event_type}},
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to release webhook {event_type} for call {vapi_call_id}: {e}")
+        return
+    webhook_stats["released"] += 1
+    logger.info(f"↩️ Released {event_type} for call {vapi_call_id}, a retry will be processed")